@@ -4,8 +4,13 @@ Classes and finctions that implement the config paradigm for Knewton.
 
 import os
 import copy
+import itertools
+import re
+import threading
 import yaml
 
+from kconfig.interpolation import compile_plan, apply_plan
+
 class ConfigPathDefaults(object):
 	"""
 	This class is a singleton intended to hold the paths that will be looked at,
@@ -50,7 +55,176 @@ def find_config_path(file_name, config_path=None):
 			return file_path + ".yml"
 	raise IOError("Config file %s does not exist" % (file_name))
 
-def fetch_config(default, config=None, config_path=None):
+def find_config_paths(file_name, config_path=None):
+	"""
+	Not intended for calling outside of this module.
+	Like find_config_path, but returns the file from every path that has
+	it, in search order, so the first one found takes precedence.
+	Parameters:
+	 - file_name: the file name to search for.
+	Returns:
+	 - a list of paths, empty if no file is found
+	"""
+	if not config_path:
+		config_path = ConfigPath
+	paths = []
+	for prefix in config_path.prefixes:
+		file_path = os.path.expanduser(os.path.join(prefix, file_name))
+		if os.path.exists(file_path):
+			paths.append(file_path)
+		elif os.path.exists(file_path + ".yml"):
+			paths.append(file_path + ".yml")
+	return paths
+
+def merge_configs(base, override):
+	"""
+	Deep merges two parsed configs and returns the result. Dicts are merged
+	key by key; any other value in override replaces the one in base.
+	Neither argument is modified, and subtrees that only one of them has are
+	shared with the result rather than copied. A None (empty file) on
+	either side leaves the other side as is.
+	"""
+	if override is None:
+		return base
+	if not isinstance(base, dict) or not isinstance(override, dict):
+		return override
+	merged = dict(base)
+	for key, value in override.iteritems():
+		if key in merged:
+			value = merge_configs(merged[key], value)
+		merged[key] = value
+	return merged
+
+# directives naming the config files a config is based on, in the order
+# they are applied
+INCLUDE_KEYS = ("extends", "include")
+
+def _mtime(path):
+	"""Returns the mtime of a file, or None if it does not exist"""
+	try:
+		return os.stat(path).st_mtime
+	except OSError:
+		return None
+
+class Sidecar(object):
+	"""
+	A data file next to a config file, referred to with the !npy tag, or
+	!table for a large YAML mapping:
+		weights: !npy weights.npy
+		tenants: !table tenants.yml
+	The path is relative to the directory of the config file. Sidecars are
+	equal if they have the same path and the file had the same mtime when
+	the config was parsed, so a changed file makes a config unequal to the
+	one before. ConfigDefault reloads configs when their sidecars change.
+	"""
+	__slots__ = ("path", "mtime")
+
+	def __init__(self, path):
+		self.path = path
+		self.mtime = _mtime(path)
+
+	def changed(self):
+		return _mtime(self.path) != self.mtime
+
+	def __eq__(self, other):
+		if isinstance(other, Sidecar):
+			return (self.path, self.mtime) == (other.path, other.mtime)
+		return NotImplemented
+
+	def __ne__(self, other):
+		equal = self.__eq__(other)
+		if equal is NotImplemented:
+			return equal
+		return not equal
+
+	def __hash__(self):
+		return hash((self.path, self.mtime))
+
+	def __repr__(self):
+		return "Sidecar(%r)" % self.path
+
+	def __reduce__(self):
+		return (_unpickle_sidecar, (self.path, self.mtime))
+
+def _unpickle_sidecar(path, mtime):
+	sidecar = Sidecar.__new__(Sidecar)
+	sidecar.path = path
+	sidecar.mtime = mtime
+	return sidecar
+
+class _ConfigLoader(yaml.Loader):
+	"""yaml.Loader, with the !npy and !table tags for sidecars"""
+
+def _construct_sidecar(loader, node):
+	directory = os.path.dirname(os.path.abspath(loader.name))
+	return Sidecar(os.path.join(directory, loader.construct_scalar(node)))
+
+_ConfigLoader.add_constructor("!npy", _construct_sidecar)
+_ConfigLoader.add_constructor("!table", _construct_sidecar)
+
+def find_sidecars(value):
+	"""
+	Returns the Sidecars in a parsed config, in no particular order.
+	"""
+	sidecars = []
+	stack = [value]
+	while stack:
+		value = stack.pop()
+		if isinstance(value, Sidecar):
+			sidecars.append(value)
+		elif isinstance(value, dict):
+			stack.extend(value.itervalues())
+		elif isinstance(value, list):
+			stack.extend(value)
+	return sidecars
+
+def _load_yaml(path):
+	return yaml.load(file(path), Loader=_ConfigLoader)
+
+def load_with_includes(path, config_path=None, load_file=_load_yaml,
+		_including=()):
+	"""
+	Not intended for calling outside of this module.
+	Loads a config file and resolves the extends: and include: directives
+	at its top level. Each names a config file, or a list of them, that is
+	looked up like any other config and deep merged under the including
+	file, extends first. Included files can include others.
+	Parameters:
+	 - path: the path of the config file to load
+	 - load_file: a function that parses a config file given its path.
+	   (optional)
+	Returns:
+	 - (the config, the paths of every file it includes)
+	Raises:
+	 - IOError if the file or an included file is not found
+	 - ValueError if files include each other in a cycle
+	"""
+	real_path = os.path.abspath(path)
+	if real_path in _including:
+		raise ValueError("Config include cycle: %s" % (
+			" -> ".join(_including + (real_path,))))
+	raw = load_file(path)
+	if not isinstance(raw, dict) or not any(
+			directive in raw for directive in INCLUDE_KEYS):
+		return raw, []
+	value = None
+	included = []
+	for directive in INCLUDE_KEYS:
+		names = raw.get(directive) or []
+		if isinstance(names, basestring):
+			names = [names]
+		for name in names:
+			include_path = find_config_path(name, config_path=config_path)
+			include_value, include_paths = load_with_includes(include_path,
+				config_path, load_file, _including + (real_path,))
+			value = merge_configs(value, include_value)
+			included.append(include_path)
+			included.extend(include_paths)
+	own = dict((key, own_value) for key, own_value in raw.iteritems()
+		if key not in INCLUDE_KEYS)
+	return merge_configs(value, own), included
+
+def fetch_config(default, config=None, config_path=None, includes=False):
 	"""
 	Returns the content of a yml config file as a hash
 	Parameters:
@@ -59,15 +233,106 @@ def fetch_config(default, config=None, config_path=None):
 	   Note: the pattern of using config is intended to make using this with
 	   OptionsParser easier.  Otherwise, generally ignore the use of the
 	   config argument.
+	 - includes: resolve extends: and include: directives, see
+	   load_with_includes. (optional)
 	Raises:
 	 - IOError if no file is found
+	 - ValueError if includes is set and files include each other in a cycle
 	"""
 	if not config_path:
 		config_path = ConfigPath
 	retcfg = default
 	if config:
 		retcfg = config
-	return yaml.load(file(find_config_path(retcfg, config_path=config_path)))
+	path = find_config_path(retcfg, config_path=config_path)
+	if includes:
+		return load_with_includes(path, config_path=config_path)[0]
+	return _load_yaml(path)
+
+def fetch_layered_config(default, config=None, config_path=None):
+	"""
+	Returns the content of a yml config file as a hash, deep merged across
+	every path that has the file. Files found earlier in the search path
+	override the ones found later, so ./ overrides ~/.knewton, which
+	overrides /etc/knewton.
+	Parameters:
+	 - default: default file name to look for
+	 - config: override with this file name instead. (optional)
+	Raises:
+	 - IOError if no file is found
+	"""
+	retcfg = default
+	if config:
+		retcfg = config
+	paths = find_config_paths(retcfg, config_path=config_path)
+	if not paths:
+		raise IOError("Config file %s does not exist" % (retcfg))
+	value = None
+	for path in reversed(paths):
+		value = merge_configs(value, _load_yaml(path))
+	return value
+
+def _env_name(name):
+	return re.sub(r"\W", "_", str(name)).upper()
+
+def compile_env_overrides(prefix, environ=None, parse_values=False):
+	"""
+	Scans the environment once for config overrides and returns them as a
+	dict of name segments to values. An override is named
+	<prefix>__<FILE>__<KEY>..., so with the prefix KCONFIG the host in
+	databases/reports.yml is overridden by
+	KCONFIG__DATABASES__REPORTS__DATABASE__HOST. Values are strings, left
+	for a schema to convert: parsed as yaml, a password of 0123 would be 83
+	and an empty one None.
+	Parameters:
+	 - prefix: the prefix of the environment variables to use
+	 - environ: the environment to scan. (optional, defaults to os.environ)
+	 - parse_values: parse values as yaml, so numbers and booleans get
+	   their types. (optional)
+	"""
+	if environ is None:
+		environ = os.environ
+	start = prefix + "__"
+	overrides = {}
+	for name, raw in environ.iteritems():
+		if not name.startswith(start):
+			continue
+		segments = tuple(name[len(start):].split("__"))
+		if not all(segments):
+			continue
+		value = raw
+		if parse_values:
+			try:
+				value = yaml.safe_load(raw)
+			except yaml.YAMLError:
+				pass
+		overrides[segments] = value
+	return overrides
+
+def apply_env_overrides(value, overrides):
+	"""
+	Returns a config with overrides, a list of (key segments, value), applied.
+	Keys are matched ignoring case, and are created lower case where they
+	are missing. Only the dicts along each overridden path are copied; the
+	config passed in is not modified.
+	"""
+	for path, override in overrides:
+		value = _apply_env_override(value, path, override)
+	return value
+
+def _apply_env_override(value, path, override):
+	if not path:
+		return override
+	result = {}
+	if isinstance(value, dict):
+		result.update(value)
+	for key in result:
+		if _env_name(key) == path[0]:
+			break
+	else:
+		key = path[0].lower()
+	result[key] = _apply_env_override(result.get(key), path[1:], override)
+	return result
 
 def fetch_config_mtime(default, config=None, config_path=None):
 	"""Returns the modified time of a config file. Will return -1
@@ -94,16 +359,70 @@ def fetch_config_mtime(default, config=None, config_path=None):
 	mtime = os.stat(filename).st_mtime
 	return mtime
 
+# every config cached by a ConfigDefault gets a generation from this counter,
+# so generations are unique across keys and instances
+_generations = itertools.count(1)
+
 class ConfigDefault(object):
 	"""
-	This is a caching singleton for the behavior of fetch_config
+	This is a caching singleton for the behavior of fetch_config.
+	With layered=True it caches fetch_layered_config instead: every file
+	is parsed once and cached by path, and when one layer changes only that
+	layer is reparsed and only the merges above it are redone.
+	With env_prefix set, overrides from the environment (see
+	compile_env_overrides) are applied to every config read from disk. The
+	environment is only scanned on creation and on reload_env, and the
+	overridden config is cached in place of the one read from disk. The
+	overrides are strings unless parse_env is set.
+	With includes=True, extends: and include: directives are resolved (see
+	load_with_includes). Every file is parsed once however many configs
+	include it, and a change to an included file reloads exactly the
+	configs that depend on it.
+	With interpolate=True, ${...} references are resolved when a config is
+	loaded (see kconfig.interpolation). The parsed references of each config
+	are kept until its content changes, and a config is reloaded when a
+	file it refers to changes.
+	Configs are also reloaded when a !npy or !table sidecar file in them
+	changes (see Sidecar).
+	The cache may be used from several threads: fetches, reloads and
+	invalidations hold a lock while they change it.
 	"""
-	def __init__(self, config_path=None):
+	def __init__(self, config_path=None, layered=False, env_prefix=None,
+			includes=False, interpolate=False, parse_env=False):
 		self.config_types = {}
 		self.mtimes = {}
 		if not config_path:
 			config_path = ConfigPath
 		self.config_path = config_path
+		self.layered = layered
+		self.includes = includes
+		self.interpolate = interpolate
+		# key -> generation, see generation()
+		self.generations = {}
+		# path -> (mtime, parsed file)
+		self.files = {}
+		# path -> the Sidecars in the parsed file
+		self.sidecars = {}
+		# key -> {path of a file the config depends on: mtime}
+		self.dependencies = {}
+		# path -> set of keys that depend on it
+		self.dependents = {}
+		# key -> ([(path, mtime)], [merge of the layers up to each one])
+		self.layer_merges = {}
+		self.env_prefix = env_prefix
+		self.parse_env = parse_env
+		self.env_overrides = {}
+		# key -> (file name, config before env overrides)
+		self.bases = {}
+		self._env_by_name = {}
+		# key -> (config before interpolation, its interpolation plan)
+		self.plans = {}
+		self._interpolating = []
+		# held while the cache changes; reentrant, as loading a config can
+		# fetch the configs it refers to
+		self._lock = threading.RLock()
+		if env_prefix:
+			self.reload_env()
 
 	def __call__(self):
 		return self
@@ -118,6 +437,17 @@ class ConfigDefault(object):
 			return False
 		return True
 
+	def generation(self, default, config=None):
+		"""
+		Returns a number that changes every time the cached config is
+		replaced, or None if it is not cached.  Fetch the config first to
+		pick up changes on disk.
+		"""
+		key = str(default) + "__" + str(config)
+		if key not in self.config_types:
+			return None
+		return self.generations.get(key, 0)
+
 	def fetch_config(self, default, config=None):
 		"""
 		Returns the content of a yml config file as a hash.  If this config
@@ -133,24 +463,226 @@ class ConfigDefault(object):
 		 - IOError if no file is found
 		"""
 		key = str(default) + "__" + str(config)
-		curr_mtime = fetch_config_mtime(
-			default, config=None, config_path=self.config_path)
-		if key in self.config_types:
-			mtime = self.mtimes.get(key)
-			if mtime is not None and mtime == curr_mtime:
+		with self._lock:
+			if self.layered:
+				return self._fetch_layered(default, config, key)
+			curr_mtime = fetch_config_mtime(
+				default, config=None, config_path=self.config_path)
+			if key in self.config_types:
+				mtime = self.mtimes.get(key)
+				if (mtime is not None and mtime == curr_mtime and
+						not self._dependencies_changed(key)):
+					return self.config_types[key]
+
+			retcfg = default
+			if config:
+				retcfg = config
+			value, dependencies = self._load_file(
+				find_config_path(retcfg, config_path=self.config_path))
+			return self._add_loaded_config(
+				value, default, config, curr_mtime, dependencies)
+
+	def _fetch_layered(self, default, config, key):
+		retcfg = default
+		if config:
+			retcfg = config
+		# lowest precedence first, so the merge chain can be kept as is up to
+		# the first layer that changed
+		signatures = [(path, os.stat(path).st_mtime) for path in reversed(
+			find_config_paths(retcfg, config_path=self.config_path))]
+		if not signatures:
+			if self.mtimes.get(key) == -1:
+				# injected with _add_config
 				return self.config_types[key]
+			raise IOError("Config file %s does not exist" % (retcfg))
+
+		cached_signatures, merges = self.layer_merges.get(key, ([], []))
+		unchanged = 0
+		if not self._dependencies_changed(key):
+			if key in self.config_types and cached_signatures == signatures:
+				return self.config_types[key]
+			for current, cached in zip(signatures, cached_signatures):
+				if current != cached:
+					break
+				unchanged += 1
+		dependencies = {}
+		if unchanged:
+			dependencies.update(self.dependencies.get(key, {}))
+		merges = merges[:unchanged]
+		for path, mtime in signatures[unchanged:]:
+			value, layer_dependencies = self._load_file(path, mtime)
+			dependencies.update(layer_dependencies)
+			if merges:
+				value = merge_configs(merges[-1], value)
+			merges.append(value)
+		self.layer_merges[key] = (signatures, merges)
+		return self._add_loaded_config(
+			merges[-1], default, config, signatures[-1][1], dependencies)
+
+	def _parse(self, path, mtime=None):
+		if mtime is None:
+			mtime = os.stat(path).st_mtime
+		cached = self.files.get(path)
+		if cached is not None and cached[0] == mtime and not any(
+				sidecar.changed() for sidecar in self.sidecars.get(path, ())):
+			return cached[1]
+		value = _load_yaml(path)
+		self.files[path] = (mtime, value)
+		self.sidecars[path] = find_sidecars(value)
+		return value
+
+	def _load_file(self, path, mtime=None):
+		"""
+		Parses a config file through the file cache, resolving includes if
+		they are enabled. Returns the config and a dict of the included
+		files and sidecars it depends on to their mtimes.
+		"""
+		if not self.includes:
+			value = self._parse(path, mtime)
+			dependencies = {}
+		else:
+			value, included = load_with_includes(path,
+				config_path=self.config_path, load_file=self._parse)
+			dependencies = dict(
+				(include_path, self.files[include_path][0])
+				for include_path in included)
+		for parsed_path in [path] + dependencies.keys():
+			for sidecar in self.sidecars.get(parsed_path, ()):
+				dependencies[sidecar.path] = sidecar.mtime
+		return value, dependencies
 
-		value = fetch_config(default, config, config_path=self.config_path)
-		self._add_config(value, default, config, curr_mtime)
+	def _dependencies_changed(self, key):
+		for path, mtime in self.dependencies.get(key, {}).iteritems():
+			if _mtime(path) != mtime:
+				return True
+		return False
+
+	def _set_dependencies(self, key, dependencies):
+		for path in self.dependencies.pop(key, {}):
+			self.dependents.get(path, set()).discard(key)
+		if dependencies:
+			self.dependencies[key] = dependencies
+			for path in dependencies:
+				self.dependents.setdefault(path, set()).add(key)
+
+	def invalidate(self, path):
+		"""
+		Drops a file and every config that depends on it from the cache,
+		so they are reloaded on their next fetch.
+		Parameters:
+		 - path: the path of the file that changed
+		"""
+		with self._lock:
+			self.files.pop(path, None)
+			self.sidecars.pop(path, None)
+			for key in self.dependents.pop(path, set()):
+				self.config_types.pop(key, None)
+				self.mtimes.pop(key, None)
+				self.bases.pop(key, None)
+				self.generations.pop(key, None)
+				self.plans.pop(key, None)
+				self._set_dependencies(key, None)
+
+	def reload_env(self, environ=None):
+		"""
+		Rescans the environment for overrides and reapplies them to the
+		cached configs.
+		Parameters:
+		 - environ: the environment to scan. (optional, defaults to os.environ)
+		"""
+		with self._lock:
+			self.env_overrides = compile_env_overrides(self.env_prefix, environ,
+				self.parse_env)
+			self._env_by_name = {}
+			for key, (name, value) in self.bases.items():
+				dependencies = dict(self.dependencies.get(key, {}))
+				self.config_types[key] = self._finish_config(
+					key, name, value, dependencies)
+				self.generations[key] = next(_generations)
+				self._set_dependencies(key, dependencies)
+
+	def _env_overrides_for(self, name):
+		overrides = self._env_by_name.get(name)
+		if overrides is None:
+			file_name = name
+			if file_name.endswith(".yml"):
+				file_name = file_name[:-len(".yml")]
+			segments = tuple(_env_name(part) for part in file_name.split("/"))
+			# shorter paths first, so a whole subtree can be replaced and
+			# then have keys under it overridden
+			overrides = self._env_by_name[name] = [
+				(path[len(segments):], value)
+				for path, value in sorted(self.env_overrides.iteritems())
+				if path[:len(segments)] == segments]
+		return overrides
+
+	def _finish_config(self, key, name, value, dependencies):
+		"""
+		Applies env overrides and interpolation to a config read from disk.
+		Files that references are resolved from are added to dependencies.
+		"""
+		if self.env_prefix:
+			value = apply_env_overrides(value, self._env_overrides_for(name))
+		if not self.interpolate:
+			return value
+		cached = self.plans.get(key)
+		if cached is not None and cached[0] is value:
+			plan = cached[1]
+		else:
+			plan = compile_plan(value)
+			self.plans[key] = (value, plan)
+		if not plan:
+			return value
+		if name in self._interpolating:
+			raise ValueError("Config interpolation cycle: %s" % (
+				" -> ".join(self._interpolating + [name])))
+		self._interpolating.append(name)
+		try:
+			return apply_plan(value, plan,
+				lambda name: self._fetch_referenced(name, dependencies))
+		finally:
+			self._interpolating.pop()
+
+	def _fetch_referenced(self, name, dependencies):
+		value = self.fetch_config(name)
+		key = name + "__None"
+		if self.layered:
+			dependencies.update(self.layer_merges.get(key, ([], []))[0])
+		elif self.mtimes.get(key, -1) != -1:
+			path = find_config_path(name, config_path=self.config_path)
+			dependencies[path] = self.mtimes[key]
+		dependencies.update(self.dependencies.get(key, {}))
 		return value
 
+	def _add_loaded_config(self, value, default, config, mtime,
+			dependencies=None):
+		"""
+		Adds a config read from disk to the cache, with env overrides and
+		interpolation applied
+		"""
+		key = str(default) + "__" + str(config)
+		retcfg = default
+		if config:
+			retcfg = config
+		dependencies = dict(dependencies or {})
+		finished = self._finish_config(key, retcfg, value, dependencies)
+		self._add_config(finished, default, config, mtime)
+		if self.env_prefix:
+			self.bases[key] = (retcfg, value)
+		self._set_dependencies(key, dependencies)
+		return finished
+
 	def _add_config(self, config_hash, default, config=None, mtime=-1):
 		"""
 		Adds a config to the cache
 		"""
-		key = str(default) + "__" + str(config)
-		self.config_types[key] = config_hash
-		self.mtimes[key] = mtime
+		with self._lock:
+			key = str(default) + "__" + str(config)
+			self.config_types[key] = config_hash
+			self.mtimes[key] = mtime
+			self.generations[key] = next(_generations)
+			self.bases.pop(key, None)
+			self._set_dependencies(key, None)
 
 Config = ConfigDefault()
 
@@ -167,7 +699,9 @@ class ConfigTest(ConfigDefault):
 	If ConfigTest does not have a cached value, it will attempt to
 	fall back on reading the configs from disk.
 	"""
-	def __init__(self, config_types=None, mtimes=None, config_path=None):
+	def __init__(self, config_types=None, mtimes=None, config_path=None,
+			**kwargs):
+		super(ConfigTest, self).__init__(config_path=config_path, **kwargs)
 		self.config_types = copy.deepcopy(config_types)
 		if self.config_types is None:
 			self.config_types = {}
@@ -175,9 +709,6 @@ class ConfigTest(ConfigDefault):
 		self.mtimes = copy.deepcopy(mtimes)
 		if self.mtimes is None:
 			self.mtimes = {}
-		if not config_path:
-			config_path = ConfigPath
-		self.config_path = config_path
 
 	def fetch_config(self, default, config=None):
 		"""
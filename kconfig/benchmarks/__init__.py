@@ -0,0 +1,141 @@
+"""
+Benchmarks of kconfig, run as scripts:
+
+	python -m kconfig.benchmarks.validation -o results.json
+	python -m kconfig.benchmarks.validation --baseline results.json
+	python -m kconfig.benchmarks.loading -o results.json
+
+Results are written as JSON. Given a baseline from an earlier run, every
+rate (a result named *_per_sec) that fell by more than the threshold is
+reported, and the exit status is 1.
+"""
+
+import json
+import platform
+import sys
+import time
+import timeit
+
+def rate(function, min_time=0.2, repeat=5):
+	"""
+	Calls function repeatedly for at least min_time seconds, in repeat
+	rounds.
+	Returns:
+	 - the calls per second of the fastest round, the one least slowed by
+	   whatever else the machine was doing
+	"""
+	best = 0.0
+	batch = 1
+	for _ in xrange(repeat):
+		calls = 0
+		start = time.time()
+		while True:
+			for _ in xrange(batch):
+				function()
+			calls += batch
+			elapsed = time.time() - start
+			if elapsed >= min_time / repeat:
+				break
+			# few enough clock reads not to be measured along
+			batch *= 2
+		best = max(best, calls / elapsed)
+	return best
+
+def latencies(function, args, min_time=0.2):
+	"""
+	Calls function with each of args in turn, cycling through them, for
+	at least min_time seconds and at least once with each.
+	Returns:
+	 - (the seconds each call took, the seconds all of them took)
+	"""
+	samples = []
+	append = samples.append
+	clock = timeit.default_timer
+	start = clock()
+	while True:
+		for arg in args:
+			before = clock()
+			function(arg)
+			append(clock() - before)
+		elapsed = clock() - start
+		if elapsed >= min_time:
+			return samples, elapsed
+
+def percentile(samples, fraction):
+	"""The value below which fraction of the sorted samples are"""
+	return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+def summarize(samples, elapsed=None):
+	"""
+	Summarizes the latencies of operations.
+	Parameters:
+	 - samples: the seconds each operation took
+	 - elapsed: the seconds all of them took, if they overlapped or had
+	   time between them. (optional, defaults to their sum)
+	"""
+	samples = sorted(samples)
+	if elapsed is None:
+		elapsed = sum(samples)
+	return {
+		"ops": len(samples),
+		"ops_per_sec": len(samples) / elapsed if elapsed else 0.0,
+		"p50_us": 1e6 * percentile(samples, 0.5),
+		"p99_us": 1e6 * percentile(samples, 0.99),
+	}
+
+def regressions(results, baseline, threshold, _path=()):
+	"""
+	Compares results against a baseline.
+	Parameters:
+	 - results, baseline: results as written by finish
+	 - threshold: the fraction a rate may fall by, like 0.1
+	Returns:
+	 - a sorted list of (name, baseline rate, rate) for each regression
+	"""
+	found = []
+	for name, value in results.iteritems():
+		path = _path + (name,)
+		base = baseline.get(name) if isinstance(baseline, dict) else None
+		if isinstance(value, dict):
+			found.extend(regressions(value, base, threshold, path))
+		elif (name.endswith("_per_sec") and isinstance(base, (int, float)) and
+				value < base * (1 - threshold)):
+			found.append(("/".join(path), base, value))
+	return sorted(found)
+
+def add_options(parser):
+	"""Adds the options that finish uses to an optparse parser"""
+	parser.add_option("-o", "--output",
+		help="write the results as JSON to this file [default: stdout]")
+	parser.add_option("--baseline",
+		help="a results file to compare against")
+	parser.add_option("--threshold", type="float", default=0.1,
+		help="the fraction a rate may fall below the baseline by "
+			"[default: %default]")
+	parser.add_option("--min-time", type="float", default=0.2,
+		help="the seconds to run each measurement for [default: %default]")
+
+def finish(results, options, out=None):
+	"""
+	Writes results and compares them against the baseline.
+	Returns:
+	 - the exit status: 1 if there are regressions
+	"""
+	if out is None:
+		out = sys.stdout
+	results = dict(results, python=platform.python_version())
+	text = json.dumps(results, indent=2, sort_keys=True)
+	if options.output:
+		with open(options.output, "w") as f:
+			f.write(text + "\n")
+	else:
+		out.write(text + "\n")
+	if not options.baseline:
+		return 0
+	with open(options.baseline) as f:
+		baseline = json.load(f)
+	found = regressions(results, baseline, options.threshold)
+	for name, base, value in found:
+		out.write("REGRESSION %s: %.1f/s, was %.1f/s (%+.1f%%)\n" % (
+			name, value, base, 100.0 * (value - base) / base))
+	return 1 if found else 0
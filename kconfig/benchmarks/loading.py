@@ -0,0 +1,276 @@
+"""
+Benchmarks finding, loading and caching config files.
+
+A synthetic tree of config files is built across several prefixes, with
+sizes spread evenly on a log scale between --min-size and --max-size.
+Each measurement reports operations per second and p50/p99 latencies:
+
+ - find_config_path: finding files, in any of the prefixes
+ - fetch_config_cold: parsing files with kconfig.fetch_config, by size
+ - warm_fetch: ConfigDefault.fetch_config of cached, unchanged files
+ - stale_reload: ConfigDefault.fetch_config of a file that changed
+ - config_exists_miss: ConfigDefault.config_exists of missing files
+ - threads: warm fetches from several threads at once
+ - churn: warm fetches from several threads while files are rewritten
+
+	python -m kconfig.benchmarks.loading --files 200 --threads 8 -o after.json
+"""
+
+import itertools
+import optparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import timeit
+
+import kconfig
+from kconfig.benchmarks import add_options
+from kconfig.benchmarks import finish
+from kconfig.benchmarks import latencies
+from kconfig.benchmarks import summarize
+from kconfig.checked_config import ByteSizeField
+
+# each of these is about 64 bytes of YAML
+_ENTRY = "service%06d:\n  host: host%06d.example.com\n  port: %5d\n  up: true\n"
+
+def _content(size, serial):
+	entries = max(1, size // len(_ENTRY % (0, 0, 0)))
+	return "serial: %d\n%s" % (serial, "".join(
+		_ENTRY % (index, index, index % 65536) for index in xrange(entries)))
+
+def _write(path, content, mtime=None):
+	"""Writes a file by renaming, so readers see all of it or none"""
+	directory = os.path.dirname(path)
+	if not os.path.isdir(directory):
+		os.makedirs(directory)
+	fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+	with os.fdopen(fd, "w") as f:
+		f.write(content)
+	if mtime is not None:
+		os.utime(temp_path, (mtime, mtime))
+	os.rename(temp_path, path)
+
+def build_tree(root, files=100, prefixes=3, min_size=100, max_size=100000,
+		seed=0):
+	"""
+	Writes a tree of config files.
+	Parameters:
+	 - root: the directory to write the prefixes to
+	 - files: the number of config files
+	 - prefixes: the number of prefixes to spread them over
+	 - min_size, max_size: the range of file sizes in bytes
+	Returns:
+	 - (a ConfigPathDefaults of the prefixes, a list of (name, size) of
+	   the files, smallest first)
+	"""
+	r = random.Random(seed)
+	paths = [os.path.join(root, "prefix%d" % index) for index in xrange(prefixes)]
+	for path in paths:
+		if not os.path.isdir(path):
+			os.makedirs(path)
+	names = []
+	for index in xrange(files):
+		if files > 1:
+			size = int(min_size * (float(max_size) / min_size) ** (
+				float(index) / (files - 1)))
+		else:
+			size = min_size
+		name = "group%d/config%d.yml" % (index % 10, index)
+		_write(os.path.join(r.choice(paths), name), _content(size, 0))
+		names.append((name, size))
+	return kconfig.ConfigPathDefaults(paths), names
+
+def _size_class(size):
+	"""The decade of sizes that size is in, named by its lower bound"""
+	label = "100B"
+	for bound, bound_label in [(1000, "1KB"), (10000, "10KB"), (100000, "100KB"),
+			(1000000, "1MB"), (10000000, "10MB")]:
+		if size >= bound:
+			label = bound_label
+	return label + "_and_over"
+
+def _cold(config_path, names):
+	"""Parses every file once, by size class"""
+	by_class = {}
+	for name, size in names:
+		start = timeit.default_timer()
+		kconfig.fetch_config(name, config_path=config_path)
+		by_class.setdefault(_size_class(size), []).append(
+			(timeit.default_timer() - start, size))
+	results = {}
+	for size_class, samples in by_class.iteritems():
+		results[size_class] = summarize([seconds for seconds, _ in samples])
+		results[size_class]["mb_per_sec"] = (sum(size for _, size in samples) /
+			1e6 / sum(seconds for seconds, _ in samples))
+	return results
+
+def _stale(config, config_path, names, min_time):
+	"""Fetches files after each one changes on disk"""
+	paths = dict((name, kconfig.find_config_path(name, config_path=config_path))
+		for name in names)
+	mtimes = dict((name, os.stat(path).st_mtime) for name, path in paths.iteritems())
+	samples = []
+	start = timeit.default_timer()
+	for name in itertools.cycle(names):
+		mtimes[name] += 1
+		os.utime(paths[name], (mtimes[name], mtimes[name]))
+		before = timeit.default_timer()
+		config.fetch_config(name)
+		samples.append(timeit.default_timer() - before)
+		if timeit.default_timer() - start >= min_time:
+			return summarize(samples)
+
+def _readers(config, names, threads, min_time, writer=None):
+	"""Warm fetches from several threads, and a writer thread if given"""
+	stop = threading.Event()
+	samples = [[] for _ in xrange(threads)]
+	errors = []
+
+	def read(samples, seed):
+		r = random.Random(seed)
+		clock = timeit.default_timer
+		order = list(names)
+		r.shuffle(order)
+		while not stop.is_set():
+			for name in order:
+				before = clock()
+				try:
+					config.fetch_config(name)
+				except Exception as e:
+					errors.append(e)
+				samples.append(clock() - before)
+
+	workers = [threading.Thread(target=read, args=(samples[index], index))
+		for index in xrange(threads)]
+	if writer is not None:
+		workers.append(threading.Thread(target=writer, args=(stop,)))
+	start = timeit.default_timer()
+	for worker in workers:
+		worker.start()
+	time.sleep(min_time)
+	stop.set()
+	for worker in workers:
+		worker.join()
+	results = summarize(list(itertools.chain(*samples)),
+		timeit.default_timer() - start)
+	results["threads"] = threads
+	results["errors"] = len(errors)
+	return results
+
+def _churn(config, config_path, names, threads, min_time, interval=0.005):
+	"""Warm fetches from several threads while files are rewritten"""
+	paths = [kconfig.find_config_path(name, config_path=config_path)
+		for name in names]
+	writes = []
+
+	def write(stop):
+		r = random.Random(0)
+		serial = 0
+		while not stop.wait(interval):
+			serial += 1
+			path = r.choice(paths)
+			mtime = os.stat(path).st_mtime + 1
+			with open(path) as f:
+				size = len(f.read())
+			_write(path, _content(size, serial), mtime)
+			writes.append(path)
+
+	results = _readers(config, names, threads, min_time, write)
+	results["writes"] = len(writes)
+	return results
+
+SCENARIOS = ["find_config_path", "fetch_config_cold", "warm_fetch",
+	"stale_reload", "config_exists_miss", "threads", "churn"]
+
+def run(root, files=100, prefixes=3, min_size=100, max_size=100000,
+		threads=4, min_time=0.2, scenarios=None):
+	"""
+	Builds a tree under root and benchmarks it.
+	Returns:
+	 - a dict of results for each scenario
+	"""
+	scenarios = scenarios or SCENARIOS
+	config_path, files_and_sizes = build_tree(root, files, prefixes,
+		min_size, max_size)
+	names = [name for name, _ in files_and_sizes]
+	# the smallest files, so reloads and rewrites measure the cache and
+	# not the parser
+	small = [name for name, size in files_and_sizes if size <= 10000] or names[:1]
+	missing = ["missing/config%d.yml" % index for index in xrange(len(names))]
+	results = {"tree": {
+		"files": files,
+		"prefixes": prefixes,
+		"bytes": sum(size for _, size in files_and_sizes),
+	}}
+	if "find_config_path" in scenarios:
+		results["find_config_path"] = summarize(*latencies(
+			lambda name: kconfig.find_config_path(name, config_path=config_path),
+			names, min_time))
+	if "fetch_config_cold" in scenarios:
+		results["fetch_config_cold"] = _cold(config_path, files_and_sizes)
+	config = kconfig.ConfigDefault(config_path=config_path)
+	for name in names:
+		config.fetch_config(name)
+	if "warm_fetch" in scenarios:
+		results["warm_fetch"] = summarize(*latencies(config.fetch_config,
+			names, min_time))
+	if "config_exists_miss" in scenarios:
+		results["config_exists_miss"] = summarize(*latencies(
+			config.config_exists, missing, min_time))
+	if "threads" in scenarios:
+		results["threads"] = _readers(config, names, threads, min_time)
+	if "stale_reload" in scenarios:
+		results["stale_reload"] = _stale(config, config_path, small, min_time)
+	if "churn" in scenarios:
+		results["churn"] = _churn(config, config_path, small, threads, min_time)
+	return results
+
+def main(argv=None, out=None):
+	parser = optparse.OptionParser(usage="%prog [options]",
+		description="Benchmark finding, loading and caching config files.")
+	add_options(parser)
+	parser.add_option("--scenario", action="append", dest="scenarios",
+		help="run only this scenario; may be given more than once "
+			"[choices: %s]" % ", ".join(SCENARIOS))
+	parser.add_option("--files", type="int", default=100,
+		help="the number of config files [default: %default]")
+	parser.add_option("--prefixes", type="int", default=3,
+		help="the number of config path prefixes [default: %default]")
+	parser.add_option("--min-size", default="100B",
+		help="the size of the smallest file [default: %default]")
+	parser.add_option("--max-size", default="100KB",
+		help="the size of the largest file; 10MB files take minutes to "
+			"parse cold [default: %default]")
+	parser.add_option("--threads", type="int", default=4,
+		help="the reader threads of the threads and churn scenarios "
+			"[default: %default]")
+	parser.add_option("--dir",
+		help="build the tree in this directory and keep it "
+			"[default: a temporary directory]")
+	options, args = parser.parse_args(argv)
+	if args:
+		parser.error("unexpected arguments: %s" % " ".join(args))
+	size_field = ByteSizeField("size")
+	try:
+		min_size = size_field.validate(options.min_size)
+		max_size = size_field.validate(options.max_size)
+	except ValueError as e:
+		parser.error(str(e))
+	for scenario in options.scenarios or ():
+		if scenario not in SCENARIOS:
+			parser.error("unknown scenario: %s" % scenario)
+	root = options.dir or tempfile.mkdtemp()
+	try:
+		results = run(root, options.files, options.prefixes, min_size, max_size,
+			options.threads, options.min_time, options.scenarios)
+	finally:
+		if not options.dir:
+			shutil.rmtree(root)
+	return finish(results, options, out)
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,260 @@
+"""
+Benchmarks CheckedConfig validation on synthetic schemas.
+
+generate builds a CheckedConfig class of a given width (fields per level),
+depth (levels of nested fields), list size and mix of field types, with a
+document that is valid for it. Each scenario reports validations per
+second, the memory kept per validated config, and the fields validated
+per config; the per field type results give the cost of validating one
+value of each type. Memory is measured with tracemalloc when it is
+installed, and as the objects tracked by the garbage collector otherwise.
+
+	python -m kconfig.benchmarks.validation -o before.json
+	python -m kconfig.benchmarks.validation --baseline before.json
+	python -m kconfig.benchmarks.validation --width 50 --depth 2 \
+		--mix int=3,str=2,list=1
+"""
+
+import gc
+import optparse
+import random
+import sys
+
+from kconfig.benchmarks import add_options
+from kconfig.benchmarks import finish
+from kconfig.benchmarks import rate
+from kconfig.checked_config import BoolField
+from kconfig.checked_config import ByteSizeField
+from kconfig.checked_config import CheckedConfig
+from kconfig.checked_config import DurationField
+from kconfig.checked_config import EnumField
+from kconfig.checked_config import FloatField
+from kconfig.checked_config import HostPortField
+from kconfig.checked_config import IntField
+from kconfig.checked_config import ListField
+from kconfig.checked_config import NestedField
+from kconfig.checked_config import StringField
+
+try:
+	import tracemalloc
+except ImportError:
+	tracemalloc = None
+
+# field type -> (a function of a name that makes the field, a function of
+# a random.Random that makes a valid value)
+SCALAR_TYPES = {
+	"int": (lambda name: IntField(name, lower_bound=0),
+		lambda r: r.randint(0, 100000)),
+	"float": (lambda name: FloatField(name, lower_bound=0.0),
+		lambda r: r.random() * 100),
+	"str": (lambda name: StringField(name, pattern=r"^\w+$"),
+		lambda r: "value%d" % r.randint(0, 1000)),
+	"bool": (lambda name: BoolField(name),
+		lambda r: r.random() < 0.5),
+	"enum": (lambda name: EnumField(name, ["red", "green", "blue"]),
+		lambda r: r.choice(["red", "green", "blue"])),
+	"duration": (lambda name: DurationField(name),
+		lambda r: "%dms" % r.randint(1, 100000)),
+	"bytesize": (lambda name: ByteSizeField(name),
+		lambda r: "%dMiB" % r.randint(1, 1024)),
+	"hostport": (lambda name: HostPortField(name),
+		lambda r: "host%d:%d" % (r.randint(0, 100), r.randint(1, 65535))),
+}
+
+DEFAULT_MIX = dict([(name, 1) for name in SCALAR_TYPES] +
+	[("list", 1), ("nested", 1)])
+
+SCENARIOS = [
+	("flat", dict(width=20, depth=0)),
+	("wide", dict(width=200, depth=0)),
+	("nested", dict(width=6, depth=3)),
+	("lists", dict(width=10, depth=0, list_size=100,
+		mix={"list": 1, "int": 1})),
+	("records", dict(width=8, depth=1, list_size=50,
+		mix={"list": 1, "int": 2, "str": 2, "enum": 1, "nested": 1})),
+]
+
+def _choose(r, mix):
+	total = sum(mix.itervalues())
+	point = r.random() * total
+	for field_type, weight in sorted(mix.iteritems()):
+		point -= weight
+		if point < 0:
+			return field_type
+	return field_type
+
+def _scalar(make_value):
+	return lambda r: (make_value(r), 1)
+
+def _list(make_item, list_size):
+	def make_value(r):
+		items = [make_item(r) for _ in xrange(list_size)]
+		return [item for item, _ in items], sum(count for _, count in items)
+	return make_value
+
+def _nested(fields):
+	return lambda r: _document(r, fields)
+
+def _fields(r, width, depth, list_size, mix):
+	"""Returns a list of (Field, a function that makes a valid value of it
+	and its number of values) pairs"""
+	scalars = dict((field_type, weight) for field_type, weight in mix.iteritems()
+		if field_type in SCALAR_TYPES) or {"int": 1}
+	fields = []
+	for index in xrange(width):
+		field_type = _choose(r, mix)
+		if field_type == "nested" and depth <= 0:
+			field_type = _choose(r, scalars)
+		name = "f%d_%s" % (index, field_type)
+		if field_type == "nested":
+			nested = _fields(r, width, depth - 1, list_size, mix)
+			field = NestedField(name, *[item for item, _ in nested])
+			make_value = _nested(nested)
+		elif field_type == "list":
+			if depth > 0 and mix.get("nested"):
+				nested = _fields(r, width, depth - 1, list_size, mix)
+				item_field = NestedField(name + "_item",
+					*[item for item, _ in nested])
+				make_item = _nested(nested)
+			else:
+				make_item_field, make_item_value = SCALAR_TYPES[_choose(r, scalars)]
+				item_field = make_item_field(name + "_item")
+				make_item = _scalar(make_item_value)
+			field = ListField(name, item_field)
+			make_value = _list(make_item, list_size)
+		else:
+			make_field, make_item_value = SCALAR_TYPES[field_type]
+			field = make_field(name)
+			make_value = _scalar(make_item_value)
+		fields.append((field, make_value))
+	return fields
+
+def _document(r, fields):
+	"""Returns a valid document for fields, and its number of values"""
+	document = {}
+	values = 0
+	for field, make_value in fields:
+		document[field.name], count = make_value(r)
+		values += count
+	return document, values
+
+def generate(width=10, depth=1, list_size=10, mix=None, seed=0):
+	"""
+	Generates a CheckedConfig class and a document that is valid for it.
+	Parameters:
+	 - width: the number of fields at each level
+	 - depth: the levels of nested fields under the top one
+	 - list_size: the number of items in each list
+	 - mix: a dict of field types ("list", "nested" and those in
+	   SCALAR_TYPES) to their relative frequencies. (optional)
+	 - seed: the random seed; the same arguments generate the same schema
+	Returns:
+	 - (the class, the document, the number of values in the document)
+	"""
+	r = random.Random(seed)
+	fields = _fields(r, width, depth, list_size, mix or DEFAULT_MIX)
+	document, values = _document(r, fields)
+	config_class = type("Synthetic_%d_%d_%d" % (width, depth, list_size),
+		(CheckedConfig,), {"CONFIG_FIELDS": [field for field, _ in fields]})
+	return config_class, document, values
+
+def retained(function, calls=100):
+	"""
+	Returns the bytes (with tracemalloc) or objects (without) that the
+	results of function keep, per call.
+	"""
+	results = []
+	gc.collect()
+	if tracemalloc is not None:
+		tracemalloc.start()
+		try:
+			before = tracemalloc.get_traced_memory()[0]
+			for _ in xrange(calls):
+				results.append(function())
+			after = tracemalloc.get_traced_memory()[0]
+		finally:
+			tracemalloc.stop()
+	else:
+		before = len(gc.get_objects())
+		for _ in xrange(calls):
+			results.append(function())
+		after = len(gc.get_objects())
+	return float(after - before) / calls
+
+def run_scenario(min_time=0.2, **kwargs):
+	"""Benchmarks validating the document of a generated schema"""
+	config_class, document, values = generate(**kwargs)
+	validate = lambda: config_class(document)
+	validate()
+	return {
+		"validations_per_sec": rate(validate, min_time),
+		"values_per_validation": values,
+		"retained_per_validation": retained(validate),
+	}
+
+def run_field_types(min_time=0.2, width=50):
+	"""Benchmarks schemas of one field type each"""
+	results = {}
+	for field_type in sorted(SCALAR_TYPES):
+		config_class, document, values = generate(width=width, depth=0,
+			mix={field_type: 1})
+		validate = lambda: config_class(document)
+		validate()
+		per_sec = rate(validate, min_time)
+		results[field_type] = {
+			"values_per_sec": per_sec * values,
+			"ns_per_value": 1e9 / (per_sec * values),
+		}
+	return results
+
+def _parse_mix(text):
+	mix = {}
+	for part in text.split(","):
+		field_type, _, weight = part.partition("=")
+		if field_type not in SCALAR_TYPES and field_type not in ("list", "nested"):
+			raise ValueError("unknown field type: %s" % field_type)
+		mix[field_type] = float(weight or 1)
+	return mix
+
+def main(argv=None, out=None):
+	parser = optparse.OptionParser(usage="%prog [options]",
+		description="Benchmark CheckedConfig validation on synthetic schemas.")
+	add_options(parser)
+	parser.add_option("--scenario", action="append", dest="scenarios",
+		help="run only this scenario; may be given more than once "
+			"[choices: %s]" % ", ".join(name for name, _ in SCENARIOS))
+	parser.add_option("--width", type="int",
+		help="run one scenario of this width instead")
+	parser.add_option("--depth", type="int", default=1,
+		help="the depth of the --width scenario [default: %default]")
+	parser.add_option("--list-size", type="int", default=10,
+		help="the list size of the --width scenario [default: %default]")
+	parser.add_option("--mix",
+		help="the field types of the --width scenario, as type=weight,...")
+	parser.add_option("--seed", type="int", default=0)
+	parser.add_option("--no-field-types", action="store_false",
+		dest="field_types", default=True,
+		help="skip the per field type benchmarks")
+	options, args = parser.parse_args(argv)
+	if args:
+		parser.error("unexpected arguments: %s" % " ".join(args))
+	if options.width is not None:
+		try:
+			mix = _parse_mix(options.mix) if options.mix else None
+		except ValueError as e:
+			parser.error(str(e))
+		scenarios = [("custom", dict(width=options.width, depth=options.depth,
+			list_size=options.list_size, mix=mix))]
+	else:
+		scenarios = [(name, kwargs) for name, kwargs in SCENARIOS
+			if not options.scenarios or name in options.scenarios]
+	results = {"scenarios": {}, "memory": "bytes" if tracemalloc else "objects"}
+	for name, kwargs in scenarios:
+		results["scenarios"][name] = run_scenario(options.min_time,
+			seed=options.seed, **kwargs)
+	if options.field_types:
+		results["field_types"] = run_field_types(options.min_time)
+	return finish(results, options, out)
+
+if __name__ == "__main__":
+	sys.exit(main())
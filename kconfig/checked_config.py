@@ -1,36 +1,280 @@
-import collections
-import keyword
-import re
+import cPickle
+import errno
+import hashlib
+import logging
+import os
+import stat
+import tempfile
 import types
 
 from kconfig import Config
+from kconfig import find_config_path
+from kconfig.fields import ArrayField
+from kconfig.fields import BoolField
+from kconfig.fields import ByteSizeField
+from kconfig.fields import DurationField
+from kconfig.fields import EnumField
+from kconfig.fields import Field
+from kconfig.fields import FileRef
+from kconfig.fields import FileRefField
+from kconfig.fields import FloatField
+from kconfig.fields import HostPort
+from kconfig.fields import HostPortField
+from kconfig.fields import IntField
+from kconfig.fields import MapField
+from kconfig.fields import ParsedField
+from kconfig.fields import StringField
+from kconfig.fields import URLField
+from kconfig.fields import _fingerprint_value
+from kconfig.lists import ColumnarList
+from kconfig.lists import LazyList
+from kconfig.lists import ListField
+from kconfig.live import LiveConfig
+from kconfig.live import derived
+from kconfig.records import NestedField
+from kconfig.records import Record
+from kconfig.validators import _compile_field_validator
+from kconfig.validators import _compile_populate
+from kconfig.validators import _compile_validator
+from kconfig.validators import _revalidate
+from kconfig.validators import _unchanged
+# pickles made when these were defined here refer to them here
+from kconfig.lists import _unpickle_columnar
+from kconfig.records import _unpickle_record
+
+__all__ = [
+	"ArrayField", "BatchValidationError", "BoolField", "ByteSizeField",
+	"CheckedConfig", "CheckedConfigMeta", "ColumnarList", "derived",
+	"DurationField", "EnumField", "Field", "FileRef", "FileRefField",
+	"FloatField", "HostPort", "HostPortField", "IntField", "LazyList",
+	"ListField", "LiveConfig", "MapField", "NestedField", "ParsedField",
+	"Record", "StringField", "URLField"
+]
+
+log = logging.getLogger(__name__)
+
+class _LazyField(object):
+	"""Validates a field of a lazy CheckedConfig on first access
+
+	The validated value is stored in the instance dict, where it hides
+	this descriptor from any later lookups.
+	"""
+
+	def __init__(self, field, validator):
+		self.field = field
+		self.validator = validator
+
+	def __get__(self, instance, owner):
+		if instance is None:
+			return self
+		value = self.validator(instance._raw)
+		instance.__dict__[self.field.name] = value
+		return value
 
-def _validate(config_dict, config_fields):
-	"""Validate a parsed config dictionary
+def _schema_fingerprint(cls):
+	"""A hash of the name and fields of a CheckedConfig class"""
+	return hashlib.sha1(repr((cls.__module__, cls.__name__,
+		_fingerprint_value(cls.CONFIG_FIELDS)))).hexdigest()
 
-	Validates the contents of config_dict against the fields
-	defined in this CheckedConfig. Makes sure that all required
-	fields are present and have appropriate values.
+# cache directories that were found writable by others, warned about once
+_untrusted_dirs = set()
 
-	Args:
-	  config_dict: a dictionary containing config fields and
-		values to validate.
+def _private_dir(path):
+	"""Create path, writable only by this user, if it does not exist
 
 	Returns:
-	  A dictionary of validated fields and values.
+	  True if no other user can write to path.
+	"""
+	try:
+		os.makedirs(path, 0700)
+	except OSError as e:
+		if e.errno != errno.EEXIST:
+			return False
+	try:
+		st = os.stat(path)
+	except OSError:
+		return False
+	return (st.st_uid == os.getuid() and
+		not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH))
+
+def _disk_cached_validate(cls, config_dict):
+	"""Validate a config dict through cls.DISK_CACHE_DIR
+
+	Validated fields are stored in a file named after the schema
+	fingerprint of cls and a hash of the pickled config dict, so that
+	other processes validating the same content can load them instead.
+	Configs that cannot be pickled are validated without the cache.
+
+	The files are unpickled, and unpickling can run arbitrary code, so
+	anyone who can write to the directory can run code in every process
+	that uses it. The directory is created readable and writable only by
+	this user, and is not used at all if it is owned by another user or
+	writable by its group or others.
+	"""
+	if not _private_dir(cls.DISK_CACHE_DIR):
+		if cls.DISK_CACHE_DIR not in _untrusted_dirs:
+			_untrusted_dirs.add(cls.DISK_CACHE_DIR)
+			log.warning("Not using %s, other users can write to it",
+				cls.DISK_CACHE_DIR)
+		return cls._validator(config_dict)
+	try:
+		content = cPickle.dumps(config_dict, cPickle.HIGHEST_PROTOCOL)
+	except (cPickle.PicklingError, TypeError):
+		return cls._validator(config_dict)
+	path = os.path.join(cls.DISK_CACHE_DIR, "{0}-{1}.pickle".format(
+		cls._fingerprint, hashlib.sha1(content).hexdigest()))
+	try:
+		with open(path, "rb") as f:
+			return cPickle.load(f)
+	except Exception:
+		pass
+
+	valid_config = cls._validator(config_dict)
+	temp_path = None
+	try:
+		fd, temp_path = tempfile.mkstemp(dir=cls.DISK_CACHE_DIR)
+		with os.fdopen(fd, "wb") as f:
+			cPickle.dump(valid_config, f, cPickle.HIGHEST_PROTOCOL)
+		os.rename(temp_path, path)
+		temp_path = None
+	except Exception:
+		# the cache only saves work; a config it cannot hold is still valid
+		log.debug("Not caching %s", path, exc_info=True)
+	finally:
+		if temp_path is not None and os.path.exists(temp_path):
+			os.remove(temp_path)
+	return valid_config
+
+class BatchValidationError(ValueError):
+	"""Raised by validate_many when any of the configs are invalid
+
+	The message lists the first MAX_MESSAGE_ERRORS errors.
+
+	Attributes:
+	  errors: A list of (index, exception) pairs, one for each invalid
+	    config, in order.
+	  results: A list with the validated config for each valid config
+	    and None for each invalid one.
 	"""
-	valid_dict = {}
-	for field in config_fields:
-		try:
-			value = config_dict[field.name]
-		except KeyError:
-			if field.default is not None:
-				value = field.default
-			else:
-				raise ValueError("Missing config field: '{0}'".format(field.name))
-
-		valid_dict[field.name] = field.validate(value)
-	return valid_dict
+	# the number of errors spelled out in the message
+	MAX_MESSAGE_ERRORS = 10
+
+	def __init__(self, errors, results):
+		message = "%d of %d configs are invalid: %s" % (
+			len(errors), len(results), "; ".join(
+				"[%d] %s" % (index, error)
+				for index, error in errors[:self.MAX_MESSAGE_ERRORS]))
+		if len(errors) > self.MAX_MESSAGE_ERRORS:
+			message += "; and %d more" % (len(errors) - self.MAX_MESSAGE_ERRORS)
+		super(BatchValidationError, self).__init__(message)
+		self.errors = errors
+		self.results = results
+
+def _memo_key(name):
+	"""The file a config name resolves to
+
+	"x", "x.yml" and the absolute path of the file are all names of the
+	same config, so they share one memoized instance.
+	"""
+	try:
+		return os.path.abspath(
+			find_config_path(name, config_path=Config.config_path))
+	except IOError:
+		# added to Config rather than read from a file
+		return name
+
+class CheckedConfigMeta(type):
+	"""Compiles the CONFIG_FIELDS of each CheckedConfig class
+
+	Validation code for the fields is generated once, when the class is
+	defined or when CONFIG_FIELDS is assigned to, rather than interpreted
+	for every config. Changing the CONFIG_FIELDS list in place afterwards
+	is not picked up.
+
+	Configs constructed from a file name are memoized per class and per
+	file the name resolves to: the same instance is returned until Config
+	has a new generation of the file. The instance for the new generation
+	reuses the nested values that did not change.
+
+	Each class gets a __slots__ entry per field, so field values are
+	stored without a per-instance dict. Instances still get a dict when
+	an attribute that is not a field is set on them.
+
+	Classes with LAZY set instead get a _LazyField descriptor per field,
+	and keep validated values in the instance dict.
+	"""
+
+	def __new__(mcs, name, bases, namespace):
+		config_fields = namespace.get("CONFIG_FIELDS")
+		lazy = namespace.get("LAZY",
+			any(getattr(base, "LAZY", False) for base in bases))
+		if config_fields and not lazy:
+			taken = set(namespace)
+			for base in bases:
+				for klass in base.__mro__:
+					taken.update(klass.__dict__.get("__slots__", ()))
+			slots = namespace.get("__slots__", ())
+			if isinstance(slots, basestring):
+				slots = (slots,)
+			namespace["__slots__"] = tuple(slots) + tuple(
+				slot for slot in [field.name for field in config_fields] + ["_raw"]
+				if slot not in taken)
+		return super(CheckedConfigMeta, mcs).__new__(
+			mcs, name, bases, namespace)
+
+	def __init__(cls, name, bases, namespace):
+		super(CheckedConfigMeta, cls).__init__(name, bases, namespace)
+		cls._compile()
+
+	def _compile(cls):
+		for field in cls.CONFIG_FIELDS:
+			if hasattr(CheckedConfig, field.name):
+				raise ValueError("Field name '{0}' of {1} is taken by "
+					"CheckedConfig.{0}".format(field.name, cls.__name__))
+		type.__setattr__(cls, "_validator",
+			staticmethod(_compile_validator(cls.CONFIG_FIELDS, cls.__name__)))
+		type.__setattr__(cls, "_fingerprint", _schema_fingerprint(cls))
+		type.__setattr__(cls, "_populate",
+			_compile_populate(cls.CONFIG_FIELDS, cls.__name__))
+		# resolved path -> (config dict, instance), see _memo_key
+		type.__setattr__(cls, "_instances", {})
+		type.__setattr__(cls, "_derived", frozenset(
+			name for klass in cls.__mro__
+			for name, attr in vars(klass).iteritems()
+			if isinstance(attr, derived)))
+		if cls.LAZY:
+			for field in cls.CONFIG_FIELDS:
+				type.__setattr__(cls, field.name, _LazyField(field,
+					_compile_field_validator(field, cls.__name__)))
+
+	def __setattr__(cls, name, value):
+		super(CheckedConfigMeta, cls).__setattr__(name, value)
+		if name == "CONFIG_FIELDS":
+			cls._compile()
+
+	def __call__(cls, config):
+		if not isinstance(config, types.StringTypes):
+			return super(CheckedConfigMeta, cls).__call__(config)
+		config_dict = Config.fetch_config(config)
+		key = _memo_key(config)
+		cached = cls._instances.get(key)
+		# Config returns the same dict until the file changes; other names
+		# of the file are cached apart in Config, with dicts that hold the
+		# same values. == would also take 1.0 for 1.
+		if cached is not None and (cached[0] is config_dict or
+				_unchanged(cached[0], config_dict)):
+			return cached[1]
+		if (cached is not None and
+				cls.__init__.im_func is CheckedConfig.__init__.im_func):
+			# a new generation of the file: keep what did not change
+			instance = object.__new__(cls)
+			instance._refresh_from(cached[1], config_dict)
+		else:
+			instance = super(CheckedConfigMeta, cls).__call__(config_dict)
+		# Config holds the dict anyway; refreshing from it is cheaper with it
+		instance._raw = config_dict
+		cls._instances[key] = (config_dict, instance)
+		return instance
 
 class CheckedConfig(object):
 	"""Defines a schema for a config file
@@ -74,9 +318,22 @@ class CheckedConfig(object):
 	  File "<stdin>", line 1, in <module>
 	  ValueError: Value for field 'age': -10 is less than lower bound 0
 	"""
+	__metaclass__ = CheckedConfigMeta
+
 	# override in subclasses to define the fields in this config
 	CONFIG_FIELDS = []
 
+	# a directory to share validated configs between processes through,
+	# keyed by the schema and the content of the config. None disables it.
+	# The cached configs are pickles, so only processes of the same user
+	# can share it; see _disk_cached_validate.
+	DISK_CACHE_DIR = None
+
+	# set to True in a class definition to validate each field on first
+	# access rather than on construction. Lazy configs do not use the
+	# DISK_CACHE_DIR.
+	LAZY = False
+
 	def __init__(self, config):
 		"""Initialize this CheckedConfig
 
@@ -84,245 +341,181 @@ class CheckedConfig(object):
 		  config: a dict or a str. If a dict, it contains the
 		    unvalidated fields and values of this config. If a
 		    str, it contains the location of a config file that
-		    will be loaded using Config.
+		    will be loaded using Config. Configs constructed from
+		    the same file are the same instance until the file
+		    changes.
 		"""
 		if isinstance(config, types.StringTypes):
 			config = Config.fetch_config(config)
 
-		valid_config = _validate(config, self.CONFIG_FIELDS)
-		self.__dict__.update(valid_config)
-
-class Field(object):
-	"""An abstract field definition
-
-	Subclasses are used to define fields in a CheckedConfig.
-	"""
-
-	# Acceptable values must start with a letter, and be followed by zero or
-	# more alpha-numeric or _ characters. Any valid python identifier that
-	# does not start with _ should match.
-	FIELD_PATTERN = re.compile("^[a-zA-Z]\w*$")
-
-	def __init__(self, name, default=None):
-		"""Initialize this Field
-
-		Args:
-		  name: A str. The name of this field. Must be a valid python
-		    identifier that does not begin with '_'.
-		  default: The default value that this field will be set to
-		    if it is not present in the config file. If this is set
-		    to None (the default), then there is no default value and
-		    an error will be raised if the field is missing.
-		"""
-		self.validate_name(name)
-		self.name = name
-		self.default = default
-
-	def validate_name(self, name):
-		"""Validate a field name
-
-		Makes sure that the name is a valid python identifier that does
-		not start with '_' and that it is not a python keyword.
-
-		Args:
-		  name: A str.
-
-		Raises:
-		  ValueError: If this is an invalid name.
-		"""
-		if not re.match(self.FIELD_PATTERN, name):
-			raise ValueError("'{0}' is an invalid name for a config field. "
-					"Config field names must be valid python "
-					"identifiers and cannot start with '_'.".format(name))
-
-		if keyword.iskeyword(name):
-			raise ValueError("'{0}' is an invalid name for a config field. "
-					"It matches a python keyword.".format(name))
-
-	def validate(self, value):
-		"""Validate the supplied value against this field definition
-
-		Abstract method. Should be implemented by subclasses.
-		"""
-		raise NotImplementedError("validate not implemented")
-
-class IntField(Field):
-	"""A field that expects an integer value"""
-
-	def __init__(self, name, default=None,
-			lower_bound=None, upper_bound=None):
-		"""Initialize this IntField
-
-		Args:
-		  name: A str. The name of this field.
-		  lower_bound: An int or None. The lowest acceptable value
-		    for this field. If None, there is no lower bound.
-		  upper_bound: An int or None. The highest acceptable value
-		    for this field. If None, there is no upper bound.
-		"""
-		super(IntField, self).__init__(name, default)
-		self.lower_bound = lower_bound
-		self.upper_bound = upper_bound
-
-	def validate(self, value):
-		"""Ensure that the supplied value is a valid integer
-
-		It will attempt to convert the supplied value to an integer
-		and ensure that it is between the upper and lower bounds of
-		this field if they exist.
-
-		Args:
-		  value: An int or value convertable to an int.
-
-		Returns:
-		  An int. This is the converted and validated value.
-
-		Raises:
-		  ValueError if value is not valid for this field
-		"""
-		try:
-			int_value = int(value)
-		except ValueError as ve:
-			raise ValueError("Value for field '{0}': {1}".format(self.name, ve.message))
-
-		if self.lower_bound is not None and int_value < self.lower_bound:
-			raise ValueError("Value for field '{0}': {1} is less than lower bound {2}".format(
-					self.name, int_value, self.lower_bound))
-		if self.upper_bound is not None and int_value > self.upper_bound:
-			raise ValueError("Value for field '{0}': {1} is greater than upper bound {2}".format(
-					self.name, int_value, self.upper_bound))
-		return int_value
-
-class StringField(Field):
-	"""A field that expects a string value"""
-
-	def __init__(self, name, default=None,
-			pattern=None):
-		"""Initialize this StringField
-
-		Args:
-		  name: A str. The name of this field.
-		  pattern: A str or None. A regexp that defines the acceptable
-		    pattern for this field. If None, all strings will be
-		    accepted.
-		"""
-		super(StringField, self).__init__(name, default)
-		if pattern:
-			self.pattern = re.compile(pattern)
+		if self.LAZY:
+			# fields are validated from it on access
+			self._raw = config
+			return
+		if self.DISK_CACHE_DIR is None:
+			valid_config = self._validator(config)
 		else:
-			self.pattern = None
+			valid_config = _disk_cached_validate(type(self), config)
+		self._populate(valid_config)
 
-	def validate(self, value):
-		"""Ensure that the supplied value is a valid string
+	@classmethod
+	def validate_many(cls, configs):
+		"""Validate many configs against this schema at once
 
-		It will attempt to convert the supplied value to a string
-		and ensure that it matches the pattern for this field if
-		one exists.
+		Every config is validated, so the errors from all of the invalid
+		ones are reported together.
 
 		Args:
-		  value: A str or value convertable to a str.
+		  configs: An iterable of dicts or strs, as taken by __init__.
 
 		Returns:
-		  A str. This is the converted and validated value.
+		  A list of validated configs, in order.
 
 		Raises:
-		  ValueError if value is not valid for this field
+		  BatchValidationError if any of the configs are invalid.
 		"""
-		str_value = str(value)
-		if self.pattern and not re.match(self.pattern, str_value):
-			raise ValueError("Value for field '{0}': '{1}' does not match pattern.".format(self.name, str_value))
-		return str_value
-
-class BoolField(Field):
-	"""A field that expects a boolean value"""
-
-	TRUE_VALUES = ["true", "True", "1", "yes", True, 1]
-
-	def validate(self, value):
-		"""Ensure that supplied value is a valid boolean
-
-		The supplied value will be checked against a list of
-		true values. If the value is not in the list, it is
-		considered False.
+		# skip the metaclass and __init__ for each dict, unless a subclass
+		# has its own way of constructing itself
+		direct = (cls.__init__.im_func is CheckedConfig.__init__.im_func and
+			not cls.LAZY)
+		results = []
+		errors = []
+		for index, config in enumerate(configs):
+			try:
+				if not direct or isinstance(config, types.StringTypes):
+					results.append(cls(config).validate_all())
+					continue
+				if cls.DISK_CACHE_DIR is None:
+					valid_config = cls._validator(config)
+				else:
+					valid_config = _disk_cached_validate(cls, config)
+				instance = object.__new__(cls)
+				instance._populate(valid_config)
+				results.append(instance)
+			except (ValueError, TypeError, IOError) as e:
+				errors.append((index, e))
+				results.append(None)
+		if errors:
+			raise BatchValidationError(errors, results)
+		return results
+
+	def refresh(self, config):
+		"""Validate a new version of this config, in place
+
+		Only the fields, nested fields and list items whose raw values
+		changed are validated again. The values of the rest are kept as
+		they are, so unchanged nested records are the same objects. That
+		takes the raw config this one was validated from, which lazy
+		configs, configs constructed from a file name and refreshed
+		configs keep; others are validated again in full the first time.
+
+		A config constructed from a file name is no longer the one
+		returned for that name once refreshed.
 
 		Args:
-		  value: A bool or value convertable to a bool.
+		  config: a dict or a str, as taken by __init__.
 
 		Returns:
-		  A bool. This is the converted and validated value.
-		"""
-		return value in self.TRUE_VALUES
-
-class ListField(Field):
-	"""A field that expects a list of values"""
+		  This config.
 
-	def __init__(self, name, field_type):
-		"""Initialize this ListField
-
-		Args:
-		  name: A str. The name of this field.
-		  field_type: A Field. All values in this sequence
-		    will be validated against it. The name of this
-		    field is meaningless and will be ignored.
+		Raises:
+		  ValueError if any of the changed fields are not valid. This
+		    config is left as it was.
 		"""
-		super(ListField, self).__init__(name)
-		self.field_type = field_type
-
-	def validate(self, value):
-		"""Ensure that supplied value is a valid list field
+		if isinstance(config, types.StringTypes):
+			config = Config.fetch_config(config)
+		self._refresh_from(self, config)
+		instances = type(self)._instances
+		for key, cached in instances.items():
+			if cached[1] is self:
+				instances.pop(key, None)
+		return self
+
+	def _refresh_from(self, old, config):
+		"""Set this config to config, reusing the unchanged values of old"""
+		old_raw = getattr(old, "_raw", None)
+		if self.LAZY:
+			# keep the values that were validated and have not changed;
+			# the rest are validated on access again
+			missing = object()
+			old_dict = getattr(old, "__dict__", {})
+			for field in self.CONFIG_FIELDS:
+				name = field.name
+				if name in old_dict and old_raw is not None and _unchanged(
+						old_raw.get(name, missing), config.get(name, missing)):
+					self.__dict__[name] = old_dict[name]
+				else:
+					self.__dict__.pop(name, None)
+		elif type(old_raw) is dict and type(config) is dict:
+			valid_config, _ = _revalidate(self.CONFIG_FIELDS, old_raw, old, config)
+			self._populate(valid_config)
+		else:
+			self._populate(self._validator(config))
+		# only once the new version is valid, so a failed refresh leaves
+		# this config as it was
+		for name in self._derived:
+			self.__dict__.pop(name, None)
+		self._raw = config
 
-		Verifies that the supplied value is a list which contains
-		fields that validate against self.field_type.
+	@classmethod
+	def live(cls, name, poll_interval=1.0):
+		"""Returns a LiveConfig that follows changes to a config file
 
 		Args:
-		  value: A list. The list should contain values that
-		    validate against self.field_type.
-
-		Returns:
-		  A list of validated values.
+		  name: A str. The config file name, as taken by __init__.
+		  poll_interval: A float or None. The seconds between checks of
+		    the file for changes, in a background thread. If None, there
+		    is no thread and changes are picked up by calling check.
 
 		Raises:
-		  ValueError if any of the list field values are not valid.
+		  ValueError if the config is not valid now.
 		"""
-		return [self.field_type.validate(v) for v in value]
+		return LiveConfig(cls, name, poll_interval)
 
-class NestedField(Field):
-	"""A field that contains a dictionary of other fields"""
+	def validate_all(self):
+		"""Validate every field of this config
 
-	def __init__(self, name, *config_fields):
-		"""Initialize this NestedField
-
-		Note: NestedFields cannot have default values. However,
-		fields nested under them can.
-
-		Args:
-		  name: A str. The name of this field.
-		  config_fields: A list of Fields. Defines the fields nested
-		    under this field.
-		"""
-		super(NestedField, self).__init__(name)
-		self.config_fields = config_fields
-		self.tuple_type = collections.namedtuple("NestedField_{0}".format(name),
-				[c.name for c in config_fields])
-
-	def validate(self, value):
-		"""Ensure that supplied value is a valid nested field
-
-		Verifies that the supplied value contains all the fields defined
-		by config_fields and that they have appropriate values (or
-		appropriate defaults if the fields are missing).
-
-		Args:
-		  value: A dict. Describes the names and values of the fields
-		    nested under this field.
+		Lazy configs validate each field on first access, lazy ListFields
+		each item, and FileRefFields each referenced file; this validates
+		the rest, so that an invalid config fails here rather than when
+		an invalid field is used.
 
 		Returns:
-		  A namedtuple type. This allows attribute access to nested
-		    fields.
+		  This config.
 
 		Raises:
-		  ValueError if any of the nested field values are not valid.
+		  ValueError if any of the fields are not valid.
 		"""
-		valid_dict = _validate(value, self.config_fields)
-		return self.tuple_type(**valid_dict)
-
+		_validate_all(self, set())
+		return self
+
+	def __getstate__(self):
+		state = dict((field.name, getattr(self, field.name))
+			for field in self.CONFIG_FIELDS)
+		state.update(getattr(self, "__dict__", {}))
+		state.pop("_raw", None)
+		for name in self._derived:
+			state.pop(name, None)
+		return state
+
+	def __setstate__(self, state):
+		for name, value in state.iteritems():
+			setattr(self, name, value)
+
+def _validate_lazy(value, seen):
+	"""Validate all of the LazyLists and FileRefs in a validated value"""
+	if isinstance(value, FileRef):
+		_validate_all(value._config, seen)
+	if isinstance(value, LazyList):
+		value.validate_all()
+	if isinstance(value, (list, LazyList, Record)):
+		for item in value:
+			_validate_lazy(item, seen)
+
+def _validate_all(config, seen):
+	# configs can refer to each other in a cycle
+	if id(config) in seen:
+		return
+	seen.add(id(config))
+	for field in config.CONFIG_FIELDS:
+		_validate_lazy(getattr(config, field.name), seen)
@@ -0,0 +1,317 @@
+"""
+Compiles configs into Python modules, for read-only deploys.
+
+Parsing YAML is the slowest part of loading a config. compile_configs
+renders each resolved config into a module of literals, and byte-compiles
+it, so that loading it is an import: the .pyc is unmarshalled and its
+constants built, with no parsing at all.
+
+	python -m kconfig.compiled -o build/configs databases/reports.yml \
+		'memcached/sessions.yml=myapp.configs:MemcacheConfig'
+
+A config given with a CheckedConfig class is validated against it first,
+and the build fails if it is invalid. CompiledConfigDefault serves configs
+from the compiled modules, and falls back to the YAML when any file a
+config was built from is newer than the module or cannot be found:
+
+	kconfig.Config = kconfig.compiled.CompiledConfigDefault("build/configs")
+"""
+
+import datetime
+import hashlib
+import imp
+import optparse
+import os
+import py_compile
+import re
+import sys
+import tempfile
+
+import kconfig
+from kconfig import ConfigDefault
+from kconfig import Sidecar
+from kconfig import _mtime
+from kconfig import apply_env_overrides
+from kconfig import find_config_path
+
+def _source_key(path, config_path):
+	"""
+	(the index of the first prefix a file is under, its path relative to
+	that prefix), or its absolute path if it is under none of them, so that
+	a copy of the prefixes anywhere else has the same keys.
+	"""
+	path = os.path.abspath(path)
+	for index, prefix in enumerate(config_path.prefixes):
+		prefix = os.path.abspath(os.path.expanduser(prefix))
+		if path.startswith(prefix + os.sep):
+			return (index, path[len(prefix) + 1:])
+	return path
+
+def _source_path(key, config_path):
+	"""The path of a file from its _source_key, or None if there is none"""
+	if not isinstance(key, tuple):
+		return key
+	index, relative = key
+	if index >= len(config_path.prefixes):
+		return None
+	return os.path.join(os.path.expanduser(config_path.prefixes[index]),
+		relative)
+
+def _resolved_name(name, config_path):
+	"""
+	The path of the file a config file name resolves to, relative to the
+	prefix it was found in: the same for every name of the file, and for
+	a copy of the prefix anywhere else.
+	"""
+	key = _source_key(find_config_path(name, config_path=config_path),
+		config_path)
+	if isinstance(key, tuple):
+		return key[1]
+	return key
+
+def module_name(name, config_path=None):
+	"""
+	The name of the module a config file compiles to. "x", "x.yml" and the
+	path of the file all compile to the same module.
+	Parameters:
+	 - name: a config file name
+	 - config_path: the ConfigPathDefaults to resolve it in. (optional)
+	Raises:
+	 - IOError if no file is found
+	"""
+	if not config_path:
+		config_path = kconfig.ConfigPath
+	resolved = _resolved_name(name, config_path)
+	return "kconfig_%s_%s" % (re.sub(r"\W", "_", resolved),
+		hashlib.sha1(resolved).hexdigest()[:8])
+
+_LITERAL_TYPES = (basestring, bool, int, long, type(None))
+
+def _literal(value, out):
+	"""Appends the source of an expression that evaluates to value"""
+	if isinstance(value, _LITERAL_TYPES):
+		out.append(repr(value))
+	elif isinstance(value, float):
+		if value != value or value in (float("inf"), float("-inf")):
+			out.append("float(%r)" % repr(value))
+		else:
+			out.append(repr(value))
+	elif isinstance(value, dict):
+		out.append("{")
+		for key, item in value.iteritems():
+			_literal(key, out)
+			out.append(": ")
+			_literal(item, out)
+			out.append(", ")
+		out.append("}")
+	elif isinstance(value, list):
+		out.append("[")
+		for item in value:
+			_literal(item, out)
+			out.append(", ")
+		out.append("]")
+	elif isinstance(value, tuple):
+		out.append("(")
+		for item in value:
+			_literal(item, out)
+			out.append(", ")
+		out.append(")")
+	elif isinstance(value, Sidecar):
+		out.append("_sidecar(%r, %r)" % (value.path, value.mtime))
+	elif type(value) in (datetime.date, datetime.datetime) and (
+			getattr(value, "tzinfo", None) is None):
+		out.append(repr(value))
+	else:
+		raise ValueError("Cannot compile a %s: %r" % (type(value).__name__, value))
+
+def render(config, sources, schema=None):
+	"""
+	Returns the source of the module for a config.
+	Parameters:
+	 - config: the resolved config
+	 - sources: a dict of the files it was built from, by _source_key, to
+	   their mtimes
+	 - schema: the "module:Class" it was validated against. (optional)
+	Raises:
+	 - ValueError if the config has a value that cannot be compiled
+	"""
+	out = ["# Generated by kconfig.compiled; do not edit.\n",
+		"import datetime\n",
+		"from kconfig import _unpickle_sidecar as _sidecar\n",
+		"SCHEMA = %r\n" % (schema,),
+		"SOURCES = "]
+	_literal(sources, out)
+	out.append("\nCONFIG = ")
+	_literal(config, out)
+	out.append("\n")
+	return "".join(out)
+
+def _sources(config_default, name):
+	"""The files a config fetched through config_default was built from"""
+	key = name + "__None"
+	if config_default.layered:
+		sources = dict(config_default.layer_merges.get(key, ([], []))[0])
+	else:
+		path = find_config_path(name, config_path=config_default.config_path)
+		sources = {path: config_default.mtimes[key]}
+	sources.update(config_default.dependencies.get(key, {}))
+	return dict((_source_key(path, config_default.config_path), mtime)
+		for path, mtime in sources.iteritems())
+
+def compile_configs(configs, output_dir, config_default=None):
+	"""
+	Compiles configs into modules in output_dir, and byte-compiles them.
+	Parameters:
+	 - configs: a list of (config file name, "module:Class" or None) pairs
+	 - output_dir: the directory to write the modules to
+	 - config_default: the ConfigDefault that resolves the configs; its
+	   options, like includes and interpolate, apply. (optional, defaults
+	   to kconfig.Config)
+	Returns:
+	 - the paths of the modules written
+	Raises:
+	 - IOError if a config is not found
+	 - ValueError if a config is not valid for its class, or cannot be
+	   compiled
+	 - ImportError if a class cannot be imported
+	"""
+	from kconfig.validate import load_schema
+	if config_default is None:
+		config_default = kconfig.Config
+	if not os.path.isdir(output_dir):
+		os.makedirs(output_dir)
+	paths = []
+	for name, schema in configs:
+		config = config_default.fetch_config(name)
+		if schema is not None:
+			load_schema(schema)(config)
+		source = render(config, _sources(config_default, name), schema)
+		path = os.path.join(output_dir,
+			module_name(name, config_default.config_path) + ".py")
+		fd, temp_path = tempfile.mkstemp(dir=output_dir, suffix=".tmp")
+		try:
+			with os.fdopen(fd, "w") as f:
+				f.write(source)
+			os.rename(temp_path, path)
+		except:
+			if os.path.exists(temp_path):
+				os.remove(temp_path)
+			raise
+		py_compile.compile(path, doraise=True)
+		paths.append(path)
+	return paths
+
+class CompiledConfigDefault(ConfigDefault):
+	"""
+	A ConfigDefault that serves configs from modules built by
+	compile_configs. A config is read from its YAML as usual, with the
+	options of this ConfigDefault, when it was not compiled or when a file
+	it was built from is newer than the module, or is missing. The files
+	are found under the prefixes of this ConfigDefault, which may be a copy
+	of the ones the modules were built from. Env overrides are applied
+	to compiled configs too; the other options were applied when they were
+	compiled.
+	"""
+	def __init__(self, compiled_dir, **kwargs):
+		"""
+		Parameters:
+		 - compiled_dir: the output_dir of compile_configs
+		 - the options of ConfigDefault
+		"""
+		super(CompiledConfigDefault, self).__init__(**kwargs)
+		self.compiled_dir = compiled_dir
+		# config file name -> compiled module, or None if there is none
+		self.modules = {}
+		# key -> the module its cached config came from
+		self.compiled = {}
+
+	def _module(self, name):
+		if name in self.modules:
+			return self.modules[name]
+		try:
+			module_id = module_name(name, self.config_path)
+			found = imp.find_module(module_id, [self.compiled_dir])
+		except (IOError, ImportError):
+			module = None
+		else:
+			# loads the .pyc when it is current
+			try:
+				module = imp.load_module(module_id, *found)
+			finally:
+				if found[0] is not None:
+					found[0].close()
+		self.modules[name] = module
+		return module
+
+	def _stale(self, module):
+		for key, mtime in module.SOURCES.iteritems():
+			path = _source_path(key, self.config_path)
+			current = path and _mtime(path)
+			# a file that is gone can not vouch for the module
+			if current is None or current > mtime:
+				return True
+		return False
+
+	def fetch_config(self, default, config=None):
+		"""
+		Returns a config, from its compiled module if it is current. See
+		ConfigDefault.fetch_config.
+		"""
+		key = str(default) + "__" + str(config)
+		retcfg = default
+		if config:
+			retcfg = config
+		with self._lock:
+			module = self._module(retcfg)
+			if module is None or self._stale(module):
+				self.compiled.pop(key, None)
+				return super(CompiledConfigDefault, self).fetch_config(
+					default, config)
+			if self.compiled.get(key) is not module or key not in self.config_types:
+				value = module.CONFIG
+				if self.env_prefix:
+					value = apply_env_overrides(
+						value, self._env_overrides_for(retcfg))
+				self._add_config(value, default, config)
+				if self.env_prefix:
+					self.bases[key] = (retcfg, module.CONFIG)
+				self.compiled[key] = module
+			return self.config_types[key]
+
+def main(argv=None):
+	parser = optparse.OptionParser(
+		usage="%prog -o DIR [options] name[=module:Class] ...",
+		description="Compile configs into Python modules.")
+	parser.add_option("-o", "--output", help="the directory to write to")
+	parser.add_option("-p", "--prefix", action="append", dest="prefixes",
+		help="a config path prefix to look for files under; may be given "
+			"more than once [default: the kconfig.ConfigPath prefixes]")
+	parser.add_option("--includes", action="store_true", default=False,
+		help="resolve extends: and include: directives")
+	parser.add_option("--interpolate", action="store_true", default=False,
+		help="resolve ${...} references")
+	options, args = parser.parse_args(argv)
+	if not options.output:
+		parser.error("no output directory given")
+	if not args:
+		parser.error("no configs given")
+	configs = []
+	for arg in args:
+		name, _, schema = arg.partition("=")
+		configs.append((name, schema or None))
+	config_path = None
+	if options.prefixes:
+		config_path = kconfig.ConfigPathDefaults(options.prefixes)
+	config_default = ConfigDefault(config_path=config_path,
+		includes=options.includes, interpolate=options.interpolate)
+	try:
+		paths = compile_configs(configs, options.output, config_default)
+	except (IOError, ValueError, ImportError) as e:
+		sys.stderr.write("%s: %s\n" % (type(e).__name__, e))
+		return 1
+	for path in paths:
+		sys.stdout.write(path + "\n")
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,511 @@
+"""
+A local config daemon (kconfigd) and a ConfigDefault backend that talks to it.
+
+Every process on a host that uses kconfig.Config stats and parses the same
+files under the config prefixes independently. The daemon owns the parsing
+and watching for the whole host and serves the parsed configs over a unix
+domain socket. Processes use DaemonConfig in place of ConfigDefault:
+
+	import kconfig
+	from kconfig.daemon import DaemonConfig
+	kconfig.Config = DaemonConfig()
+
+and run the daemon with:
+
+	python -m kconfig.daemon
+
+The wire protocol is a fixed header (opcode, name length, body length)
+followed by the name and the body. Parsed configs are sent pickled, so
+clients only unpickle what a daemon running as a trusted user sends: the
+socket lives in a directory only the daemon's user can write to, and
+clients check the uid of the process at the other end (Linux only; on
+other platforms clients read the files directly). The daemon only serves
+names that stay under the config prefixes.
+"""
+
+import cPickle
+import hashlib
+import logging
+import optparse
+import os
+import socket
+import SocketServer
+import stat
+import struct
+import sys
+import threading
+import time
+
+import kconfig
+
+DEFAULT_SOCKET = "/var/run/kconfigd/kconfigd.sock"
+
+# requests
+OP_FETCH = 1
+OP_SUBSCRIBE = 2
+# responses
+OP_OK = 16
+OP_NOT_MODIFIED = 17
+OP_MISSING = 18
+OP_ERROR = 19
+# pushed to subscribers
+OP_CHANGED = 32
+
+_HEADER = struct.Struct("!BHI")
+
+# Python 2 does not export SO_PEERCRED; this is its value on Linux
+_SO_PEERCRED = getattr(socket, "SO_PEERCRED",
+	17 if sys.platform.startswith("linux") else None)
+_PEERCRED = struct.Struct("3i")
+
+log = logging.getLogger(__name__)
+
+class DaemonUnavailable(Exception):
+	"""Raised when the daemon cannot be reached or breaks protocol"""
+
+def _send_message(sock, opcode, name="", body=""):
+	sock.sendall(_HEADER.pack(opcode, len(name), len(body)) + name + body)
+
+def _recv_exactly(sock, size):
+	chunks = []
+	while size:
+		chunk = sock.recv(min(size, 65536))
+		if not chunk:
+			raise EOFError("kconfigd connection closed")
+		chunks.append(chunk)
+		size -= len(chunk)
+	return "".join(chunks)
+
+def _recv_message(sock):
+	opcode, name_len, body_len = _HEADER.unpack(
+		_recv_exactly(sock, _HEADER.size))
+	name = _recv_exactly(sock, name_len)
+	body = _recv_exactly(sock, body_len)
+	return opcode, name, body
+
+def _peer_uid(sock):
+	"""The uid of the process at the other end of a unix socket, or None
+	if the platform can not tell"""
+	if _SO_PEERCRED is None:
+		return None
+	_, uid, _ = _PEERCRED.unpack(sock.getsockopt(socket.SOL_SOCKET,
+		_SO_PEERCRED, _PEERCRED.size))
+	return uid
+
+def _check_name(name):
+	"""
+	Raises:
+	 - ValueError if name is absolute or climbs out of the prefixes
+	"""
+	parts = name.replace(os.sep, "/").split("/")
+	if os.path.isabs(name) or name.startswith("~") or ".." in parts:
+		raise ValueError("kconfigd only serves names under the config "
+			"prefixes: %s" % name)
+
+def _socket_dir(path):
+	"""
+	Makes the directory of a socket, writable only by this user, or
+	checks that the existing one is.
+	Raises:
+	 - IOError if another user could replace the socket
+	"""
+	directory = os.path.dirname(os.path.abspath(path))
+	if not os.path.isdir(directory):
+		os.makedirs(directory, 0755)
+	info = os.stat(directory)
+	if (info.st_uid not in (os.getuid(), 0) or
+			info.st_mode & (stat.S_IWGRP | stat.S_IWOTH)):
+		raise IOError("kconfigd socket directory %s is writable by other "
+			"users" % directory)
+
+def _file_signature(path):
+	stat = os.stat(path)
+	return (path, stat.st_mtime, stat.st_size)
+
+def _etag(signature):
+	return hashlib.md5(repr(signature)).hexdigest()[:16]
+
+class _DaemonServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+	daemon_threads = True
+
+class _DaemonHandler(SocketServer.BaseRequestHandler):
+	def handle(self):
+		daemon = self.server.config_daemon
+		sock = self.request
+		with daemon._lock:
+			daemon.connections.add(sock)
+		try:
+			while True:
+				try:
+					opcode, name, body = _recv_message(sock)
+				except (EOFError, socket.error, struct.error):
+					return
+				if opcode == OP_FETCH:
+					daemon.handle_fetch(sock, name, body)
+				elif opcode == OP_SUBSCRIBE:
+					daemon.handle_subscribe(sock)
+					return
+				else:
+					_send_message(sock, OP_ERROR,
+						body="unknown opcode %d" % opcode)
+		finally:
+			with daemon._lock:
+				daemon.connections.discard(sock)
+
+class ConfigDaemon(object):
+	"""
+	Serves parsed configs to DaemonConfig clients.
+	Each config is parsed and pickled once when first requested, then
+	watched: every poll_interval seconds the daemon re-resolves and stats
+	the files it has served, along with the included files and sidecars
+	each depends on, reloads the ones that changed and pushes a change
+	notification to every subscribed client.
+	"""
+	def __init__(self, socket_path=DEFAULT_SOCKET, config_path=None,
+			poll_interval=1.0, includes=False):
+		if not config_path:
+			config_path = kconfig.ConfigPath
+		self.socket_path = socket_path
+		self.config_path = config_path
+		self.poll_interval = poll_interval
+		# parses the files, and tracks what each config depends on
+		self.loader = kconfig.ConfigDefault(config_path=config_path,
+			includes=includes)
+		# name -> (signature, etag, pickled payload)
+		self.entries = {}
+		self.subscribers = []
+		self.connections = set()
+		self.parses = 0
+		self._lock = threading.Lock()
+		self._stopped = threading.Event()
+		self._server = None
+		self._threads = []
+
+	def _bind(self):
+		_socket_dir(self.socket_path)
+		if os.path.exists(self.socket_path):
+			probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+			try:
+				probe.connect(self.socket_path)
+			except socket.error:
+				os.unlink(self.socket_path)
+			else:
+				probe.close()
+				raise IOError("kconfigd already listening on %s" % (
+					self.socket_path))
+		self._server = _DaemonServer(self.socket_path, _DaemonHandler)
+		self._server.config_daemon = self
+
+	def start(self):
+		"""
+		Binds the socket and serves and watches in background threads.
+		Returns self so a test can do daemon = ConfigDaemon(...).start()
+		"""
+		self._bind()
+		for target in (self._server.serve_forever, self._watch):
+			thread = threading.Thread(target=target)
+			thread.daemon = True
+			thread.start()
+			self._threads.append(thread)
+		return self
+
+	def serve_forever(self):
+		"""Binds the socket and serves in the calling thread"""
+		self._bind()
+		watcher = threading.Thread(target=self._watch)
+		watcher.daemon = True
+		watcher.start()
+		try:
+			self._server.serve_forever()
+		finally:
+			self.shutdown()
+
+	def shutdown(self):
+		self._stopped.set()
+		if self._server is not None:
+			server, self._server = self._server, None
+			if self._threads:
+				server.shutdown()
+			server.server_close()
+			with self._lock:
+				connections = list(self.connections)
+			for sock in connections:
+				try:
+					sock.shutdown(socket.SHUT_RDWR)
+				except socket.error:
+					pass
+			if os.path.exists(self.socket_path):
+				os.unlink(self.socket_path)
+
+	def _signature(self, name, dependencies):
+		"""The signature of a config file and the files it depends on"""
+		path = kconfig.find_config_path(name, config_path=self.config_path)
+		return (_file_signature(path),) + tuple(sorted(dependencies.iteritems()))
+
+	def _current_signature(self, name, signature):
+		dependencies = dict((path, kconfig._mtime(path))
+			for path, _ in signature[1:])
+		return self._signature(name, dependencies)
+
+	def _load(self, name):
+		# stat before parsing so a write racing the parse is seen as a change
+		main = self._signature(name, {})
+		value = self.loader.fetch_config(name)
+		self.parses += 1
+		# the dependencies are stamped with the mtimes they were parsed at
+		signature = main + tuple(sorted(
+			self.loader.dependencies.get(name + "__None", {}).iteritems()))
+		payload = cPickle.dumps(value, cPickle.HIGHEST_PROTOCOL)
+		return (signature, _etag(signature), payload)
+
+	def lookup(self, name):
+		"""
+		Returns (etag, pickled payload) for a config name.
+		Raises:
+		 - IOError if no file is found
+		 - ValueError if the name is not under the config prefixes
+		"""
+		_check_name(name)
+		with self._lock:
+			entry = self.entries.get(name)
+			if entry is None:
+				entry = self.entries[name] = self._load(name)
+		return entry[1], entry[2]
+
+	def handle_fetch(self, sock, name, etag):
+		try:
+			current, payload = self.lookup(name)
+		except IOError as e:
+			_send_message(sock, OP_MISSING, name, str(e))
+		except ValueError as e:
+			# the client reads such names itself
+			_send_message(sock, OP_ERROR, name, str(e))
+		except Exception as e:
+			log.exception("kconfigd failed to load %s", name)
+			_send_message(sock, OP_ERROR, name, str(e))
+		else:
+			if etag == current:
+				_send_message(sock, OP_NOT_MODIFIED, current)
+			else:
+				_send_message(sock, OP_OK, current, payload)
+
+	def handle_subscribe(self, sock):
+		send_lock = threading.Lock()
+		with self._lock:
+			self.subscribers.append((sock, send_lock))
+			with send_lock:
+				_send_message(sock, OP_OK)
+		try:
+			# the client never writes on this connection; block until it
+			# goes away
+			while sock.recv(1):
+				pass
+		except socket.error:
+			pass
+		finally:
+			with self._lock:
+				if (sock, send_lock) in self.subscribers:
+					self.subscribers.remove((sock, send_lock))
+
+	def check_for_changes(self):
+		"""
+		Re-resolves and stats every config served so far, reloads the
+		changed ones and notifies subscribers. Returns the changed names.
+		"""
+		changed = []
+		with self._lock:
+			for name, entry in self.entries.items():
+				try:
+					signature = self._current_signature(name, entry[0])
+				except (IOError, OSError):
+					del self.entries[name]
+					changed.append(name)
+					continue
+				if signature == entry[0]:
+					continue
+				changed.append(name)
+				try:
+					self.entries[name] = self._load(name)
+				except Exception:
+					# reloaded lazily on the next fetch
+					log.exception("kconfigd failed to reload %s", name)
+					del self.entries[name]
+			subscribers = list(self.subscribers)
+		for name in changed:
+			for sock, send_lock in subscribers:
+				try:
+					with send_lock:
+						_send_message(sock, OP_CHANGED, name)
+				except socket.error:
+					pass
+		return changed
+
+	def _watch(self):
+		while not self._stopped.wait(self.poll_interval):
+			try:
+				self.check_for_changes()
+			except Exception:
+				log.exception("kconfigd watcher failed")
+
+class DaemonConfig(kconfig.ConfigDefault):
+	"""
+	A ConfigDefault that gets its configs from a ConfigDaemon.
+	Configs are cached in process. While the push channel to the daemon is
+	up, a cached config is returned without any I/O until the daemon
+	reports that it changed; otherwise each fetch revalidates the cached
+	copy against the daemon by etag. If the daemon can not be reached,
+	configs are read directly from disk exactly like ConfigDefault does,
+	and the daemon is retried every retry_interval seconds. So is a daemon
+	that does not run as one of daemon_uids, which defaults to this
+	process's uid and root.
+	"""
+	def __init__(self, socket_path=DEFAULT_SOCKET, config_path=None,
+			timeout=1.0, retry_interval=5.0, daemon_uids=None):
+		super(DaemonConfig, self).__init__(config_path=config_path)
+		self.socket_path = socket_path
+		if daemon_uids is None:
+			daemon_uids = (os.getuid(), 0)
+		self.daemon_uids = frozenset(daemon_uids)
+		self.timeout = timeout
+		self.retry_interval = retry_interval
+		self.etags = {}
+		# cache key -> config name, for keys the push channel vouches for
+		self._valid = {}
+		self._notifications = 0
+		self._sock = None
+		self._listener = None
+		self._down_until = 0
+
+	def _connect(self):
+		sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		sock.settimeout(self.timeout)
+		try:
+			sock.connect(self.socket_path)
+			uid = _peer_uid(sock)
+			if uid not in self.daemon_uids:
+				raise socket.error("kconfigd on %s runs as untrusted uid %s" % (
+					self.socket_path, uid))
+		except socket.error:
+			sock.close()
+			raise
+		return sock
+
+	def _ensure_connected(self):
+		if self._sock is not None:
+			return
+		if time.time() < self._down_until:
+			raise DaemonUnavailable("kconfigd is down")
+		try:
+			self._sock = self._connect()
+			self._listener = listener = self._connect()
+			_send_message(listener, OP_SUBSCRIBE)
+			if _recv_message(listener)[0] != OP_OK:
+				raise socket.error("kconfigd refused subscription")
+			listener.settimeout(None)
+		except (EOFError, socket.error, struct.error) as e:
+			self._disconnect()
+			raise DaemonUnavailable(str(e))
+		thread = threading.Thread(target=self._listen, args=(listener,))
+		thread.daemon = True
+		thread.start()
+
+	def _disconnect(self):
+		self._down_until = time.time() + self.retry_interval
+		for sock in (self._sock, self._listener):
+			if sock is not None:
+				try:
+					sock.close()
+				except socket.error:
+					pass
+		self._sock = self._listener = None
+		self._valid.clear()
+
+	def _listen(self, listener):
+		try:
+			while True:
+				opcode, name, _ = _recv_message(listener)
+				if opcode == OP_CHANGED:
+					self._notifications += 1
+					for key, valid_name in self._valid.items():
+						if valid_name == name:
+							self._valid.pop(key, None)
+		except (EOFError, socket.error, struct.error):
+			pass
+		# without the push channel nothing in the cache can be trusted
+		with self._lock:
+			if self._listener is listener:
+				self._disconnect()
+
+	def _request(self, default, config, key):
+		etag = self.etags.get(key, "") if key in self.config_types else ""
+		try:
+			_send_message(self._sock, OP_FETCH, config or default, etag)
+			opcode, new_etag, body = _recv_message(self._sock)
+		except (EOFError, socket.error, struct.error) as e:
+			self._disconnect()
+			raise DaemonUnavailable(str(e))
+		if opcode == OP_NOT_MODIFIED:
+			return self.config_types[key]
+		if opcode == OP_MISSING:
+			if self.mtimes.get(key) == -1 and key not in self.etags:
+				# injected with _add_config
+				return self.config_types[key]
+			raise IOError(body)
+		if opcode != OP_OK:
+			raise DaemonUnavailable("kconfigd error: %s" % body)
+		value = self._add_loaded_config(
+			cPickle.loads(body), default, config, -1)
+		self.etags[key] = new_etag
+		return value
+
+	def fetch_config(self, default, config=None):
+		"""
+		Returns the content of a yml config file as a hash, served by the
+		daemon when it is up and read from disk when it is not.
+		Raises:
+		 - IOError if no file is found
+		"""
+		key = str(default) + "__" + str(config)
+		if key in self._valid:
+			return self.config_types[key]
+		name = config or default
+		with self._lock:
+			try:
+				self._ensure_connected()
+				seen = self._notifications
+				value = self._request(default, config, key)
+			except DaemonUnavailable:
+				log.debug("kconfigd unavailable, reading %s from disk", name)
+				self._valid.pop(key, None)
+				self.etags.pop(key, None)
+				return super(DaemonConfig, self).fetch_config(default, config)
+			if seen == self._notifications and self._listener is not None:
+				self._valid[key] = name
+		return value
+
+def main(argv=None):
+	parser = optparse.OptionParser(
+		usage="%prog [options] [prefix ...]",
+		description="Serve parsed kconfig files over a unix socket.")
+	parser.add_option("--socket", default=DEFAULT_SOCKET,
+		help="unix socket to listen on, in a directory only this user can "
+			"write to [default: %default]")
+	parser.add_option("--poll-interval", type="float", default=1.0,
+		help="seconds between checks for changed files [default: %default]")
+	parser.add_option("--includes", action="store_true", default=False,
+		help="resolve extends: and include: directives")
+	options, prefixes = parser.parse_args(argv)
+	logging.basicConfig(level=logging.INFO)
+	config_path = None
+	if prefixes:
+		config_path = kconfig.ConfigPathDefaults(prefixes)
+	daemon = ConfigDaemon(options.socket, config_path=config_path,
+		poll_interval=options.poll_interval, includes=options.includes)
+	log.info("kconfigd listening on %s", options.socket)
+	try:
+		daemon.serve_forever()
+	except KeyboardInterrupt:
+		pass
+
+if __name__ == "__main__":
+	main()
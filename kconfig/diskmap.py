@@ -0,0 +1,275 @@
+"""
+Read-only mappings of large YAML tables, served from an on-disk index.
+
+A config that is a 100k entry lookup table is slow to parse and large to
+keep in every process. DiskMap compiles the table into a sqlite index next
+to it, once, and then looks entries up in the index as they are used:
+
+	tenants.yml
+	tenants.yml.index.sqlite
+
+The index records the mtime of the table and a signature of how its values
+were converted, and is rebuilt when either changes. It is written to a
+temporary file and renamed into place, so processes can share it and
+rebuild it concurrently. If the index cannot be written, the table is kept
+in memory instead.
+
+Keys are looked up the way a dict looks them up: keys that are equal and
+hash alike, like 1, 1L, 1.0 and True, or "a" and u"a", are the same key,
+stored as the int or str of them.
+"""
+
+import collections
+import cPickle
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+
+import yaml
+
+# the index format, part of the signature of every index
+_FORMAT = "2"
+
+_Loader = getattr(yaml, "CLoader", yaml.Loader)
+
+def index_path(path):
+	"""The path of the index of the table at path"""
+	return path + ".index.sqlite"
+
+def _load_table(path):
+	with open(path) as f:
+		table = yaml.load(f, Loader=_Loader)
+	if table is None:
+		return {}
+	if not isinstance(table, dict):
+		raise ValueError("Table %s is not a mapping" % path)
+	return table
+
+def _convert(table, convert):
+	if convert is None:
+		return table
+	return dict((key, convert(value)) for key, value in table.iteritems())
+
+def build_index(path, signature, convert=None):
+	"""
+	Compiles the table at path into its index.
+	Parameters:
+	 - path: the path of a YAML file holding one mapping
+	 - signature: a str describing convert; indexes with another signature
+	   are rebuilt
+	 - convert: a function applied to each value before it is stored.
+	   (optional)
+	Raises:
+	 - ValueError if the table is not a mapping, or convert raises it
+	 - sqlite3.Error, OSError or IOError if the index cannot be written
+	"""
+	mtime = os.stat(path).st_mtime
+	table = _convert(_load_table(path), convert)
+	fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+		suffix=".sqlite")
+	os.close(fd)
+	try:
+		connection = sqlite3.connect(temp_path)
+		try:
+			connection.execute("CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT)")
+			connection.execute(
+				"CREATE TABLE entries (key BLOB PRIMARY KEY, value BLOB) WITHOUT ROWID")
+			connection.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?)", (
+				(_encode(_normalize_key(key)), _encode(value))
+				for key, value in table.iteritems()))
+			connection.executemany("INSERT INTO meta VALUES (?, ?)", [
+				("format", _FORMAT),
+				("mtime", repr(mtime)),
+				("signature", signature),
+				("length", str(len(table))),
+			])
+			connection.commit()
+		finally:
+			connection.close()
+		os.rename(temp_path, index_path(path))
+	except:
+		if os.path.exists(temp_path):
+			os.remove(temp_path)
+		raise
+
+def _normalize_key(key):
+	"""Gives keys that are equal in a dict the same pickle"""
+	if isinstance(key, unicode):
+		try:
+			return key.encode("ascii")
+		except UnicodeEncodeError:
+			return key
+	if isinstance(key, bool):
+		return int(key)
+	if isinstance(key, float) and key.is_integer():
+		key = long(key)
+	if isinstance(key, long) and -sys.maxint - 1 <= key <= sys.maxint:
+		return int(key)
+	return key
+
+# index path -> ((pid, inode, mtime) of the index, connection, lock)
+_connections = {}
+_connections_lock = threading.Lock()
+
+def _shared_connection(path):
+	"""
+	Returns a connection to the index at path and the lock to use it under,
+	shared by every DiskMap of that index in this process. A new connection
+	is made after a fork, and when the index is rebuilt, which replaces
+	the file; DiskMaps opened earlier keep the one they were opened with.
+	Raises:
+	 - OSError if there is no index at path
+	"""
+	st = os.stat(path)
+	generation = (os.getpid(), st.st_ino, st.st_mtime)
+	with _connections_lock:
+		cached = _connections.get(path)
+		if cached is None or cached[0] != generation:
+			cached = _connections[path] = (generation,
+				sqlite3.connect(path, check_same_thread=False), threading.Lock())
+	return cached[1], cached[2]
+
+def _encode(value):
+	return sqlite3.Binary(cPickle.dumps(value, cPickle.HIGHEST_PROTOCOL))
+
+def _decode(blob):
+	return cPickle.loads(str(blob))
+
+class DiskMap(collections.Mapping):
+	"""
+	A read-only mapping of the YAML table in a file, looked up through its
+	index. Keys and values are as yaml.load gives them, with values passed
+	through convert.
+	"""
+	def __init__(self, path, convert=None, signature=""):
+		"""
+		Opens the index of a table, building it if it is missing or stale.
+		Parameters:
+		 - path: the path of the YAML table
+		 - convert: a function applied to each value, when the index is built.
+		   (optional)
+		 - signature: a str that changes whenever convert does. (optional)
+		Raises:
+		 - ValueError if the table is not a mapping, or convert raises it
+		"""
+		self.path = path
+		self.convert = convert
+		self.signature = _FORMAT + ":" + signature
+		self._connection = None
+		self._lock = None
+		self._pid = None
+		# the table itself, when it cannot be indexed
+		self._table = None
+		self._length = None
+		self._open()
+
+	def _open(self):
+		mtime = os.stat(self.path).st_mtime
+		try:
+			if self._read_meta(mtime) is None:
+				build_index(self.path, self.signature, self.convert)
+				if self._read_meta(mtime) is None:
+					raise sqlite3.DatabaseError("index of %s is stale" % self.path)
+		except (sqlite3.Error, OSError, IOError):
+			self._connection = None
+			self._table = _convert(_load_table(self.path), self.convert)
+			self._length = len(self._table)
+
+	def _read_meta(self, mtime):
+		"""Connects to the index and returns its length, or None if stale"""
+		self._connection = None
+		try:
+			connection, lock = _shared_connection(index_path(self.path))
+		except OSError:
+			return None
+		try:
+			with lock:
+				meta = dict(connection.execute("SELECT name, value FROM meta"))
+		except sqlite3.DatabaseError:
+			return None
+		if (meta.get("mtime") != repr(mtime) or
+				meta.get("signature") != self.signature):
+			return None
+		self._connection = connection
+		self._lock = lock
+		self._pid = os.getpid()
+		self._length = int(meta["length"])
+		return self._length
+
+	def _connect(self):
+		# connections must not be used across a fork
+		if self._pid != os.getpid():
+			self._connection, self._lock = _shared_connection(
+				index_path(self.path))
+			self._pid = os.getpid()
+		return self._connection
+
+	def __getitem__(self, key):
+		if self._table is not None:
+			return self._table[key]
+		try:
+			encoded = _encode(_normalize_key(key))
+		except (cPickle.PicklingError, TypeError):
+			raise KeyError(key)
+		connection = self._connect()
+		with self._lock:
+			row = connection.execute(
+				"SELECT value FROM entries WHERE key = ?", (encoded,)).fetchone()
+		if row is None:
+			raise KeyError(key)
+		return _decode(row[0])
+
+	def __contains__(self, key):
+		try:
+			self[key]
+		except KeyError:
+			return False
+		return True
+
+	def __len__(self):
+		return self._length
+
+	def __iter__(self):
+		if self._table is not None:
+			return iter(self._table)
+		connection = self._connect()
+		with self._lock:
+			keys = [_decode(row[0]) for row in
+				connection.execute("SELECT key FROM entries")]
+		return iter(keys)
+
+	def __eq__(self, other):
+		if isinstance(other, DiskMap):
+			return (self.path, self.signature) == (other.path, other.signature)
+		return collections.Mapping.__eq__(self, other)
+
+	def __ne__(self, other):
+		return not self == other
+
+	__hash__ = None
+
+	def __repr__(self):
+		return "DiskMap(%r)" % self.path
+
+	def __reduce__(self):
+		# convert is often not picklable, so the unpickled map can only use
+		# an index that is still current
+		if self._table is not None:
+			return (dict, (self._table,))
+		return (_unpickle_disk_map, (self.path, self.signature))
+
+def _unpickle_disk_map(path, signature):
+	disk_map = DiskMap.__new__(DiskMap)
+	disk_map.path = path
+	disk_map.convert = None
+	disk_map.signature = signature
+	disk_map._connection = None
+	disk_map._lock = None
+	disk_map._pid = None
+	disk_map._table = None
+	disk_map._length = None
+	if disk_map._read_meta(os.stat(path).st_mtime) is None:
+		raise ValueError("The index of %s has changed" % path)
+	return disk_map
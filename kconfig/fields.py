@@ -0,0 +1,908 @@
+"""
+The Fields that CheckedConfig schemas are made of. NestedField is in
+kconfig.records and ListField in kconfig.lists; all of them can be
+imported from kconfig.checked_config.
+"""
+
+import array
+import collections
+import hashlib
+import keyword
+import re
+import urlparse
+
+from kconfig import Config
+from kconfig import Sidecar
+from kconfig.diskmap import DiskMap
+from kconfig.validators import _unchanged
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+class Field(object):
+	"""An abstract field definition
+
+	Subclasses are used to define fields in a CheckedConfig.
+	"""
+
+	# Acceptable values must start with a letter, and be followed by zero or
+	# more alpha-numeric or _ characters. Any valid python identifier that
+	# does not start with _ should match.
+	FIELD_PATTERN = re.compile("^[a-zA-Z]\w*$")
+
+	def __init__(self, name, default=None):
+		"""Initialize this Field
+
+		Args:
+		  name: A str. The name of this field. Must be a valid python
+		    identifier that does not begin with '_'.
+		  default: The default value that this field will be set to
+		    if it is not present in the config file. If this is set
+		    to None (the default), then there is no default value and
+		    an error will be raised if the field is missing.
+		"""
+		self.validate_name(name)
+		self.name = name
+		self.default = default
+
+	def validate_name(self, name):
+		"""Validate a field name
+
+		Makes sure that the name is a valid python identifier that does
+		not start with '_' and that it is not a python keyword.
+
+		Args:
+		  name: A str.
+
+		Raises:
+		  ValueError: If this is an invalid name.
+		"""
+		if not re.match(self.FIELD_PATTERN, name):
+			raise ValueError("'{0}' is an invalid name for a config field. "
+					"Config field names must be valid python "
+					"identifiers and cannot start with '_'.".format(name))
+
+		if keyword.iskeyword(name):
+			raise ValueError("'{0}' is an invalid name for a config field. "
+					"It matches a python keyword.".format(name))
+
+	def validate(self, value):
+		"""Validate the supplied value against this field definition
+
+		Abstract method. Should be implemented by subclasses.
+		"""
+		raise NotImplementedError("validate not implemented")
+
+	def validate_list(self, values):
+		"""Validate a sequence of values against this field definition
+
+		Used by ListField. Subclasses override this with faster ways to
+		validate many values at once; an invalid value must raise the
+		same error that validate raises for it.
+
+		Args:
+		  values: An iterable of values.
+
+		Returns:
+		  A list of validated values.
+		"""
+		return [self.validate(v) for v in values]
+
+	def revalidate(self, old, old_value, new):
+		"""Validate a value that replaces an already validated one
+
+		Used to refresh a config. Subclasses for values that contain
+		other values override this to reuse the parts that did not
+		change.
+
+		Args:
+		  old: The raw value that was validated before.
+		  old_value: The validated value of old.
+		  new: The raw value to validate.
+
+		Returns:
+		  The validated value of new, which is old_value if new is the
+		  same as old.
+		"""
+		if _unchanged(old, new):
+			return old_value
+		return self.validate(new)
+
+	def pack(self, value):
+		"""Reduce a validated value to plain data, for kconfig.transport
+
+		Subclasses whose values carry their schema, like records,
+		override this to leave out what the field already knows.
+
+		Args:
+		  value: A value validated by this field.
+
+		Returns:
+		  A picklable value that unpack turns back into value.
+		"""
+		return value
+
+	def unpack(self, data):
+		"""Rebuild a validated value from what pack returned"""
+		return data
+
+	def _inlined(self, field_class):
+		"""Whether validate is field_class's, so its code can be inlined"""
+		return type(self).validate.im_func is field_class.validate.im_func
+
+	def _compile(self, builder, value, result):
+		"""Emit code that validates a value for a generated validator
+
+		The default calls validate. Subclasses override this to inline
+		their validation.
+
+		Args:
+		  builder: the _ValidatorBuilder generating the code.
+		  value: a str. The name of the variable holding the value.
+		  result: a str. The name of the variable to assign the
+		    validated value to.
+		"""
+		builder.emit("{0} = {1}.validate({2})".format(
+			result, builder.const(self, "field"), value))
+
+class IntField(Field):
+	"""A field that expects an integer value"""
+
+	def __init__(self, name, default=None,
+			lower_bound=None, upper_bound=None):
+		"""Initialize this IntField
+
+		Args:
+		  name: A str. The name of this field.
+		  lower_bound: An int or None. The lowest acceptable value
+		    for this field. If None, there is no lower bound.
+		  upper_bound: An int or None. The highest acceptable value
+		    for this field. If None, there is no upper bound.
+		"""
+		super(IntField, self).__init__(name, default)
+		self.lower_bound = lower_bound
+		self.upper_bound = upper_bound
+
+	def validate(self, value):
+		"""Ensure that the supplied value is a valid integer
+
+		It will attempt to convert the supplied value to an integer
+		and ensure that it is between the upper and lower bounds of
+		this field if they exist.
+
+		Args:
+		  value: An int or value convertable to an int.
+
+		Returns:
+		  An int. This is the converted and validated value.
+
+		Raises:
+		  ValueError if value is not valid for this field
+		"""
+		try:
+			int_value = int(value)
+		except ValueError as ve:
+			raise ValueError("Value for field '{0}': {1}".format(self.name, ve.message))
+
+		if self.lower_bound is not None and int_value < self.lower_bound:
+			raise ValueError("Value for field '{0}': {1} is less than lower "
+					"bound {2}".format(self.name, int_value, self.lower_bound))
+		if self.upper_bound is not None and int_value > self.upper_bound:
+			raise ValueError("Value for field '{0}': {1} is greater than upper "
+					"bound {2}".format(self.name, int_value, self.upper_bound))
+		return int_value
+
+	def validate_list(self, values):
+		"""Validate a sequence of integers
+
+		Converts them all in one pass and checks the bounds against the
+		smallest and largest. If anything is wrong, the values are
+		validated one by one to raise the error for the first invalid one.
+		"""
+		if not self._inlined(IntField):
+			return super(IntField, self).validate_list(values)
+		if not isinstance(values, (list, tuple)):
+			values = list(values)
+		try:
+			int_values = [int(v) for v in values]
+		except (ValueError, TypeError):
+			int_values = None
+		if int_values and not (
+				(self.lower_bound is not None and
+					min(int_values) < self.lower_bound) or
+				(self.upper_bound is not None and
+					max(int_values) > self.upper_bound)):
+			return int_values
+		return [self.validate(v) for v in values]
+
+	def _compile(self, builder, value, result):
+		if not self._inlined(IntField):
+			return super(IntField, self)._compile(builder, value, result)
+		builder.emit("try:")
+		builder.emit("\t{0} = int({1})".format(result, value))
+		builder.emit("except ValueError as ve:")
+		builder.emit("\traise ValueError({0!r}.format(ve.message))".format(
+			"Value for field '{0}': {{0}}".format(self.name)))
+		if self.lower_bound is not None:
+			builder.emit("if {0} < {1}:".format(
+				result, builder.literal(self.lower_bound)))
+			builder.emit("\traise ValueError({0!r}.format({1}))".format(
+				"Value for field '{0}': {{0}} is less than lower bound {1}".format(
+					self.name, self.lower_bound), result))
+		if self.upper_bound is not None:
+			builder.emit("if {0} > {1}:".format(
+				result, builder.literal(self.upper_bound)))
+			builder.emit("\traise ValueError({0!r}.format({1}))".format(
+				"Value for field '{0}': {{0}} is greater than upper bound {1}".format(
+					self.name, self.upper_bound), result))
+
+class StringField(Field):
+	"""A field that expects a string value"""
+
+	def __init__(self, name, default=None,
+			pattern=None):
+		"""Initialize this StringField
+
+		Args:
+		  name: A str. The name of this field.
+		  pattern: A str or None. A regexp that defines the acceptable
+		    pattern for this field. If None, all strings will be
+		    accepted.
+		"""
+		super(StringField, self).__init__(name, default)
+		if pattern:
+			self.pattern = re.compile(pattern)
+		else:
+			self.pattern = None
+
+	def validate(self, value):
+		"""Ensure that the supplied value is a valid string
+
+		It will attempt to convert the supplied value to a string
+		and ensure that it matches the pattern for this field if
+		one exists.
+
+		Args:
+		  value: A str or value convertable to a str.
+
+		Returns:
+		  A str. This is the converted and validated value.
+
+		Raises:
+		  ValueError if value is not valid for this field
+		"""
+		str_value = str(value)
+		if self.pattern and not re.match(self.pattern, str_value):
+			raise ValueError("Value for field '{0}': '{1}' does not match "
+					"pattern.".format(self.name, str_value))
+		return str_value
+
+	def validate_list(self, values):
+		"""Validate a sequence of strings
+
+		Converts them all with one comprehension and matches them all
+		with another. If any does not match, the values are validated one by
+		one to raise the error for the first that does not.
+		"""
+		if not self._inlined(StringField):
+			return super(StringField, self).validate_list(values)
+		if not isinstance(values, (list, tuple)):
+			values = list(values)
+		str_values = [str(v) for v in values]
+		if self.pattern and None in [self.pattern.match(v) for v in str_values]:
+			return [self.validate(v) for v in values]
+		return str_values
+
+	def _compile(self, builder, value, result):
+		if not self._inlined(StringField):
+			return super(StringField, self)._compile(builder, value, result)
+		builder.emit("{0} = str({1})".format(result, value))
+		if self.pattern:
+			builder.emit("if {0}({1}) is None:".format(
+				builder.const(self.pattern.match, "match"), result))
+			builder.emit("\traise ValueError({0!r}.format({1}))".format(
+				"Value for field '{0}': '{{0}}' does not match pattern.".format(
+					self.name), result))
+
+class BoolField(Field):
+	"""A field that expects a boolean value"""
+
+	TRUE_VALUES = ["true", "True", "1", "yes", True, 1]
+
+	def __init__(self, name, default=None):
+		super(BoolField, self).__init__(name, default)
+		self._true_values = frozenset(self.TRUE_VALUES)
+
+	def validate(self, value):
+		"""Ensure that supplied value is a valid boolean
+
+		The supplied value will be checked against a list of
+		true values. If the value is not in the list, it is
+		considered False.
+
+		Args:
+		  value: A bool or value convertable to a bool.
+
+		Returns:
+		  A bool. This is the converted and validated value.
+		"""
+		# a set lookup gives the same answer as the list scan, except that
+		# unhashable values, which equal none of the TRUE_VALUES, raise
+		try:
+			return value in self._true_values
+		except TypeError:
+			return False
+
+	def validate_list(self, values):
+		"""Validate a sequence of booleans with one comprehension"""
+		if not self._inlined(BoolField):
+			return super(BoolField, self).validate_list(values)
+		if not isinstance(values, (list, tuple)):
+			values = list(values)
+		try:
+			return [v in self._true_values for v in values]
+		except TypeError:
+			return [self.validate(v) for v in values]
+
+	def _compile(self, builder, value, result):
+		if not self._inlined(BoolField):
+			return super(BoolField, self)._compile(builder, value, result)
+		builder.emit("try:")
+		builder.emit("\t{0} = {1} in {2}".format(
+			result, value, builder.const(self._true_values, "true")))
+		builder.emit("except TypeError:")
+		builder.emit("\t{0} = False".format(result))
+
+class FloatField(Field):
+	"""A field that expects a floating point value"""
+
+	def __init__(self, name, default=None,
+			lower_bound=None, upper_bound=None):
+		"""Initialize this FloatField
+
+		Args:
+		  name: A str. The name of this field.
+		  lower_bound: A number or None. The lowest acceptable value
+		    for this field. If None, there is no lower bound.
+		  upper_bound: A number or None. The highest acceptable value
+		    for this field. If None, there is no upper bound.
+		"""
+		super(FloatField, self).__init__(name, default)
+		self.lower_bound = lower_bound
+		self.upper_bound = upper_bound
+
+	def validate(self, value):
+		"""Ensure that the supplied value is a valid float
+
+		Args:
+		  value: A float or value convertable to a float.
+
+		Returns:
+		  A float. This is the converted and validated value.
+
+		Raises:
+		  ValueError if value is not valid for this field
+		"""
+		try:
+			float_value = float(value)
+		except ValueError as ve:
+			raise ValueError("Value for field '{0}': {1}".format(self.name, ve.message))
+
+		if self.lower_bound is not None and float_value < self.lower_bound:
+			raise ValueError("Value for field '{0}': {1} is less than lower "
+					"bound {2}".format(self.name, float_value, self.lower_bound))
+		if self.upper_bound is not None and float_value > self.upper_bound:
+			raise ValueError("Value for field '{0}': {1} is greater than upper "
+					"bound {2}".format(self.name, float_value, self.upper_bound))
+		return float_value
+
+	def validate_list(self, values):
+		"""Validate a sequence of floats, like IntField.validate_list"""
+		if not self._inlined(FloatField):
+			return super(FloatField, self).validate_list(values)
+		if not isinstance(values, (list, tuple)):
+			values = list(values)
+		try:
+			float_values = [float(v) for v in values]
+		except (ValueError, TypeError):
+			float_values = None
+		if float_values and not (
+				(self.lower_bound is not None and
+					min(float_values) < self.lower_bound) or
+				(self.upper_bound is not None and
+					max(float_values) > self.upper_bound)):
+			return float_values
+		return [self.validate(v) for v in values]
+
+	def _compile(self, builder, value, result):
+		if not self._inlined(FloatField):
+			return super(FloatField, self)._compile(builder, value, result)
+		builder.emit("try:")
+		builder.emit("\t{0} = float({1})".format(result, value))
+		builder.emit("except ValueError as ve:")
+		builder.emit("\traise ValueError({0!r}.format(ve.message))".format(
+			"Value for field '{0}': {{0}}".format(self.name)))
+		if self.lower_bound is not None:
+			builder.emit("if {0} < {1}:".format(
+				result, builder.literal(self.lower_bound)))
+			builder.emit("\traise ValueError({0!r}.format({1}))".format(
+				"Value for field '{0}': {{0}} is less than lower bound {1}".format(
+					self.name, self.lower_bound), result))
+		if self.upper_bound is not None:
+			builder.emit("if {0} > {1}:".format(
+				result, builder.literal(self.upper_bound)))
+			builder.emit("\traise ValueError({0!r}.format({1}))".format(
+				"Value for field '{0}': {{0}} is greater than upper bound {1}".format(
+					self.name, self.upper_bound), result))
+
+class EnumField(Field):
+	"""A field that expects one of a fixed set of values"""
+
+	def __init__(self, name, choices, default=None):
+		"""Initialize this EnumField
+
+		Args:
+		  name: A str. The name of this field.
+		  choices: A list of the acceptable values for this field.
+		"""
+		super(EnumField, self).__init__(name, default)
+		self.choices = tuple(choices)
+		self._choices = frozenset(self.choices)
+
+	def validate(self, value):
+		"""Ensure that the supplied value is one of the choices
+
+		Args:
+		  value: One of the choices of this field.
+
+		Returns:
+		  The value, unchanged.
+
+		Raises:
+		  ValueError if value is not one of the choices
+		"""
+		try:
+			if value in self._choices:
+				return value
+		except TypeError:
+			pass
+		raise ValueError("Value for field '{0}': {1!r} is not one of {2}".format(
+			self.name, value, ", ".join(repr(choice) for choice in self.choices)))
+
+	def _compile(self, builder, value, result):
+		if not self._inlined(EnumField):
+			return super(EnumField, self)._compile(builder, value, result)
+		builder.emit("try:")
+		builder.emit("\t{0} = {1} in {2}".format(
+			result, value, builder.const(self._choices, "choices")))
+		builder.emit("except TypeError:")
+		builder.emit("\t{0} = False".format(result))
+		builder.emit("if {0}:".format(result))
+		builder.emit("\t{0} = {1}".format(result, value))
+		builder.emit("else:")
+		builder.emit("\t{0} = {1}.validate({2})".format(
+			result, builder.const(self, "field"), value))
+
+class ParsedField(Field):
+	"""An abstract field that parses strings into native values
+
+	Subclasses implement parse. Configs tend to repeat the same strings,
+	so parsed values are kept per field and reused; parse must return
+	immutable values.
+	"""
+
+	# the most strings to keep the parsed values of, per field
+	MAX_PARSED = 4096
+
+	def __init__(self, name, default=None):
+		super(ParsedField, self).__init__(name, default)
+		self._parsed = {}
+
+	def parse(self, value):
+		"""Convert a raw value into the value of this field
+
+		Args:
+		  value: The raw value from the config.
+
+		Returns:
+		  The parsed value.
+
+		Raises:
+		  ValueError if value is not valid for this field. The message
+		    does not need to name the field.
+		"""
+		raise NotImplementedError
+
+	def validate(self, value):
+		"""Ensure that the supplied value can be parsed
+
+		Args:
+		  value: A value that parse accepts.
+
+		Returns:
+		  The parsed value.
+
+		Raises:
+		  ValueError if value is not valid for this field
+		"""
+		if type(value) is str:
+			try:
+				return self._parsed[value]
+			except KeyError:
+				pass
+		try:
+			parsed = self.parse(value)
+		except ValueError as ve:
+			raise ValueError("Value for field '{0}': {1}".format(self.name, ve.message))
+		if type(value) is str and len(self._parsed) < self.MAX_PARSED:
+			self._parsed[value] = parsed
+		return parsed
+
+	def _compile(self, builder, value, result):
+		if not self._inlined(ParsedField):
+			return super(ParsedField, self)._compile(builder, value, result)
+		builder.emit("{0} = None".format(result))
+		builder.emit("if type({0}) is str:".format(value))
+		builder.emit("\t{0} = {1}({2})".format(
+			result, builder.const(self._parsed.get, "parsed"), value))
+		builder.emit("if {0} is None:".format(result))
+		builder.emit("\t{0} = {1}.validate({2})".format(
+			result, builder.const(self, "field"), value))
+
+_DURATION = re.compile(
+	r"^(?:\s*(?:\d+(?:\.\d*)?|\.\d+)\s*(?:ns|us|ms|s|m|h|d|w))+\s*$")
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d*)?|\.\d+)\s*(ns|us|ms|s|m|h|d|w)")
+
+_DURATION_UNITS = {
+	"ns": 1e-9, "us": 1e-6, "ms": 1e-3, "s": 1, "m": 60, "h": 3600,
+	"d": 86400, "w": 604800,
+}
+
+class DurationField(ParsedField):
+	"""A field that expects a duration, like 30s, 250ms or 1h30m
+
+	Durations are in seconds. Numbers are taken as seconds as well.
+	"""
+
+	def parse(self, value):
+		if isinstance(value, (int, long, float)) and not isinstance(value, bool):
+			seconds = float(value)
+		elif not isinstance(value, basestring):
+			raise ValueError("{0!r} is not a duration".format(value))
+		elif _DURATION.match(value):
+			seconds = float(sum(float(number) * _DURATION_UNITS[unit]
+				for number, unit in _DURATION_PART.findall(value)))
+		else:
+			try:
+				seconds = float(value)
+			except ValueError:
+				raise ValueError("'{0}' is not a duration".format(value))
+		if seconds < 0:
+			raise ValueError("{0!r} is a negative duration".format(value))
+		return seconds
+
+_BYTE_SIZE = re.compile(r"^\s*(\d+(?:\.\d*)?|\.\d+)\s*([a-zA-Z]*)\s*$")
+
+_BYTE_UNITS = {"": 1, "b": 1}
+for _power, _prefix in enumerate("kmgtpe", 1):
+	_BYTE_UNITS[_prefix] = 1024 ** _power
+	_BYTE_UNITS[_prefix + "b"] = 1000 ** _power
+	_BYTE_UNITS[_prefix + "ib"] = 1024 ** _power
+del _power, _prefix
+
+class ByteSizeField(ParsedField):
+	"""A field that expects a size in bytes, like 512MB or 4KiB
+
+	Units are case insensitive. KB, MB, GB and so on are powers of 1000;
+	KiB, MiB, GiB and the bare K, M, G are powers of 1024. Sizes are
+	ints, and numbers are taken as bytes.
+	"""
+
+	def parse(self, value):
+		if isinstance(value, (int, long)) and not isinstance(value, bool):
+			size = int(value)
+		elif not isinstance(value, basestring):
+			raise ValueError("{0!r} is not a byte size".format(value))
+		else:
+			match = _BYTE_SIZE.match(value)
+			if match is None or match.group(2).lower() not in _BYTE_UNITS:
+				raise ValueError("'{0}' is not a byte size".format(value))
+			number, unit = match.groups()
+			multiplier = _BYTE_UNITS[unit.lower()]
+			if "." in number:
+				size = int(float(number) * multiplier)
+			else:
+				size = int(number) * multiplier
+		if size < 0:
+			raise ValueError("{0!r} is a negative byte size".format(value))
+		return size
+
+HostPort = collections.namedtuple("HostPort", ["host", "port"])
+
+_HOST_PORT = re.compile(r"^(?:\[([^\]]+)\]|([^:\[\]]+))(?::(\d+))?$")
+
+class HostPortField(ParsedField):
+	"""A field that expects a host and port, like db1:3306 or [::1]:80
+
+	Values are HostPort(host, port) tuples.
+	"""
+
+	def __init__(self, name, default=None, default_port=None):
+		"""Initialize this HostPortField
+
+		Args:
+		  name: A str. The name of this field.
+		  default_port: An int or None. The port of values without one.
+		    If None, values must have a port.
+		"""
+		super(HostPortField, self).__init__(name, default)
+		self.default_port = default_port
+
+	def parse(self, value):
+		match = _HOST_PORT.match(str(value).strip())
+		if match is None:
+			raise ValueError("'{0}' is not a host and port".format(value))
+		host = match.group(1) or match.group(2)
+		port = match.group(3)
+		if port is None:
+			if self.default_port is None:
+				raise ValueError("'{0}' has no port".format(value))
+			port = self.default_port
+		port = int(port)
+		if not 0 < port < 65536:
+			raise ValueError("'{0}' has an invalid port".format(value))
+		return HostPort(host, port)
+
+class URLField(ParsedField):
+	"""A field that expects a URL
+
+	Values are split into urlparse.SplitResult tuples, which also have
+	hostname, port, username and password attributes.
+	"""
+
+	def __init__(self, name, default=None, schemes=None):
+		"""Initialize this URLField
+
+		Args:
+		  name: A str. The name of this field.
+		  schemes: A list of strs or None. The acceptable URL schemes.
+		    If None, any URL with a scheme is accepted.
+		"""
+		super(URLField, self).__init__(name, default)
+		self.schemes = tuple(schemes) if schemes is not None else None
+
+	def parse(self, value):
+		url = urlparse.urlsplit(str(value).strip())
+		if not url.scheme or not (url.netloc or url.path):
+			raise ValueError("'{0}' is not a URL".format(value))
+		if self.schemes is not None and url.scheme not in self.schemes:
+			raise ValueError("'{0}' does not have one of the schemes {1}".format(
+				value, ", ".join(self.schemes)))
+		# urlsplit gives no port for ports it cannot parse
+		host = url.netloc.rpartition("@")[2]
+		if ":" in host and not host.endswith("]"):
+			port = host.rpartition(":")[2]
+			if port and (not port.isdigit() or not 0 < int(port) < 65536):
+				raise ValueError("'{0}' has an invalid port".format(value))
+		return url
+
+def _fingerprint_value(value):
+	if isinstance(value, (list, tuple)):
+		return [_fingerprint_value(item) for item in value]
+	if isinstance(value, Field):
+		return (type(value).__module__, type(value).__name__, sorted(
+			(name, _fingerprint_value(attr))
+			for name, attr in vars(value).iteritems()
+			if not name.startswith("_") and not isinstance(attr, type)))
+	if isinstance(value, re._pattern_type):
+		return (value.pattern, value.flags)
+	return repr(value)
+
+class ArrayField(Field):
+	"""A field that expects a list of numbers, stored compactly
+
+	Values are array.arrays, or NumPy arrays if use_numpy is set. A
+	value can also be a .npy file next to the config file, referred to
+	with the !npy tag, which is memory-mapped read-only:
+
+	weights: !npy weights.npy
+
+	Loading .npy files needs NumPy, and their dtype must match the
+	typecode of this field.
+	"""
+
+	def __init__(self, name, typecode="d", default=None, use_numpy=False):
+		"""Initialize this ArrayField
+
+		Args:
+		  name: A str. The name of this field.
+		  typecode: A str. The array.array typecode (or NumPy dtype
+		    character) of the values.
+		  use_numpy: A bool. If True, lists are converted to NumPy
+		    arrays rather than array.arrays.
+		"""
+		super(ArrayField, self).__init__(name, default)
+		array.array(typecode)
+		if use_numpy and numpy is None:
+			raise ImportError("ArrayField '{0}' needs NumPy".format(name))
+		self.typecode = typecode
+		self.use_numpy = use_numpy
+
+	def validate(self, value):
+		"""Ensure that the supplied value is a valid list of numbers
+
+		Args:
+		  value: A list of numbers, a NumPy array, or a Sidecar of a
+		    .npy file.
+
+		Returns:
+		  An array.array, or a NumPy array.
+
+		Raises:
+		  ValueError if value is not valid for this field
+		"""
+		if isinstance(value, Sidecar):
+			return self._load(value)
+		if numpy is not None and isinstance(value, numpy.ndarray):
+			return value.astype(self.typecode, copy=False)
+		if not isinstance(value, (list, tuple)):
+			raise ValueError("Value for field '{0}': {1!r} is not a list".format(
+				self.name, value))
+		try:
+			if self.use_numpy:
+				return numpy.array(value, dtype=self.typecode)
+			return array.array(self.typecode, value)
+		except (TypeError, ValueError, OverflowError) as e:
+			raise ValueError("Value for field '{0}': {1}".format(self.name, e))
+
+	def _load(self, sidecar):
+		if numpy is None:
+			raise ValueError("Value for field '{0}': loading {1} needs NumPy".format(
+				self.name, sidecar.path))
+		try:
+			values = numpy.load(sidecar.path, mmap_mode="r")
+		except (IOError, ValueError) as e:
+			raise ValueError("Value for field '{0}': {1}".format(self.name, e))
+		if values.dtype != numpy.dtype(self.typecode):
+			raise ValueError("Value for field '{0}': {1} has dtype {2}, not {3}".format(
+				self.name, sidecar.path, values.dtype, numpy.dtype(self.typecode)))
+		return values
+
+class MapField(Field):
+	"""A field that expects a mapping, possibly too large to load
+
+	A value can be a mapping in the config itself, or a YAML file of one
+	next to the config file, referred to with the !table tag:
+
+	tenants: !table tenants.yml
+
+	Tables are served from an index built next to them the first time
+	they are used (see kconfig.diskmap), so entries are only loaded as
+	they are looked up. The index is rebuilt when the table changes, and
+	ConfigDefault reloads the config then too.
+	"""
+
+	def __init__(self, name, value_field=None, default=None):
+		"""Initialize this MapField
+
+		Args:
+		  name: A str. The name of this field.
+		  value_field: A Field that the values must be valid for. Values
+		    of tables are validated when the index is built.
+		"""
+		super(MapField, self).__init__(name, default)
+		self.value_field = value_field
+		self._signature = hashlib.sha1(
+			repr(_fingerprint_value(value_field))).hexdigest()
+
+	def validate(self, value):
+		"""Ensure that the supplied value is a valid mapping
+
+		Args:
+		  value: A dict, or a Sidecar of a YAML table.
+
+		Returns:
+		  A dict, or a read-only DiskMap of the table.
+
+		Raises:
+		  ValueError if value is not valid for this field
+		"""
+		convert = None
+		if self.value_field is not None:
+			convert = self.value_field.validate
+		if isinstance(value, Sidecar):
+			try:
+				return DiskMap(value.path, convert, self._signature)
+			except (IOError, OSError, ValueError) as e:
+				raise ValueError("Value for field '{0}': {1}".format(self.name, e))
+		if not isinstance(value, dict):
+			raise ValueError("Value for field '{0}': {1!r} is not a mapping".format(
+				self.name, value))
+		if convert is None:
+			return dict(value)
+		return dict((key, convert(item)) for key, item in value.iteritems())
+
+class FileRef(object):
+	"""A reference to another config file, loaded when first used
+
+	Attribute reads go to the referenced config, validated against its
+	CheckedConfig class. The reference keeps that config along with the
+	generation of the file it was validated from, and validates it again
+	only once Config holds a new generation of the file: a read checks a
+	counter rather than the file, so a change on disk is seen after the
+	file is fetched again, as refresh, a LiveConfig or any fetch_config
+	of it do. _config is the referenced config itself, for reading
+	several fields from the same version. Like a Record, the reference's
+	own attributes start with _ so they do not hide config fields.
+	"""
+	__slots__ = ("_config_class", "_name", "_cached")
+
+	def __init__(self, config_class, name):
+		self._config_class = config_class
+		self._name = name
+		# (generation, config), replaced as a whole so threads that read
+		# while another resolves never see a config of the wrong generation
+		self._cached = None
+
+	@property
+	def _config(self):
+		cached = self._cached
+		generation = Config.generation(self._name)
+		if (cached is None or generation is None or
+				cached[0] != generation):
+			instance = self._config_class(self._name)
+			cached = self._cached = (Config.generation(self._name), instance)
+		return cached[1]
+
+	def __getattr__(self, name):
+		if name.startswith("_"):
+			raise AttributeError(name)
+		return getattr(self._config, name)
+
+	def __eq__(self, other):
+		if isinstance(other, FileRef):
+			return (self._config_class is other._config_class and
+				self._name == other._name)
+		return NotImplemented
+
+	def __ne__(self, other):
+		equal = self.__eq__(other)
+		if equal is NotImplemented:
+			return equal
+		return not equal
+
+	def __hash__(self):
+		return hash((self._config_class, self._name))
+
+	def __repr__(self):
+		return "FileRef({0}, {1!r})".format(
+			self._config_class.__name__, self._name)
+
+	def __reduce__(self):
+		return (FileRef, (self._config_class, self._name))
+
+class FileRefField(ParsedField):
+	"""A field that expects the name of another config file
+
+	Values are FileRefs, which load and validate the file the first
+	time it is used rather than when this config is validated.
+	"""
+
+	def __init__(self, name, config_class, default=None):
+		"""Initialize this FileRefField
+
+		Args:
+		  name: A str. The name of this field.
+		  config_class: A CheckedConfig subclass. The referenced
+		    file is validated against it.
+		"""
+		super(FileRefField, self).__init__(name, default)
+		self.config_class = config_class
+
+	def parse(self, value):
+		if not isinstance(value, basestring):
+			raise ValueError("{0!r} is not a config file name".format(value))
+		return FileRef(self.config_class, value)
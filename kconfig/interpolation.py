@@ -0,0 +1,206 @@
+"""
+Interpolation of ${...} references in config values.
+
+A string value can refer to other values in the same config by their key
+path, or to values in another config file by its name:
+
+	database:
+	  host: db1
+	  port: 3306
+	dsn: mysql://${database.host}:${database.port}/reports
+	cache: ${memcached/sessions:memcache.address}
+
+List items are referred to by index, as in ${server_list.0.host}, and $$
+is a literal $. A string that is nothing but one reference takes the
+referenced value as is, so port: ${database.port} stays an int.
+
+Interpolation is done once, when a config is loaded. compile_plan finds the
+templated values and parses them, and apply_plan evaluates that plan into
+a new config, copying only the containers along the templated paths.
+"""
+
+import re
+
+_REFERENCE = re.compile(r"\$\$|\$\{([^}]*)\}")
+
+def _parse_reference(reference):
+	file_name = None
+	if ":" in reference:
+		file_name, reference = reference.split(":", 1)
+		file_name = file_name.strip()
+	return (file_name, tuple(reference.strip().split(".")))
+
+def _parse_template(text):
+	"""Returns the parts of a templated string, or None if it has none"""
+	parts = []
+	pos = 0
+	for match in _REFERENCE.finditer(text):
+		if match.start() > pos:
+			parts.append(text[pos:match.start()])
+		if match.group(1) is None:
+			parts.append("$")
+		else:
+			parts.append(_parse_reference(match.group(1)))
+		pos = match.end()
+	if not pos:
+		return None
+	if pos < len(text):
+		parts.append(text[pos:])
+	return parts
+
+def _compile(value, path, plan):
+	if isinstance(value, dict):
+		for key, child in value.iteritems():
+			_compile(child, path + (key,), plan)
+	elif isinstance(value, list):
+		for index, child in enumerate(value):
+			_compile(child, path + (index,), plan)
+	elif isinstance(value, basestring) and "$" in value:
+		parts = _parse_template(value)
+		if parts is not None:
+			plan[path] = parts
+
+def compile_plan(value):
+	"""
+	Finds the templated strings in a parsed config.
+	Returns:
+	 - a dict of the key path of each templated string to its parts, which
+	   are literal strings and (file name or None, key path) references.
+	   It is empty if the config has nothing to interpolate.
+	"""
+	plan = {}
+	_compile(value, (), plan)
+	return plan
+
+def _step(container, segment, reference):
+	if isinstance(container, list):
+		try:
+			index = int(segment)
+			container[index]
+		except (ValueError, IndexError):
+			pass
+		else:
+			return index
+	elif isinstance(container, dict):
+		if segment in container:
+			return segment
+		if segment.isdigit() and int(segment) in container:
+			return int(segment)
+	raise ValueError("Config interpolation: ${%s} not found" % (
+		_format_reference(reference)))
+
+def _format_reference(reference):
+	file_name, key_path = reference
+	text = ".".join(key_path)
+	if file_name is not None:
+		text = file_name + ":" + text
+	return text
+
+def _format_value(value):
+	if isinstance(value, basestring):
+		return value
+	return str(value)
+
+class _Interpolation(object):
+	def __init__(self, value, plan, fetch):
+		self.original = value
+		self.result = value
+		self.plan = plan
+		self.fetch = fetch
+		self.done = {}
+		self.evaluating = []
+		# containers copied from the original, safe to write to
+		self.copies = {}
+
+	def run(self):
+		for path in self.plan:
+			self.evaluate(path)
+		return self.result
+
+	def evaluate(self, path):
+		if path in self.done:
+			return self.done[path]
+		if path in self.evaluating:
+			raise ValueError("Config interpolation cycle: %s" % (" -> ".join(
+				".".join(str(key) for key in cycle_path)
+				for cycle_path in self.evaluating[self.evaluating.index(path):]
+				+ [path])))
+		self.evaluating.append(path)
+		parts = self.plan[path]
+		if len(parts) == 1 and isinstance(parts[0], tuple):
+			value = self.resolve(parts[0])
+		else:
+			value = "".join(
+				part if isinstance(part, basestring)
+				else _format_value(self.resolve(part))
+				for part in parts)
+		self.evaluating.pop()
+		self.done[path] = value
+		self.set(path, value)
+		return value
+
+	def resolve(self, reference):
+		file_name, key_path = reference
+		if file_name is not None:
+			if self.fetch is None:
+				raise ValueError("Config interpolation: ${%s} refers to "
+					"another file" % _format_reference(reference))
+			value = self.fetch(file_name)
+			for segment in key_path:
+				value = value[_step(value, segment, reference)]
+			return value
+		value = self.original
+		path = ()
+		for segment in key_path:
+			key = _step(value, segment, reference)
+			value = value[key]
+			path += (key,)
+		# anything templated at or under the referenced key goes first
+		for templated in self.plan:
+			if templated[:len(path)] == path:
+				self.evaluate(templated)
+		value = self.result
+		for key in path:
+			value = value[key]
+		return value
+
+	def copy(self, container):
+		if self.copies.get(id(container)) is container:
+			return container
+		if isinstance(container, dict):
+			copied = dict(container)
+		else:
+			copied = list(container)
+		self.copies[id(copied)] = copied
+		return copied
+
+	def set(self, path, value):
+		if not path:
+			self.result = value
+			return
+		self.result = container = self.copy(self.result)
+		for key in path[:-1]:
+			child = container[key] = self.copy(container[key])
+			container = child
+		container[path[-1]] = value
+
+def apply_plan(value, plan, fetch=None):
+	"""
+	Evaluates a plan from compile_plan against the config it was compiled
+	from. The config is not modified; a new one is returned that shares
+	every container without templated values in it.
+	Parameters:
+	 - value: the parsed config
+	 - plan: the plan for value
+	 - fetch: a function that returns the config with a given name, for
+	   references to other files. (optional)
+	Raises:
+	 - ValueError if a reference is not found or references form a cycle
+	"""
+	if not plan:
+		return value
+	return _Interpolation(value, plan, fetch).run()
+
+def interpolate(value, fetch=None):
+	"""Compiles and applies the interpolation plan of a parsed config"""
+	return apply_plan(value, compile_plan(value), fetch)
@@ -0,0 +1,350 @@
+"""
+ListField, and the LazyList and ColumnarList sequences that lazy and
+columnar ListFields hold their values in.
+"""
+
+import array
+import collections
+
+from kconfig.fields import BoolField
+from kconfig.fields import Field
+from kconfig.fields import FloatField
+from kconfig.fields import IntField
+from kconfig.fields import StringField
+from kconfig.records import NestedField
+from kconfig.records import _record_type
+from kconfig.validators import _compile_validator
+from kconfig.validators import _unchanged
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+class ListField(Field):
+	"""A field that expects a list of values"""
+
+	def __init__(self, name, field_type, lazy=False, columnar=False):
+		"""Initialize this ListField
+
+		Args:
+		  name: A str. The name of this field.
+		  field_type: A Field. All values in this sequence
+		    will be validated against it. The name of this
+		    field is meaningless and will be ignored.
+		  lazy: A bool. If True, values are LazyLists, which
+		    validate each item when it is first read.
+		  columnar: A bool. If True, values are ColumnarLists,
+		    which store each nested field in a column. field_type
+		    must be a NestedField.
+		"""
+		super(ListField, self).__init__(name)
+		if columnar and not isinstance(field_type, NestedField):
+			raise ValueError("Columnar list field '{0}' is not a list of "
+				"nested fields".format(name))
+		self.field_type = field_type
+		self.lazy = lazy
+		self.columnar = columnar
+
+	def validate(self, value):
+		"""Ensure that supplied value is a valid list field
+
+		Verifies that the supplied value is a list which contains
+		fields that validate against self.field_type.
+
+		Args:
+		  value: A list. The list should contain values that
+		    validate against self.field_type.
+
+		Returns:
+		  A list of validated values, or a LazyList or ColumnarList
+		  if this field is lazy or columnar.
+
+		Raises:
+		  ValueError if any of the list field values are not valid.
+		"""
+		if self.lazy:
+			return LazyList(self.field_type, value)
+		if self.columnar:
+			return ColumnarList.from_items(self.field_type, value)
+		return self.field_type.validate_list(value)
+
+	def revalidate(self, old, old_value, new):
+		"""Validate a changed list item by item
+
+		Items at the same index as an unchanged item keep its value.
+		"""
+		if (_unchanged(old, new) or not self._inlined(ListField) or
+				type(old) is not list or type(new) is not list or
+				type(old_value) is not list):
+			return super(ListField, self).revalidate(old, old_value, new)
+		revalidate = self.field_type.revalidate
+		values = [revalidate(old_item, old_item_value, new_item)
+			for old_item, old_item_value, new_item in zip(old, old_value, new)]
+		if len(new) > len(values):
+			values.extend(self.field_type.validate_list(new[len(values):]))
+		if len(values) == len(old_value) and all(
+				value is old_item_value
+				for value, old_item_value in zip(values, old_value)):
+			return old_value
+		return values
+
+	def pack(self, value):
+		"""The columns of a columnar list, the raw items of a lazy list
+		along with the items validated so far, or the packed items"""
+		if self.columnar:
+			return (value.columns, value.item_types)
+		if self.lazy:
+			return (value._raw, dict(
+				(index, self.field_type.pack(item))
+				for index, item in enumerate(value._values)
+				if item is not LazyList._unvalidated))
+		return [self.field_type.pack(item) for item in value]
+
+	def unpack(self, data):
+		if self.columnar:
+			columns, item_types = data
+			return ColumnarList(self.field_type.record_type, columns, item_types)
+		if self.lazy:
+			raw, validated = data
+			value = LazyList(self.field_type, raw)
+			for index, item in validated.iteritems():
+				value._values[index] = self.field_type.unpack(item)
+			return value
+		return [self.field_type.unpack(item) for item in data]
+
+	def _compile(self, builder, value, result):
+		if not self._inlined(ListField) or self.lazy or self.columnar:
+			return super(ListField, self)._compile(builder, value, result)
+		validate_list = type(self.field_type).validate_list.im_func
+		if validate_list is not Field.validate_list.im_func:
+			# the element type validates lists in bulk
+			builder.emit("{0} = {1}.validate_list({2})".format(
+				result, builder.const(self.field_type, "field"), value))
+			return
+		item = builder.var()
+		item_result = builder.var("r")
+		append = builder.var("append")
+		builder.emit("{0} = []".format(result))
+		builder.emit("{0} = {1}.append".format(append, result))
+		builder.emit("for {0} in {1}:".format(item, value))
+		builder.indent()
+		self.field_type._compile(builder, item, item_result)
+		builder.emit("{0}({1})".format(append, item_result))
+		builder.dedent()
+
+class LazyList(collections.Sequence):
+	"""A list whose items are validated when they are first read
+
+	The raw items are kept, along with a slot per item for its validated
+	value, so a list that is mostly never read costs little more than
+	the raw list. Reading an invalid item raises the ValueError its
+	field raises. Slices are plain lists, and LazyLists compare equal to
+	lists with the same validated items. They pickle with their field,
+	their raw items and the items validated so far, and so stay lazy.
+	"""
+	__slots__ = ("_field", "_raw", "_values")
+
+	_unvalidated = object()
+
+	def __init__(self, field, raw):
+		"""Initialize this LazyList
+
+		Args:
+		  field: A Field. The items are validated against it.
+		  raw: An iterable of the raw items.
+		"""
+		if not isinstance(raw, (list, tuple)):
+			raw = list(raw)
+		self._field = field
+		self._raw = raw
+		self._values = [self._unvalidated] * len(raw)
+
+	def __len__(self):
+		return len(self._raw)
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return [self[i] for i in xrange(*index.indices(len(self._raw)))]
+		value = self._values[index]
+		if value is self._unvalidated:
+			value = self._values[index] = self._field.validate(self._raw[index])
+		return value
+
+	def __iter__(self):
+		values = self._values
+		for index, value in enumerate(values):
+			if value is self._unvalidated:
+				value = values[index] = self._field.validate(self._raw[index])
+			yield value
+
+	def validate_all(self):
+		"""Validate every item that has not been read yet"""
+		for _ in self:
+			pass
+		return self
+
+	def __eq__(self, other):
+		if isinstance(other, (LazyList, list)):
+			return list(self) == list(other)
+		return NotImplemented
+
+	def __ne__(self, other):
+		equal = self.__eq__(other)
+		if equal is NotImplemented:
+			return equal
+		return not equal
+
+	__hash__ = None
+
+	def __repr__(self):
+		return "LazyList({0!r})".format([
+			"<unvalidated>" if value is self._unvalidated else value
+			for value in self._values])
+
+	def __reduce__(self):
+		return (_unpickle_lazy_list, (self._field, self._raw, dict(
+			(index, value) for index, value in enumerate(self._values)
+			if value is not self._unvalidated)))
+
+def _unpickle_lazy_list(field, raw, validated):
+	value = LazyList(field, raw)
+	for index, item in validated.iteritems():
+		value._values[index] = item
+	return value
+
+# the array typecodes and item types of columns for exact field types
+_COLUMN_TYPES = {
+	IntField: ("l", None),
+	FloatField: ("d", None),
+	BoolField: ("b", bool),
+}
+
+class ColumnarList(collections.Sequence):
+	"""A list of nested field values stored a column per field
+
+	Int, float and bool columns are array.arrays, string columns are
+	lists of interned strings, and the rest are lists. Items are
+	Records, built when they are read. Columns can be read whole, and as
+	NumPy arrays when NumPy is installed, for filtering many items at
+	once:
+
+	ports = servers.numpy_column("port")
+	for server in servers.take(ports > 1024):
+		...
+
+	ColumnarLists compare equal to lists of the same records.
+	"""
+
+	def __init__(self, record_type, columns, item_types=None):
+		"""Initialize this ColumnarList
+
+		Args:
+		  record_type: The Record type of the items.
+		  columns: A list of columns, one for each field of
+		    record_type, in order, all the same length.
+		  item_types: A list with a type to convert the values of each
+		    column to, or None for columns that need no conversion.
+		"""
+		self.record_type = record_type
+		self.columns = tuple(columns)
+		self.item_types = tuple(item_types or [None] * len(self.columns))
+		self._length = len(self.columns[0]) if self.columns else 0
+
+	@classmethod
+	def from_items(cls, field, items):
+		"""Validate a list of raw items against a NestedField"""
+		if field._validator is None:
+			field._validator = _compile_validator(field.config_fields, field.name)
+		validator = field._validator
+		names = [config_field.name for config_field in field.config_fields]
+		columns = [[] for _ in names]
+		appends = [column.append for column in columns]
+		for item in items:
+			valid_dict = validator(item)
+			for append, name in zip(appends, names):
+				append(valid_dict[name])
+		item_types = []
+		for index, config_field in enumerate(field.config_fields):
+			typecode, item_type = _COLUMN_TYPES.get(type(config_field), (None, None))
+			if typecode is not None:
+				try:
+					columns[index] = array.array(typecode, columns[index])
+				except OverflowError:
+					item_type = None
+			elif type(config_field) is StringField:
+				columns[index] = [intern(v) for v in columns[index]]
+			item_types.append(item_type)
+		return cls(field.record_type, columns, item_types)
+
+	def __len__(self):
+		return self._length
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return [self[i] for i in xrange(*index.indices(self._length))]
+		return self.record_type(*[
+			column[index] if item_type is None else item_type(column[index])
+			for column, item_type in zip(self.columns, self.item_types)])
+
+	def __iter__(self):
+		for index in xrange(self._length):
+			yield self[index]
+
+	def column(self, name):
+		"""Returns the column of the nested field name"""
+		return self.columns[self.record_type._fields.index(name)]
+
+	def numpy_column(self, name):
+		"""Returns the column of the nested field name as a NumPy array
+
+		Array columns are not copied.
+
+		Raises:
+		  ImportError if NumPy is not installed.
+		"""
+		if numpy is None:
+			raise ImportError("NumPy is not installed")
+		column = self.column(name)
+		if isinstance(column, array.array):
+			values = numpy.frombuffer(column, dtype=column.typecode)
+			if column.typecode == "b":
+				values = values.view(numpy.bool_)
+			return values
+		return numpy.array(column)
+
+	def take(self, selection):
+		"""Returns the items at a list of indices, or where a mask is true
+
+		Args:
+		  selection: An iterable of indices, or a NumPy bool array as
+		    long as this list.
+		"""
+		if numpy is not None and isinstance(selection, numpy.ndarray):
+			if selection.dtype == numpy.bool_:
+				selection = numpy.flatnonzero(selection)
+			selection = selection.tolist()
+		return [self[index] for index in selection]
+
+	def __eq__(self, other):
+		if isinstance(other, (ColumnarList, list)):
+			return list(self) == list(other)
+		return NotImplemented
+
+	def __ne__(self, other):
+		equal = self.__eq__(other)
+		if equal is NotImplemented:
+			return equal
+		return not equal
+
+	__hash__ = None
+
+	def __repr__(self):
+		return "ColumnarList({0!r})".format(list(self))
+
+	def __reduce__(self):
+		return (_unpickle_columnar, (self.record_type._name,
+			self.record_type._fields, self.columns, self.item_types))
+
+def _unpickle_columnar(name, field_names, columns, item_types):
+	return ColumnarList(_record_type(name, field_names), columns, item_types)
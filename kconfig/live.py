@@ -0,0 +1,110 @@
+"""
+Support for configs that follow their file: LiveConfig, and derived values,
+which are dropped when a config is refreshed.
+"""
+
+import logging
+import threading
+import weakref
+
+log = logging.getLogger(__name__)
+
+class derived(object):
+	"""Decorates a CheckedConfig method that computes a value from fields
+
+	The method is called the first time the attribute is read and its
+	value is kept on the instance, so expensive values built from a
+	config, like compiled patterns or lookup tables, are built once per
+	config. Refreshing a config drops the values, and the configs of new
+	generations of a file start without them. Derived values are not
+	pickled.
+
+	class RoutesConfig(CheckedConfig):
+		CONFIG_FIELDS = [ListField("patterns", StringField("pattern"))]
+
+		@derived
+		def matcher(self):
+			return re.compile("|".join(self.patterns))
+	"""
+
+	def __init__(self, function):
+		self.function = function
+		self.name = function.__name__
+		self.__doc__ = function.__doc__
+
+	def __get__(self, instance, owner):
+		if instance is None:
+			return self
+		value = instance.__dict__[self.name] = self.function(instance)
+		return value
+
+def _watch(live_ref, stopped, poll_interval):
+	# holds the handle only while checking, so it can be collected
+	while not stopped.wait(poll_interval):
+		live = live_ref()
+		if live is None:
+			return
+		live.check()
+		del live
+
+class LiveConfig(object):
+	"""A CheckedConfig that follows changes to its config file
+
+	config is the latest valid CheckedConfig, read as a plain attribute
+	with no check for changes; keep a reference to it to read several
+	fields from the same version. Changes are picked up in a background
+	thread, which validates the new content and then swaps it in with one
+	assignment. If the new content is not valid, the last valid config is
+	kept, and the error is logged and kept in error until the file is
+	valid again.
+	"""
+	__slots__ = ("config_class", "name", "config", "error", "_stopped",
+		"__weakref__")
+
+	def __init__(self, config_class, name, poll_interval=1.0):
+		"""Initialize this LiveConfig
+
+		Args:
+		  config_class: The CheckedConfig subclass of the config.
+		  name: A str. The config file name.
+		  poll_interval: A float or None, as taken by CheckedConfig.live.
+		"""
+		self.config_class = config_class
+		self.name = name
+		self.config = config_class(name)
+		self.error = None
+		self._stopped = threading.Event()
+		if poll_interval is not None:
+			thread = threading.Thread(target=_watch,
+				args=(weakref.ref(self), self._stopped, poll_interval))
+			thread.daemon = True
+			thread.start()
+
+	def check(self):
+		"""Pick up changes to the config file now
+
+		Returns:
+		  True if a new version of the config was swapped in.
+		"""
+		try:
+			# file-backed configs are memoized until the file changes, so
+			# this is the current config unless there is a new version
+			config = self.config_class(self.name)
+		except Exception as e:
+			# unparseable YAML as well as invalid values
+			if str(e) != str(self.error):
+				log.error("Keeping the last valid %s: %s", self.name, e)
+			self.error = e
+			return False
+		self.error = None
+		if config is self.config:
+			return False
+		self.config = config
+		return True
+
+	def stop(self):
+		"""Stop following changes to the config file"""
+		self._stopped.set()
+
+	def __repr__(self):
+		return "LiveConfig({0!r}, {1!r})".format(self.name, self.config)
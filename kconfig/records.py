@@ -0,0 +1,217 @@
+"""
+NestedField, and the read-only Record types that hold its values.
+"""
+
+import collections
+
+from kconfig.fields import Field
+from kconfig.validators import _ValidatorBuilder
+from kconfig.validators import _compile_validator
+from kconfig.validators import _revalidate
+from kconfig.validators import _unchanged
+
+class Record(object):
+	"""Base class of the record types that hold NestedField values
+
+	Record types are generated per NestedField, with a __slots__ entry
+	for each nested field, which makes them smaller than a dict or a
+	namedtuple and their attributes faster to read. They are read-only
+	and otherwise behave like the namedtuples NestedField used to
+	return: they can be iterated, indexed, compared and hashed by value,
+	and have count, index, _fields, _asdict, _replace and _make. They
+	are not tuples, though: isinstance(record, tuple) is False, and
+	tuple(record) makes one.
+
+	Types are shared between NestedFields with the same name and fields,
+	and records pickle by that name and those fields, so they can be
+	unpickled in another process.
+	"""
+	__slots__ = ()
+	_fields = ()
+	_name = None
+
+	@classmethod
+	def _make(cls, iterable):
+		return cls(*iterable)
+
+	def __setattr__(self, name, value):
+		raise AttributeError("can't set attribute")
+
+	def __delattr__(self, name):
+		raise AttributeError("can't delete attribute")
+
+	def __iter__(self):
+		for name in self._fields:
+			yield getattr(self, name)
+
+	def __len__(self):
+		return len(self._fields)
+
+	def __getitem__(self, index):
+		return tuple(self)[index]
+
+	def __contains__(self, value):
+		return value in tuple(self)
+
+	def count(self, value):
+		return tuple(self).count(value)
+
+	def index(self, value):
+		return tuple(self).index(value)
+
+	def __eq__(self, other):
+		if isinstance(other, Record):
+			return type(self) is type(other) and tuple(self) == tuple(other)
+		if isinstance(other, tuple):
+			return tuple(self) == other
+		return NotImplemented
+
+	def __ne__(self, other):
+		equal = self.__eq__(other)
+		if equal is NotImplemented:
+			return equal
+		return not equal
+
+	def __hash__(self):
+		return hash(tuple(self))
+
+	def __repr__(self):
+		return "{0}({1})".format(type(self).__name__, ", ".join(
+			"{0}={1!r}".format(name, getattr(self, name))
+			for name in self._fields))
+
+	def _asdict(self):
+		return collections.OrderedDict(zip(self._fields, self))
+
+	def _replace(self, **kwargs):
+		values = self._asdict()
+		values.update(kwargs)
+		return type(self)(**values)
+
+	def __reduce__(self):
+		return (_unpickle_record, (self._name, self._fields, tuple(self)))
+
+_record_types = {}
+
+def _record_type(name, field_names):
+	"""Returns the Record type for the values of a NestedField"""
+	key = (name, field_names)
+	record_type = _record_types.get(key)
+	if record_type is None:
+		builder = _ValidatorBuilder()
+		for field_name in field_names:
+			builder.emit("_object_setattr(_self, {0!r}, {0})".format(field_name))
+		builder.emit("pass")
+		init = builder.function("__init__", ", ".join(("_self",) + field_names))
+		record_type = _record_types[key] = type(
+			"NestedField_{0}".format(name), (Record,), {
+				"__slots__": field_names,
+				"__module__": __name__,
+				"__init__": init,
+				"_fields": field_names,
+				"_name": name,
+			})
+	return record_type
+
+def _unpickle_record(name, field_names, values):
+	return _record_type(name, field_names)._make(values)
+
+class NestedField(Field):
+	"""A field that contains a dictionary of other fields"""
+
+	def __init__(self, name, *config_fields):
+		"""Initialize this NestedField
+
+		Note: NestedFields cannot have default values. However,
+		fields nested under them can.
+
+		Args:
+		  name: A str. The name of this field.
+		  config_fields: A list of Fields. Defines the fields nested
+		    under this field.
+		"""
+		super(NestedField, self).__init__(name)
+		self.config_fields = config_fields
+		self.record_type = _record_type(name,
+				tuple(c.name for c in config_fields))
+		# the name from when values were namedtuples
+		self.tuple_type = self.record_type
+		# generated on first use; parent configs inline the nested fields
+		self._validator = None
+
+	def validate(self, value):
+		"""Ensure that supplied value is a valid nested field
+
+		Verifies that the supplied value contains all the fields defined
+		by config_fields and that they have appropriate values (or
+		appropriate defaults if the fields are missing).
+
+		Args:
+		  value: A dict. Describes the names and values of the fields
+		    nested under this field.
+
+		Returns:
+		  A Record of the nested field type. This allows attribute
+		    access to nested fields.
+
+		Raises:
+		  ValueError if any of the nested field values are not valid.
+		"""
+		if self._validator is None:
+			self._validator = _compile_validator(self.config_fields, self.name)
+		valid_dict = self._validator(value)
+		return self.record_type(**valid_dict)
+
+	def __getstate__(self):
+		# record types are found again by name and fields, and the
+		# validator is generated again on first use
+		state = dict(self.__dict__)
+		for name in ("record_type", "tuple_type", "_validator"):
+			state.pop(name, None)
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self.record_type = self.tuple_type = _record_type(self.name,
+			tuple(c.name for c in self.config_fields))
+		self._validator = None
+
+	def revalidate(self, old, old_value, new):
+		"""Validate a changed nested field field by field
+
+		Returns the old record if none of its fields changed.
+		"""
+		if (_unchanged(old, new) or not self._inlined(NestedField) or
+				type(old) is not dict or type(new) is not dict or
+				type(old_value) is not self.record_type):
+			return super(NestedField, self).revalidate(old, old_value, new)
+		valid_dict, changed = _revalidate(self.config_fields, old, old_value, new)
+		if not changed:
+			return old_value
+		return self.record_type(**valid_dict)
+
+	def pack(self, value):
+		"""A tuple of the packed nested values, without names"""
+		return tuple([field.pack(item)
+			for field, item in zip(self.config_fields, value)])
+
+	def unpack(self, data):
+		return self.record_type._make([field.unpack(item)
+			for field, item in zip(self.config_fields, data)])
+
+	def _compile(self, builder, value, result):
+		if not self._inlined(NestedField):
+			return super(NestedField, self)._compile(builder, value, result)
+		builder.emit("if type({0}) is dict:".format(value))
+		builder.indent()
+		results = builder.fields(self.config_fields, value)
+		# what the record's __init__ does, without the extra call
+		builder.emit("{0} = _object_new({1})".format(
+			result, builder.const(self.record_type, "record")))
+		for field, field_result in zip(self.config_fields, results):
+			builder.emit("_object_setattr({0}, {1!r}, {2})".format(
+				result, field.name, field_result))
+		builder.dedent()
+		builder.emit("else:")
+		builder.emit("\t{0} = {1}.validate({2})".format(
+			result, builder.const(self, "field"), value))
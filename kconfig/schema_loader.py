@@ -0,0 +1,235 @@
+"""
+Loads YAML straight into validated CheckedConfigs.
+
+Loading a CheckedConfig from a file usually takes three passes: yaml.load
+builds a dict tree, the validator converts its values, and the records
+are built from those. load_checked_config reads the YAML parser's events
+under the guidance of CONFIG_FIELDS and does all three at once: values
+are validated as they are read, nested fields become records directly,
+and keys outside the schema are skipped without building anything for
+them.
+
+Documents the single pass cannot load exactly as yaml.load would, those
+with anchors, aliases, merge keys or explicit tags (like !npy), are loaded
+the usual way instead.
+"""
+
+import yaml
+from yaml.events import (AliasEvent, MappingEndEvent, MappingStartEvent,
+	ScalarEvent, SequenceEndEvent, SequenceStartEvent, StreamEndEvent)
+from yaml.nodes import ScalarNode
+
+from kconfig import INCLUDE_KEYS
+from kconfig import _ConfigLoader
+from kconfig.checked_config import CheckedConfig
+from kconfig.checked_config import ListField
+from kconfig.checked_config import NestedField
+
+# libyaml's parser, when it is there, with the same constructor and
+# resolver as the yaml.Loader that yaml.load uses
+_Loader = getattr(yaml, "CLoader", yaml.Loader)
+
+class _Fallback(Exception):
+	"""Raised when a document needs the full yaml.load"""
+
+_missing = object()
+
+class _SchemaLoader(object):
+	def __init__(self, stream):
+		self.loader = _Loader(stream)
+		self.constructors = self.loader.yaml_constructors
+
+	def load(self, config_fields):
+		get_event = self.loader.get_event
+		get_event()
+		if self.loader.check_event(StreamEndEvent):
+			return None
+		get_event()
+		valid_dict = self.fields(config_fields, True)
+		if valid_dict is _missing:
+			return valid_dict
+		get_event()
+		if not self.loader.check_event(StreamEndEvent):
+			raise _Fallback()
+		return valid_dict
+
+	def event(self):
+		event = self.loader.get_event()
+		if getattr(event, "anchor", None) is not None or type(event) is AliasEvent:
+			raise _Fallback()
+		return event
+
+	def scalar(self, event):
+		tag = event.tag
+		if tag is None or tag == "!":
+			tag = self.loader.resolve(ScalarNode, event.value, event.implicit)
+		try:
+			construct = self.constructors[tag]
+		except KeyError:
+			raise _Fallback()
+		return construct(self.loader, ScalarNode(tag, event.value,
+			event.start_mark, event.end_mark, style=event.style))
+
+	def construct(self, event=None):
+		"""Builds the value of the next node, like yaml.load"""
+		if event is None:
+			event = self.event()
+		event_type = type(event)
+		if event_type is ScalarEvent:
+			return self.scalar(event)
+		self.check_tag(event)
+		if event_type is SequenceStartEvent:
+			value = []
+			while True:
+				event = self.event()
+				if type(event) is SequenceEndEvent:
+					return value
+				value.append(self.construct(event))
+		value = {}
+		while True:
+			event = self.event()
+			if type(event) is MappingEndEvent:
+				return value
+			key = self.construct(event)
+			if key == "<<":
+				raise _Fallback()
+			try:
+				value[key] = self.construct()
+			except TypeError:
+				# an unhashable key, which yaml.load reports
+				raise _Fallback()
+
+	def check_tag(self, event):
+		"""Falls back for collections with tags other than the defaults"""
+		if event.tag is not None and event.tag not in _DEFAULT_TAGS:
+			raise _Fallback()
+
+	def skip(self):
+		"""Skips the next node without building its value"""
+		depth = 0
+		while True:
+			event_type = type(self.event())
+			if event_type is SequenceStartEvent or event_type is MappingStartEvent:
+				depth += 1
+			elif event_type is SequenceEndEvent or event_type is MappingEndEvent:
+				depth -= 1
+			if not depth:
+				return
+
+	def fields(self, config_fields, top=False):
+		"""Validates a mapping node against config_fields
+
+		Returns:
+		  A dictionary of validated fields and values, or _missing if the
+		  node is not a mapping.
+		"""
+		if not self.loader.check_event(MappingStartEvent):
+			return _missing
+		self.check_tag(self.event())
+		by_name = dict((field.name, field) for field in config_fields)
+		valid_dict = {}
+		# errors are raised once the whole mapping is read, for the first
+		# field in schema order, as the validators do
+		errors = {}
+		while True:
+			event = self.event()
+			if type(event) is MappingEndEvent:
+				break
+			key = self.construct(event)
+			if key == "<<" or (top and key in INCLUDE_KEYS):
+				raise _Fallback()
+			try:
+				field = by_name.get(key)
+			except TypeError:
+				raise _Fallback()
+			if field is None:
+				self.skip()
+				continue
+			try:
+				valid_dict[key] = self.value(field)
+			except _Fallback:
+				raise
+			except Exception as e:
+				errors[key] = e
+			else:
+				errors.pop(key, None)
+		for field in config_fields:
+			if field.name in errors:
+				raise errors[field.name]
+			if field.name not in valid_dict:
+				if field.default is None:
+					raise ValueError("Missing config field: '{0}'".format(field.name))
+				valid_dict[field.name] = field.validate(field.default)
+		return valid_dict
+
+	def value(self, field):
+		"""Reads and validates the value of field"""
+		field_type = type(field)
+		if field_type is NestedField:
+			valid_dict = self.fields(field.config_fields)
+			if valid_dict is not _missing:
+				return field.record_type(**valid_dict)
+		elif (field_type is ListField and not (field.lazy or field.columnar) and
+				type(field.field_type) in (NestedField, ListField) and
+				self.loader.check_event(SequenceStartEvent)):
+			self.check_tag(self.event())
+			values = []
+			error = None
+			while not self.loader.check_event(SequenceEndEvent):
+				if error is not None:
+					self.skip()
+					continue
+				try:
+					values.append(self.value(field.field_type))
+				except _Fallback:
+					raise
+				except Exception as e:
+					error = e
+			self.event()
+			if error is not None:
+				raise error
+			return values
+		return field.validate(self.construct())
+
+_DEFAULT_TAGS = frozenset(
+	["!", "tag:yaml.org,2002:seq", "tag:yaml.org,2002:map"])
+
+def _load_yaml(text, name):
+	"""yaml.load with the tags kconfig adds, as if text were read from name"""
+	loader = _ConfigLoader(text)
+	if name is not None:
+		# sidecar paths are relative to the config file
+		loader.name = name
+	try:
+		return loader.get_single_data()
+	finally:
+		loader.dispose()
+
+def load_checked_config(config_class, stream):
+	"""
+	Loads a YAML document into a CheckedConfig in a single pass.
+	Parameters:
+	 - config_class: the CheckedConfig subclass to load
+	 - stream: a file, or a str of YAML
+	Returns:
+	 - an instance of config_class
+	Raises:
+	 - ValueError if the config is not valid
+	"""
+	name = getattr(stream, "name", None)
+	if not isinstance(stream, basestring):
+		stream = stream.read()
+	if (config_class.LAZY or config_class.__init__.im_func is not
+			CheckedConfig.__init__.im_func):
+		return config_class(_load_yaml(stream, name))
+	try:
+		valid_config = _SchemaLoader(stream).load(config_class.CONFIG_FIELDS)
+	except _Fallback:
+		valid_config = _missing
+	if valid_config is _missing or valid_config is None:
+		return config_class(_load_yaml(stream, name))
+	instance = object.__new__(config_class)
+	# there is no raw dict to compare with, so refresh validates it all
+	instance._raw = None
+	instance._populate(valid_config)
+	return instance
@@ -0,0 +1,34 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+class TempConfigTestCase(unittest.TestCase):
+	"""
+	A TestCase that writes config files to a temporary directory, tmpdir,
+	which is removed after each test.
+	"""
+	def setUp(self):
+		self.tmpdir = tempfile.mkdtemp()
+
+	def write_config(self, name, content, mtime=None):
+		"""
+		Writes a file under tmpdir, making the directories it is in.
+		Parameters:
+		 - name: the path of the file, relative to tmpdir
+		 - content: the content of the file
+		 - mtime: the mtime to give the file. (optional)
+		Returns:
+		 - the path of the file
+		"""
+		path = os.path.join(self.tmpdir, name)
+		if not os.path.isdir(os.path.dirname(path)):
+			os.makedirs(os.path.dirname(path))
+		with open(path, "w") as f:
+			f.write(content)
+		if mtime is not None:
+			os.utime(path, (mtime, mtime))
+		return path
+
+	def tearDown(self):
+		shutil.rmtree(self.tmpdir)
@@ -0,0 +1,85 @@
+import json
+import os
+import StringIO
+
+import kconfig
+from kconfig.benchmarks import loading
+from kconfig.benchmarks import regressions
+from kconfig.benchmarks import summarize
+from kconfig.benchmarks import validation
+from kconfig.checked_config import ListField
+from kconfig.checked_config import NestedField
+from tempconfigs import TempConfigTestCase
+
+class ValidationBenchmarkTest(TempConfigTestCase):
+	def test_generate(self):
+		config_class, document, values = validation.generate(width=5, depth=2,
+			list_size=3, seed=1)
+		self.assertEqual(5, len(config_class.CONFIG_FIELDS))
+		self.assertTrue(any(isinstance(field, (NestedField, ListField))
+			for field in config_class.CONFIG_FIELDS))
+		self.assertTrue(values >= 5)
+		config_class(document)
+		self.assertEqual(document, validation.generate(width=5, depth=2,
+			list_size=3, seed=1)[1])
+
+		config_class, document, values = validation.generate(width=4, depth=0,
+			mix={"duration": 1})
+		self.assertEqual(4, values)
+		self.assertEqual(4, len(config_class(document).__getstate__()))
+
+	def test_summarize(self):
+		summary = summarize([0.001] * 98 + [0.002, 0.1])
+		self.assertEqual(100, summary["ops"])
+		self.assertAlmostEqual(1000, summary["p50_us"])
+		self.assertAlmostEqual(100000, summary["p99_us"])
+		self.assertAlmostEqual(100 / 0.2, summary["ops_per_sec"])
+
+	def test_regressions(self):
+		baseline = {"a": {"ops_per_sec": 100.0, "bytes": 10}, "b_per_sec": 10}
+		self.assertEqual([], regressions(
+			{"a": {"ops_per_sec": 95.0, "bytes": 20}, "b_per_sec": 10},
+			baseline, 0.1))
+		self.assertEqual([("a/ops_per_sec", 100.0, 80.0)], regressions(
+			{"a": {"ops_per_sec": 80.0}, "c_per_sec": 1}, baseline, 0.1))
+
+	def test_main(self):
+		output = os.path.join(self.tmpdir, "results.json")
+		args = ["--min-time", "0.01", "--scenario", "flat", "--no-field-types"]
+		self.assertEqual(0, validation.main(args + ["-o", output]))
+		with open(output) as f:
+			results = json.load(f)
+		self.assertEqual(["flat"], results["scenarios"].keys())
+		self.assertTrue(results["scenarios"]["flat"]["validations_per_sec"] > 0)
+
+		results["scenarios"]["flat"]["validations_per_sec"] *= 1000
+		with open(output, "w") as f:
+			json.dump(results, f)
+		out = StringIO.StringIO()
+		self.assertEqual(1, validation.main(args + ["--baseline", output],
+			out=out))
+		self.assertTrue("REGRESSION scenarios/flat/validations_per_sec"
+			in out.getvalue())
+
+class LoadingBenchmarkTest(TempConfigTestCase):
+	def test_build_tree(self):
+		config_path, names = loading.build_tree(self.tmpdir, files=4,
+			prefixes=2, min_size=100, max_size=10000)
+		self.assertEqual([100, 464, 2154, 10000], [size for _, size in names])
+		for name, size in names:
+			path = kconfig.find_config_path(name, config_path=config_path)
+			self.assertTrue(0.5 * size < os.path.getsize(path) < 1.5 * size)
+			self.assertEqual(0, kconfig.fetch_config(name,
+				config_path=config_path)["serial"])
+
+	def test_run(self):
+		results = loading.run(self.tmpdir, files=4, prefixes=2, max_size=2000,
+			threads=2, min_time=0.02)
+		self.assertEqual(set(loading.SCENARIOS + ["tree"]), set(results))
+		self.assertEqual(["100B_and_over", "1KB_and_over"],
+			sorted(results["fetch_config_cold"]))
+		for scenario in ["warm_fetch", "threads", "churn", "config_exists_miss"]:
+			self.assertTrue(results[scenario]["ops"] > 0)
+			self.assertTrue(results[scenario]["p99_us"] >=
+				results[scenario]["p50_us"])
+		self.assertEqual(0, results["churn"]["errors"])
@@ -1,12 +1,37 @@
+import cPickle
+import math
 import os.path
+import shutil
+import tempfile
+import time
 import unittest
 
+from kconfig import Config
 from kconfig.checked_config import CheckedConfig
 from kconfig.checked_config import NestedField
 from kconfig.checked_config import ListField
 from kconfig.checked_config import StringField
 from kconfig.checked_config import IntField
 from kconfig.checked_config import BoolField
+from kconfig.checked_config import Field
+from kconfig.checked_config import BatchValidationError
+from kconfig.checked_config import ByteSizeField
+from kconfig.checked_config import DurationField
+from kconfig.checked_config import EnumField
+from kconfig.checked_config import FloatField
+from kconfig.checked_config import HostPort
+from kconfig.checked_config import HostPortField
+from kconfig.checked_config import URLField
+from kconfig.checked_config import LazyList
+from kconfig.checked_config import FileRef
+from kconfig.checked_config import FileRefField
+from kconfig.checked_config import derived
+from kconfig.checked_config import ColumnarList
+from kconfig.checked_config import ArrayField
+from kconfig.checked_config import MapField
+from kconfig.diskmap import DiskMap
+from kconfig.diskmap import index_path
+from kconfig.validators import _validate
 
 CONFIGS_DIR = os.path.join(os.path.dirname(__file__), "configs")
 
@@ -36,6 +61,70 @@ class DatabaseConfig(CheckedConfig):
 		)
 	]
 
+class UpperField(Field):
+	def validate(self, value):
+		return str(value).upper()
+
+class ServersConfig(CheckedConfig):
+	CONFIG_FIELDS = [
+		ListField("servers",
+			NestedField("server",
+				StringField("host"),
+				IntField("port", default=3306, lower_bound=1),
+				UpperField("role", default="replica")
+			)
+		)
+	]
+
+class ServiceConfig(CheckedConfig):
+	CONFIG_FIELDS = [
+		DurationField("timeout", default="30s"),
+		ByteSizeField("max_body", default="1MiB"),
+		HostPortField("database", default_port=3306),
+		ListField("backends", HostPortField("backend")),
+		URLField("callback", schemes=["http", "https"]),
+		FloatField("sample_rate", default=1.0, lower_bound=0, upper_bound=1),
+		EnumField("mode", ["active", "standby"], default="active"),
+	]
+
+class InventoryConfig(CheckedConfig):
+	CONFIG_FIELDS = [
+		ListField("hosts", NestedField("host",
+			StringField("name"),
+			IntField("port", default=22, lower_bound=1)
+		), lazy=True),
+	]
+
+class ReportsServiceConfig(CheckedConfig):
+	CONFIG_FIELDS = [
+		StringField("name"),
+		FileRefField("database", DatabaseConfig),
+		ListField("replicas", FileRefField("replica", DatabaseConfig)),
+	]
+
+class RoutesConfig(CheckedConfig):
+	CONFIG_FIELDS = [ListField("patterns", StringField("pattern"))]
+
+	builds = 0
+
+	@derived
+	def table(self):
+		RoutesConfig.builds += 1
+		return dict((pattern, index) for index, pattern in enumerate(self.patterns))
+
+class ColumnarConfig(CheckedConfig):
+	CONFIG_FIELDS = [
+		ListField("servers", NestedField("server",
+			StringField("host"),
+			IntField("port", default=3306),
+			FloatField("weight", default=1.0),
+			BoolField("primary", default=False)
+		), columnar=True),
+	]
+
+class LazyTestConfig(TestConfig):
+	LAZY = True
+
 class TestCheckedConfig(unittest.TestCase):
 
 	def setUp(self):
@@ -121,5 +210,667 @@ class TestCheckedConfig(unittest.TestCase):
 		self.assertEqual("reports", config.database.password)
 		self.assertEqual("localhost", config.database.host)
 
+	def test_generated_validator_matches_validate(self):
+		self.assertEqual(_validate(self.config_dict, TestConfig.CONFIG_FIELDS),
+			TestConfig._validator(self.config_dict))
+		self.assertTrue("for " in TestConfig._validator.source)
+
+	def test_nested_list(self):
+		config = ServersConfig({"servers": [
+			{"host": "db1"},
+			{"host": "db2", "port": "3307", "role": "primary"}]})
+		self.assertEqual("db1", config.servers[0].host)
+		self.assertEqual(3306, config.servers[0].port)
+		self.assertEqual("REPLICA", config.servers[0].role)
+		self.assertEqual(3307, config.servers[1].port)
+		self.assertEqual("PRIMARY", config.servers[1].role)
+
+		with self.assertRaises(ValueError) as ve:
+			ServersConfig({"servers": [{"host": "db1", "port": 0}]})
+		self.assertEqual("Value for field 'port': 0 is less than lower bound 1",
+				ve.exception.message)
+		with self.assertRaises(ValueError) as ve:
+			ServersConfig({"servers": [{"port": 1}]})
+		self.assertEqual("Missing config field: 'host'", ve.exception.message)
+
+	def test_bool_values(self):
+		for value, expected in [("true", True), ("yes", True), (1, True),
+				(1.0, True), ("false", False), (0, False), ([1], False)]:
+			self.config_dict["attributes"]["smart_guy"] = value
+			self.assertEqual(expected,
+				TestConfig(self.config_dict).attributes.smart_guy)
+
+	def test_infinite_bounds(self):
+		inf = float("inf")
+		class BoundsConfig(CheckedConfig):
+			CONFIG_FIELDS = [
+				FloatField("ratio", upper_bound=inf),
+				FloatField("limit", default=inf),
+				IntField("count", lower_bound=-inf),
+			]
+		config = BoundsConfig({"ratio": 1e300, "count": -5})
+		self.assertEqual((1e300, inf, -5),
+			(config.ratio, config.limit, config.count))
+		self.assertTrue(math.isnan(BoundsConfig(
+			{"ratio": 1, "count": 0, "limit": "nan"}).limit))
+
+	def test_reassign_config_fields(self):
+		class ReassignedConfig(CheckedConfig):
+			CONFIG_FIELDS = [StringField("name")]
+		ReassignedConfig.CONFIG_FIELDS = [IntField("age")]
+		self.assertEqual(31, ReassignedConfig({"age": "31"}).age)
+
+	def test_memoized_instances(self):
+		tmpdir = tempfile.mkdtemp()
+		try:
+			path = os.path.join(tmpdir, "reports.yml")
+			shutil.copy(os.path.join(CONFIGS_DIR, "databases/reports.yml"), path)
+			config = DatabaseConfig(path)
+			self.assertTrue(config is DatabaseConfig(path))
+			self.assertFalse(config is DatabaseConfig(Config.fetch_config(path)))
+			# other names of the same file
+			self.assertTrue(config is DatabaseConfig(path[:-len(".yml")]))
+			self.assertTrue(config is DatabaseConfig(
+				os.path.relpath(path, os.getcwd())))
+
+			with open(path, "a") as f:
+				f.write("  port: 3307\n")
+			os.utime(path, (1, 1))
+			other = DatabaseConfig(path)
+			self.assertFalse(config is other)
+			self.assertTrue(other is DatabaseConfig(path))
+
+			# equal, but not the same values
+			class NameConfig(CheckedConfig):
+				CONFIG_FIELDS = [StringField("name")]
+			path = os.path.join(tmpdir, "name.yml")
+			with open(path, "w") as f:
+				f.write("name: 1\n")
+			self.assertEqual("1", NameConfig(path).name)
+			with open(path, "w") as f:
+				f.write("name: 1.0\n")
+			os.utime(path, (1, 1))
+			self.assertEqual("1.0", NameConfig(path).name)
+		finally:
+			shutil.rmtree(tmpdir)
+
+	def test_pickle_nested(self):
+		config = TestConfig(self.config_dict)
+		attributes = cPickle.loads(cPickle.dumps(config.attributes, 2))
+		self.assertEqual(config.attributes, attributes)
+		self.assertTrue(type(config.attributes) is type(attributes))
+		self.assertEqual(True, attributes.cool_guy)
+
+	def test_records(self):
+		config = TestConfig(self.config_dict)
+		attributes = config.attributes
+		self.assertEqual(("cool_guy", "smart_guy", "rad_guy"), attributes._fields)
+		self.assertEqual((True, False, True), tuple(attributes))
+		self.assertEqual(False, attributes[1])
+		self.assertEqual(attributes, TestConfig(self.config_dict).attributes)
+		self.assertEqual(hash(attributes),
+			hash(TestConfig(self.config_dict).attributes))
+		self.assertEqual(False, attributes._replace(cool_guy=False).cool_guy)
+		self.assertEqual({"cool_guy": True, "smart_guy": False, "rad_guy": True},
+			dict(attributes._asdict()))
+		self.assertEqual(
+			"NestedField_attributes(cool_guy=True, smart_guy=False, rad_guy=True)",
+			repr(attributes))
+		with self.assertRaises(AttributeError):
+			attributes.cool_guy = False
+		self.assertFalse(hasattr(attributes, "__dict__"))
+
+		# the tuple API, but not a tuple
+		self.assertEqual(3, len(attributes))
+		self.assertEqual(2, attributes.count(True))
+		self.assertEqual(1, attributes.index(False))
+		self.assertTrue(False in attributes)
+		self.assertEqual((True, False), attributes[:2])
+		self.assertEqual((True, False, True), attributes)
+		self.assertFalse(isinstance(attributes, tuple))
+
+	def test_reserved_field_names(self):
+		for name in ("refresh", "live", "validate_all", "validate_many"):
+			with self.assertRaises(ValueError):
+				type("ReservedConfig", (CheckedConfig,),
+					{"CONFIG_FIELDS": [StringField(name)]})
+		class RenamedConfig(CheckedConfig):
+			CONFIG_FIELDS = [StringField("name")]
+		with self.assertRaises(ValueError):
+			RenamedConfig.CONFIG_FIELDS = [IntField("refresh")]
+
+	def test_slots(self):
+		self.assertEqual(("name", "age", "attributes", "email_addresses", "_raw"),
+			TestConfig.__slots__)
+		config = TestConfig(self.config_dict)
+		self.assertEqual({}, config.__dict__)
+		config.extra = 1
+		self.assertEqual({"extra": 1}, config.__dict__)
+
+	def test_pickle_config(self):
+		config = TestConfig(self.config_dict)
+		for protocol in (0, 2):
+			unpickled = cPickle.loads(cPickle.dumps(config, protocol))
+			self.assertEqual("Brad", unpickled.name)
+			self.assertEqual(config.attributes, unpickled.attributes)
+			self.assertEqual(config.email_addresses, unpickled.email_addresses)
+
+	def test_disk_cache(self):
+		cache_dir = tempfile.mkdtemp()
+		try:
+			class CachedConfig(TestConfig):
+				DISK_CACHE_DIR = cache_dir
+			config = CachedConfig(self.config_dict)
+			self.assertEqual(1, len(os.listdir(cache_dir)))
+
+			def fail(config_dict):
+				raise AssertionError("validated again")
+			CachedConfig._validator = staticmethod(fail)
+			cached = CachedConfig(self.config_dict)
+			self.assertEqual(config.attributes, cached.attributes)
+			self.assertEqual(config.email_addresses, cached.email_addresses)
+		finally:
+			shutil.rmtree(cache_dir)
+
+	def test_disk_cache_permissions(self):
+		tmpdir = tempfile.mkdtemp()
+		try:
+			cache_dir = os.path.join(tmpdir, "cache")
+			class CachedConfig(TestConfig):
+				DISK_CACHE_DIR = cache_dir
+			CachedConfig(self.config_dict)
+			self.assertEqual(0700, os.stat(cache_dir).st_mode & 0777)
+			self.assertEqual(1, len(os.listdir(cache_dir)))
+
+			# not trusted once others can write to it
+			os.chmod(cache_dir, 0777)
+			CachedConfig._validator = staticmethod(
+				lambda config_dict: {"name": "validated", "age": 1,
+					"attributes": None, "email_addresses": []})
+			self.assertEqual("validated", CachedConfig(self.config_dict).name)
+		finally:
+			shutil.rmtree(tmpdir)
+
+	def test_validate_many(self):
+		other = dict(self.config_dict, name="Jim", age="40")
+		configs = TestConfig.validate_many([self.config_dict, other])
+		self.assertEqual(["Brad", "Jim"], [config.name for config in configs])
+		self.assertEqual(40, configs[1].age)
+
+		bad = dict(self.config_dict, age=-1)
+		with self.assertRaises(BatchValidationError) as bve:
+			TestConfig.validate_many([bad, other, {"name": "Bob"}])
+		self.assertEqual([0, 2], [index for index, _ in bve.exception.errors])
+		self.assertEqual("Value for field 'age': -1 is less than lower bound 0",
+			bve.exception.errors[0][1].message)
+		self.assertEqual("Jim", bve.exception.results[1].name)
+		self.assertEqual(None, bve.exception.results[2])
+
+		with self.assertRaises(BatchValidationError) as bve:
+			TestConfig.validate_many([bad] * 25)
+		self.assertEqual(25, len(bve.exception.errors))
+		message = str(bve.exception)
+		self.assertTrue(message.startswith("25 of 25 configs are invalid: [0] "))
+		self.assertTrue("[9] " in message and "[10] " not in message)
+		self.assertTrue(message.endswith("; and 15 more"))
+
+	def test_list_fast_paths(self):
+		ints = ListField("ports", IntField("port", lower_bound=1))
+		self.assertEqual([1, 2, 3], ints.validate(["1", 2, 3.0]))
+		with self.assertRaises(ValueError) as ve:
+			ints.validate([1, 0, "x"])
+		self.assertEqual("Value for field 'port': 0 is less than lower bound 1",
+			ve.exception.message)
+		with self.assertRaises(ValueError) as ve:
+			ints.validate([1, "x"])
+		self.assertEqual("Value for field 'port': invalid literal for int() with base 10: 'x'",
+			ve.exception.message)
+
+		strs = ListField("names", StringField("name", pattern="^\w+$"))
+		self.assertEqual(["a", "1"], strs.validate(["a", 1]))
+		self.assertRaises(ValueError, strs.validate, ["a", "b c"])
+
+		bools = ListField("flags", BoolField("flag"))
+		self.assertEqual([True, False, False], bools.validate(["yes", 0, [1]]))
+
+		try:
+			import numpy
+		except ImportError:
+			return
+		self.assertEqual([1, 2], ints.validate(numpy.array([1, 2])))
+		self.assertRaises(ValueError, ints.validate, numpy.array([0, 2]))
+
+	def test_lazy(self):
+		self.config_dict["age"] = -1
+		config = LazyTestConfig(self.config_dict)
+		self.assertEqual("Brad", config.name)
+		self.assertEqual({"name": "Brad"},
+			dict((k, v) for k, v in vars(config).iteritems() if k != "_raw"))
+		self.assertEqual(True, config.attributes.cool_guy)
+		with self.assertRaises(ValueError) as ve:
+			config.age
+		self.assertEqual("Value for field 'age': -1 is less than lower bound 0",
+			ve.exception.message)
+		self.assertRaises(ValueError, config.validate_all)
+
+		self.config_dict["age"] = 31
+		config = LazyTestConfig(self.config_dict).validate_all()
+		self.assertEqual(31, config.age)
+		unpickled = cPickle.loads(cPickle.dumps(config, 2))
+		self.assertEqual(config.attributes, unpickled.attributes)
+		self.assertFalse(hasattr(unpickled, "_raw"))
+
+		self.assertRaises(BatchValidationError, LazyTestConfig.validate_many,
+			[self.config_dict, {"name": "Bob"}])
+
+	def test_refresh(self):
+		config_dict = {"servers": [{"host": "db1"}, {"host": "db2", "port": 3307}]}
+		config = ServersConfig(config_dict)
+		# configs built from a dict do not keep it until refreshed
+		self.assertFalse(hasattr(config, "_raw"))
+		servers = config.servers
+		config.refresh(config_dict)
+		self.assertFalse(servers[0] is config.servers[0])
+		servers = config.servers
+		config.refresh({"servers": [
+			{"host": "db1"}, {"host": "db2", "port": 3308}, {"host": "db3"}]})
+		self.assertFalse(servers is config.servers)
+		self.assertTrue(servers[0] is config.servers[0])
+		self.assertEqual(3308, config.servers[1].port)
+		self.assertEqual("db3", config.servers[2].host)
+
+		servers = config.servers
+		config.refresh({"servers": [
+			{"host": "db1"}, {"host": "db2", "port": 3308}, {"host": "db3"}]})
+		self.assertTrue(servers is config.servers)
+		# equal but differently typed values are validated again
+		config.refresh({"servers": [
+			{"host": "db1"}, {"host": "db2", "port": 3308.0}, {"host": "db3"}]})
+		self.assertTrue(servers[0] is config.servers[0])
+		self.assertFalse(servers[1] is config.servers[1])
+
+		self.assertRaises(ValueError, config.refresh,
+			{"servers": [{"host": "db1", "port": 0}]})
+		self.assertTrue(servers[0] is config.servers[0])
+		self.assertEqual(3, len(config.servers))
+
+	def test_refresh_lazy(self):
+		config = LazyTestConfig(self.config_dict)
+		attributes = config.attributes
+		config.name
+		self.config_dict = dict(self.config_dict, name="Jim", age=-1)
+		config.refresh(self.config_dict)
+		self.assertTrue(attributes is config.attributes)
+		self.assertEqual("Jim", config.name)
+		self.assertRaises(ValueError, getattr, config, "age")
+
+	def test_memoized_refresh(self):
+		tmpdir = tempfile.mkdtemp()
+		try:
+			path = os.path.join(tmpdir, "reports.yml")
+			shutil.copy(os.path.join(CONFIGS_DIR, "databases/reports.yml"), path)
+			config = DatabaseConfig(path)
+			with open(path, "a") as f:
+				f.write("other: 1\n")
+			os.utime(path, (1, 1))
+			other = DatabaseConfig(path)
+			self.assertFalse(config is other)
+			self.assertTrue(config.database is other.database)
+
+			# a refreshed config no longer stands for the file
+			database = Config.fetch_config(path)["database"]
+			other.refresh({"database": dict(database, host="other")})
+			self.assertEqual("other", other.database.host)
+			self.assertFalse(other is DatabaseConfig(path))
+			self.assertEqual(config.database, DatabaseConfig(path).database)
+		finally:
+			shutil.rmtree(tmpdir)
+
+	def test_rich_fields(self):
+		config_dict = {
+			"timeout": "1m30s",
+			"database": "db1",
+			"backends": ["app1:80", "[::1]:8080", "app1:80"],
+			"callback": "https://example.com:8443/hook?x=1",
+			"sample_rate": "0.25",
+		}
+		config = ServiceConfig(config_dict)
+		self.assertEqual(90.0, config.timeout)
+		self.assertEqual(1048576, config.max_body)
+		self.assertEqual(("db1", 3306), config.database)
+		self.assertEqual(HostPort("::1", 8080), config.backends[1])
+		self.assertTrue(config.backends[0] is config.backends[2])
+		self.assertEqual("example.com", config.callback.hostname)
+		self.assertEqual(8443, config.callback.port)
+		self.assertEqual(0.25, config.sample_rate)
+		self.assertEqual("active", config.mode)
+		self.assertEqual(_validate(config_dict, ServiceConfig.CONFIG_FIELDS),
+			ServiceConfig._validator(config_dict))
+
+		for field, value in [("timeout", "30 parsecs"), ("timeout", -1),
+				("max_body", "12 bananas"), ("database", "db1:0"),
+				("backends", ["app1"]), ("callback", "ftp://example.com"),
+				("callback", "http://example.com:99999/"),
+				("sample_rate", 2), ("mode", "passive"), ("mode", [])]:
+			bad = dict(config_dict)
+			bad[field] = value
+			self.assertRaises(ValueError, ServiceConfig, bad)
+
+	def test_duration_and_byte_size(self):
+		duration = DurationField("duration")
+		for value, seconds in [("250ms", 0.25), ("2h", 7200.0), ("1.5d", 129600.0),
+				(" 1m 30s ", 90.0), ("45", 45.0), (10, 10.0)]:
+			self.assertEqual(seconds, duration.validate(value))
+		size = ByteSizeField("size")
+		for value, size_bytes in [("512MB", 512000000), ("512m", 536870912),
+				("4KiB", 4096), ("1.5k", 1536), ("100", 100), (7, 7)]:
+			self.assertEqual(size_bytes, size.validate(value))
+		with self.assertRaises(ValueError) as ve:
+			size.validate("1 parsec")
+		self.assertEqual("Value for field 'size': '1 parsec' is not a byte size",
+			ve.exception.message)
+
+	def test_lazy_list(self):
+		raw = [{"name": "web%d" % i} for i in range(1000)]
+		raw[500]["port"] = 0
+		config = InventoryConfig({"hosts": raw})
+		hosts = config.hosts
+		self.assertTrue(isinstance(hosts, LazyList))
+		self.assertEqual(1000, len(hosts))
+		self.assertEqual("web1", hosts[1].name)
+		self.assertTrue(hosts[1] is hosts[1])
+		self.assertEqual(22, hosts[-1].port)
+		self.assertEqual(["web2", "web3"], [host.name for host in hosts[2:4]])
+		with self.assertRaises(ValueError) as ve:
+			hosts[500]
+		self.assertEqual("Value for field 'port': 0 is less than lower bound 1",
+			ve.exception.message)
+		self.assertRaises(ValueError, config.validate_all)
+
+		del raw[500]["port"]
+		config = InventoryConfig({"hosts": raw}).validate_all()
+		self.assertEqual(list(config.hosts), config.hosts)
+		self.assertEqual(list(config.hosts),
+			cPickle.loads(cPickle.dumps(config.hosts, 2)))
+
+		# pickles stay lazy, and keep the items validated so far
+		raw[500]["port"] = 0
+		hosts = InventoryConfig({"hosts": raw}).hosts
+		first = hosts[0]
+		unpickled = cPickle.loads(cPickle.dumps(hosts, 2))
+		self.assertTrue(isinstance(unpickled, LazyList))
+		self.assertEqual(first, unpickled[0])
+		self.assertRaises(ValueError, unpickled.__getitem__, 500)
+
+		cache_dir = tempfile.mkdtemp()
+		try:
+			class CachedInventoryConfig(InventoryConfig):
+				DISK_CACHE_DIR = cache_dir
+			for _ in range(2):
+				hosts = CachedInventoryConfig({"hosts": raw}).hosts
+				self.assertTrue(isinstance(hosts, LazyList))
+				self.assertRaises(ValueError, hosts.__getitem__, 500)
+			self.assertEqual(1, len(os.listdir(cache_dir)))
+
+			# a field defined in a function can not be pickled
+			class LocalField(IntField):
+				pass
+			class UncachedConfig(CheckedConfig):
+				CONFIG_FIELDS = [ListField("ports", LocalField("port"), lazy=True)]
+				DISK_CACHE_DIR = cache_dir
+			self.assertEqual(80, UncachedConfig({"ports": [80]}).ports[0])
+			self.assertEqual(1, len(os.listdir(cache_dir)))
+		finally:
+			shutil.rmtree(cache_dir)
+
+	def test_live(self):
+		tmpdir = tempfile.mkdtemp()
+		try:
+			path = os.path.join(tmpdir, "reports.yml")
+			shutil.copy(os.path.join(CONFIGS_DIR, "databases/reports.yml"), path)
+			live = DatabaseConfig.live(path, poll_interval=None)
+			self.assertEqual("localhost", live.config.database.host)
+			self.assertFalse(live.check())
+			config = live.config
+
+			with open(path, "w") as f:
+				f.write("database:\n  adapter: [\n")
+			os.utime(path, (1, 1))
+			self.assertFalse(live.check())
+			self.assertTrue(live.error is not None)
+			self.assertTrue(config is live.config)
+
+			with open(path, "w") as f:
+				f.write("database: {database: a, username: b, password: c, "
+					"host: db1}\n")
+			os.utime(path, (2, 2))
+			self.assertTrue(live.check())
+			self.assertEqual(None, live.error)
+			self.assertEqual("db1", live.config.database.host)
+		finally:
+			shutil.rmtree(tmpdir)
+
+	def test_live_polling(self):
+		tmpdir = tempfile.mkdtemp()
+		try:
+			path = os.path.join(tmpdir, "reports.yml")
+			shutil.copy(os.path.join(CONFIGS_DIR, "databases/reports.yml"), path)
+			live = DatabaseConfig.live(path, poll_interval=0.01)
+			with open(path, "w") as f:
+				f.write("database: {database: a, username: b, password: c, "
+					"host: db1}\n")
+			os.utime(path, (1, 1))
+			deadline = time.time() + 5
+			while live.config.database.host != "db1":
+				self.assertTrue(time.time() < deadline)
+				time.sleep(0.01)
+			live.stop()
+		finally:
+			shutil.rmtree(tmpdir)
+
+	def test_file_ref(self):
+		tmpdir = tempfile.mkdtemp()
+		try:
+			path = os.path.join(tmpdir, "reports.yml")
+			shutil.copy(os.path.join(CONFIGS_DIR, "databases/reports.yml"), path)
+			missing = os.path.join(tmpdir, "missing.yml")
+			config = ReportsServiceConfig({"name": "reports",
+				"database": path, "replicas": [path, missing]})
+			self.assertEqual(FileRef(DatabaseConfig, path), config.database)
+			self.assertEqual("localhost", config.database.database.host)
+			self.assertTrue(config.database._config is DatabaseConfig(path))
+			self.assertTrue(config.database._config is
+				config.replicas[0]._config)
+			self.assertRaises(IOError, config.validate_all)
+			self.assertEqual(config.database,
+				cPickle.loads(cPickle.dumps(config.database, 2)))
+
+			with open(path, "w") as f:
+				f.write("database: {database: a, username: b, password: c, "
+					"host: db1}\n")
+			os.utime(path, (1, 1))
+			# seen once the file is fetched again
+			self.assertEqual("localhost", config.database.database.host)
+			DatabaseConfig(path)
+			self.assertEqual("db1", config.database.database.host)
+			self.assertRaises(ValueError, ReportsServiceConfig,
+				{"name": "reports", "database": 1, "replicas": []})
+		finally:
+			shutil.rmtree(tmpdir)
+
+	def test_file_ref_fetches(self):
+		tmpdir = tempfile.mkdtemp()
+		fetches = []
+		fetch_config = Config.fetch_config
+		def counting_fetch_config(*args, **kwargs):
+			fetches.append(args)
+			return fetch_config(*args, **kwargs)
+		Config.fetch_config = counting_fetch_config
+		try:
+			path = os.path.join(tmpdir, "reports.yml")
+			shutil.copy(os.path.join(CONFIGS_DIR, "databases/reports.yml"), path)
+			config = ReportsServiceConfig({"name": "reports",
+				"database": path, "replicas": []})
+			for _ in xrange(10):
+				self.assertEqual("localhost", config.database.database.host)
+			self.assertEqual(1, len(fetches))
+
+			with open(path, "w") as f:
+				f.write("database: {database: a, username: b, password: c, "
+					"host: db1}\n")
+			os.utime(path, (1, 1))
+			DatabaseConfig(path)
+			for _ in xrange(10):
+				self.assertEqual("db1", config.database.database.host)
+			self.assertEqual(3, len(fetches))
+		finally:
+			del Config.fetch_config
+			shutil.rmtree(tmpdir)
+
+	def test_derived(self):
+		RoutesConfig.builds = 0
+		config = RoutesConfig({"patterns": ["a", "b"]})
+		self.assertEqual({"a": 0, "b": 1}, config.table)
+		self.assertTrue(config.table is config.table)
+		self.assertEqual(1, RoutesConfig.builds)
+		self.assertFalse("table" in cPickle.loads(cPickle.dumps(config, 2)).__dict__)
+
+		config.refresh({"patterns": ["c"]})
+		self.assertEqual({"c": 0}, config.table)
+		self.assertEqual(2, RoutesConfig.builds)
+
+		# a failed refresh keeps the derived values along with the fields
+		self.assertRaises(ValueError, config.refresh, {})
+		self.assertEqual({"c": 0}, config.table)
+		self.assertEqual(2, RoutesConfig.builds)
+		self.assertEqual(frozenset(["table"]), RoutesConfig._derived)
+
+	def test_columnar(self):
+		raw = {"servers": [
+			{"host": "db1", "port": 3307, "primary": "yes"},
+			{"host": "db2", "weight": "0.5"},
+			{"host": "db3", "port": 3308},
+		]}
+		config = ColumnarConfig(raw)
+		servers = config.servers
+		self.assertTrue(isinstance(servers, ColumnarList))
+		self.assertEqual(3, len(servers))
+		self.assertEqual(True, servers[0].primary)
+		self.assertEqual(False, servers[1].primary)
+		self.assertEqual(0.5, servers[1].weight)
+		self.assertEqual(["db1", "db2", "db3"], [server.host for server in servers])
+		self.assertEqual([3307, 3306, 3308], list(servers.column("port")))
+		unpickled = cPickle.loads(cPickle.dumps(servers, 2))
+		self.assertEqual(servers, unpickled)
+		self.assertEqual(list(servers), unpickled)
+
+		with self.assertRaises(ValueError) as ve:
+			ColumnarConfig({"servers": [{"host": "db1"}, {"port": 1}]})
+		self.assertEqual("Missing config field: 'host'", ve.exception.message)
+		self.assertRaises(ValueError, ListField, "servers", IntField("port"),
+			columnar=True)
+
+		try:
+			import numpy
+		except ImportError:
+			return
+		ports = servers.numpy_column("port")
+		self.assertEqual(["db1", "db3"],
+			[server.host for server in servers.take(ports > 3306)])
+		self.assertEqual([True, False, False],
+			servers.numpy_column("primary").tolist())
+
+	def test_array_field(self):
+		weights = ArrayField("weights")
+		values = weights.validate([1, 2.5])
+		self.assertEqual("d", values.typecode)
+		self.assertEqual([1.0, 2.5], values.tolist())
+		self.assertRaises(ValueError, weights.validate, [1, "x"])
+		self.assertRaises(ValueError, weights.validate, "12345678")
+		self.assertEqual([1, 2], ArrayField("counts", "l").validate((1, 2)).tolist())
+
+	def test_array_sidecar(self):
+		try:
+			import numpy
+		except ImportError:
+			return
+		tmpdir = tempfile.mkdtemp()
+		try:
+			path = os.path.join(tmpdir, "model.yml")
+			with open(path, "w") as f:
+				f.write("weights: !npy weights.npy\n")
+			numpy.save(os.path.join(tmpdir, "weights.npy"),
+				numpy.array([0.5, 1.5]))
+
+			class ModelConfig(CheckedConfig):
+				CONFIG_FIELDS = [ArrayField("weights")]
+			config = ModelConfig(path)
+			self.assertEqual([0.5, 1.5], config.weights.tolist())
+			self.assertTrue(isinstance(config.weights, numpy.memmap))
+			self.assertFalse(config.weights.flags.writeable)
+
+			class CountsConfig(CheckedConfig):
+				CONFIG_FIELDS = [ArrayField("weights", "l")]
+			with self.assertRaises(ValueError) as ve:
+				CountsConfig(path)
+			self.assertTrue("has dtype float64" in ve.exception.message)
+			self.assertEqual([1.0], ArrayField("weights", use_numpy=True).validate(
+				[1]).tolist())
+		finally:
+			shutil.rmtree(tmpdir)
+
+	def test_map_field(self):
+		tenants = MapField("tenants", IntField("quota", lower_bound=0))
+		self.assertEqual({"a": 1}, tenants.validate({"a": "1"}))
+		self.assertRaises(ValueError, tenants.validate, {"a": -1})
+		self.assertRaises(ValueError, tenants.validate, [1])
+
+		tmpdir = tempfile.mkdtemp()
+		try:
+			path = os.path.join(tmpdir, "service.yml")
+			with open(path, "w") as f:
+				f.write("tenants: !table tenants.yml\n")
+			table_path = os.path.join(tmpdir, "tenants.yml")
+			with open(table_path, "w") as f:
+				f.write("".join("t%d: %d\n" % (i, i) for i in xrange(100)))
+
+			class ServiceConfig(CheckedConfig):
+				CONFIG_FIELDS = [tenants]
+			config = ServiceConfig(path)
+			self.assertTrue(isinstance(config.tenants, DiskMap))
+			self.assertTrue(os.path.exists(index_path(table_path)))
+			self.assertEqual(42, config.tenants["t42"])
+			self.assertEqual(42, config.tenants[u"t42"])
+			self.assertFalse("t100" in config.tenants)
+			self.assertEqual(100, len(config.tenants))
+			self.assertEqual(set("t%d" % i for i in xrange(100)), set(config.tenants))
+			self.assertEqual(dict(config.tenants),
+				dict(cPickle.loads(cPickle.dumps(config.tenants, 2))))
+
+			with open(table_path, "w") as f:
+				f.write("t1: 5\nt2: -1\n")
+			self.assertRaises(ValueError, ServiceConfig, path)
+			with open(table_path, "w") as f:
+				f.write("t1: 5\n")
+			mtime = os.stat(table_path).st_mtime + 10
+			os.utime(table_path, (mtime, mtime))
+			self.assertEqual({"t1": 5}, dict(ServiceConfig(path).tenants))
+			# other conversions get their own index
+			self.assertEqual({"t1": "5"}, dict(DiskMap(table_path, str, "str")))
+
+			# numeric keys are looked up like dict keys
+			with open(table_path, "w") as f:
+				f.write("1: one\n2.0: two\n")
+			os.utime(table_path, (mtime + 10, mtime + 10))
+			numbers = DiskMap(table_path)
+			for key in (1, 1L, 1.0, True):
+				self.assertEqual("one", numbers[key])
+			self.assertEqual("two", numbers[2])
+			self.assertEqual(set([1, 2]), set(numbers))
+			# and maps of the same index share a connection
+			self.assertTrue(numbers._connection is DiskMap(table_path)._connection)
+		finally:
+			shutil.rmtree(tmpdir)
+
 if __name__ == "__main__":
 	unittest.main()
@@ -0,0 +1,96 @@
+import datetime
+import os
+import shutil
+
+import kconfig
+from kconfig.checked_config import CheckedConfig
+from kconfig.checked_config import IntField
+from kconfig.checked_config import StringField
+from kconfig.compiled import CompiledConfigDefault
+from kconfig.compiled import compile_configs
+from kconfig.compiled import module_name
+from kconfig.compiled import render
+from tempconfigs import TempConfigTestCase
+
+class HostConfig(CheckedConfig):
+	CONFIG_FIELDS = [
+		StringField("host"),
+		IntField("port", lower_bound=1),
+	]
+
+SCHEMA = __name__ + ":HostConfig"
+
+class CompiledTest(TempConfigTestCase):
+	def setUp(self):
+		super(CompiledTest, self).setUp()
+		self.prefix = os.path.join(self.tmpdir, "configs")
+		self.output = os.path.join(self.tmpdir, "compiled")
+		self.config_path = kconfig.ConfigPathDefaults([self.prefix])
+		self.write_config("configs/base.yml",
+			"port: 3306\nweights: [0.5, .inf]\n", 100)
+		self.write_config("configs/databases/reports.yml",
+			"extends: base\nhost: db1\nstarted: 2014-01-02\n", 100)
+
+	def compile(self, *configs):
+		return compile_configs(configs, self.output,
+			kconfig.ConfigDefault(config_path=self.config_path, includes=True))
+
+	def test_compile(self):
+		paths = self.compile(("databases/reports.yml", SCHEMA))
+		self.assertEqual([os.path.join(self.output,
+			module_name("databases/reports.yml", self.config_path) + ".py")],
+			paths)
+		self.assertTrue(os.path.exists(paths[0] + "c"))
+		for name in ("databases/reports",
+				os.path.join(self.prefix, "databases/reports.yml")):
+			self.assertEqual(paths, [os.path.join(self.output,
+				module_name(name, self.config_path) + ".py")])
+
+		config = CompiledConfigDefault(self.output, config_path=self.config_path)
+		value = config.fetch_config("databases/reports.yml")
+		self.assertEqual({"host": "db1", "port": 3306,
+			"weights": [0.5, float("inf")],
+			"started": datetime.date(2014, 1, 2)}, value)
+		self.assertTrue(value is config.fetch_config("databases/reports.yml"))
+		generation = config.generation("databases/reports.yml")
+
+		# served from the module while the YAML is not newer
+		self.write_config("configs/databases/reports.yml",
+			"host: db2\nport: 1\n", 100)
+		self.assertEqual("db1", config.fetch_config("databases/reports.yml")["host"])
+
+		# an included file changed
+		self.write_config("configs/base.yml", "port: 3307\n", 200)
+		value = config.fetch_config("databases/reports.yml")
+		self.assertEqual({"host": "db2", "port": 1}, value)
+		self.assertNotEqual(generation, config.generation("databases/reports.yml"))
+
+	def test_relocated(self):
+		self.compile(("databases/reports.yml", SCHEMA))
+		# the same files, checked out somewhere else
+		other = os.path.join(self.tmpdir, "other", "configs")
+		shutil.copytree(self.prefix, other)
+		config_path = kconfig.ConfigPathDefaults([other])
+		config = CompiledConfigDefault(self.output, config_path=config_path)
+		self.assertEqual(3306, config.fetch_config("databases/reports")["port"])
+		self.assertTrue("databases/reports__None" in config.compiled)
+
+		self.write_config("other/configs/databases/reports.yml",
+			"host: db2\nport: 1\n", 200)
+		self.assertEqual("db2", config.fetch_config("databases/reports")["host"])
+
+		# a missing source
+		config = CompiledConfigDefault(self.output, config_path=config_path)
+		os.remove(os.path.join(other, "base.yml"))
+		self.write_config("other/configs/databases/reports.yml",
+			"host: db3\nport: 1\n", 100)
+		self.assertEqual("db3", config.fetch_config("databases/reports")["host"])
+
+	def test_not_compiled(self):
+		config = CompiledConfigDefault(self.output, config_path=self.config_path)
+		self.assertEqual(3306, config.fetch_config("base.yml")["port"])
+
+	def test_invalid(self):
+		self.write_config("configs/databases/bad.yml", "host: db1\nport: 0\n")
+		self.assertRaises(ValueError, self.compile, ("databases/bad.yml", SCHEMA))
+		self.assertRaises(ValueError, render, {"a": object()}, {})
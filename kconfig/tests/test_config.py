@@ -1,6 +1,9 @@
 import unittest
 import kconfig
 import os
+import threading
+
+from tempconfigs import TempConfigTestCase
 
 class ConfigDefaultsTest(unittest.TestCase):
 	def setUp(self):
@@ -110,6 +113,288 @@ class ConfigTests(unittest.TestCase):
 	def tearDown(self):
 		kconfig.ConfigPath = self.orig
 
+class LayeredConfigTests(TempConfigTestCase):
+	def setUp(self):
+		super(LayeredConfigTests, self).setUp()
+		self.local = os.path.join(self.tmpdir, "local")
+		self.system = os.path.join(self.tmpdir, "system")
+		self.config_path = kconfig.ConfigPathDefaults(
+			[self.local, self.system])
+		self.write_config("system/databases/reports.yml",
+			"database:\n  adapter: mysql\n  host: db1\n  port: 3306\n")
+		self.write_config("local/databases/reports.yml",
+			"database:\n  host: localhost\n")
+
+	def test_merge_configs(self):
+		base = {'a': {'b': 1, 'c': 2}, 'd': [1, 2], 'e': {'f': 3}}
+		override = {'a': {'c': 4}, 'd': [3]}
+		merged = kconfig.merge_configs(base, override)
+		self.assertEqual({'a': {'b': 1, 'c': 4}, 'd': [3], 'e': {'f': 3}},
+			merged)
+		self.assertEqual({'a': {'b': 1, 'c': 2}, 'd': [1, 2], 'e': {'f': 3}},
+			base)
+		self.assertTrue(merged['e'] is base['e'])
+		self.assertTrue(kconfig.merge_configs(base, None) is base)
+
+	def test_find_config_paths(self):
+		paths = kconfig.find_config_paths(
+			'databases/reports', config_path=self.config_path)
+		self.assertEqual([
+			os.path.join(self.local, 'databases/reports.yml'),
+			os.path.join(self.system, 'databases/reports.yml')], paths)
+		self.assertEqual([], kconfig.find_config_paths(
+			'databases/foo', config_path=self.config_path))
+
+	def test_fetch_layered_config(self):
+		payload = kconfig.fetch_layered_config(
+			'databases/reports', config_path=self.config_path)
+		self.assertEqual(
+			{'adapter': 'mysql', 'host': 'localhost', 'port': 3306},
+			payload['database'])
+		self.assertRaises(IOError, kconfig.fetch_layered_config,
+			'databases/foo', config_path=self.config_path)
+
+	def test_layered_config_cache(self):
+		config = kconfig.ConfigDefault(
+			config_path=self.config_path, layered=True)
+		payload = config.fetch_config('databases/reports')
+		self.assertEqual('localhost', payload['database']['host'])
+		self.assertTrue(payload is config.fetch_config('databases/reports'))
+
+		system_path = os.path.join(self.system, 'databases/reports.yml')
+		system_layer = config.files[system_path][1]
+		self.write_config("local/databases/reports.yml",
+			"database:\n  host: db2\n", mtime=1)
+		payload = config.fetch_config('databases/reports')
+		self.assertEqual(
+			{'adapter': 'mysql', 'host': 'db2', 'port': 3306},
+			payload['database'])
+		# only the changed layer was reparsed
+		self.assertTrue(system_layer is config.files[system_path][1])
+
+		os.remove(os.path.join(self.local, 'databases/reports.yml'))
+		payload = config.fetch_config('databases/reports')
+		self.assertEqual('db1', payload['database']['host'])
+
+class IncludeTests(TempConfigTestCase):
+	def setUp(self):
+		super(IncludeTests, self).setUp()
+		self.config_path = kconfig.ConfigPathDefaults([self.tmpdir])
+		self.write_config("discovery/mysql/header.yml",
+			"header:\n  service_class: mysql\n  metadata:\n"
+			"    protocol: mysql\n    version: 1.0\nencoding: utf8\n")
+		self.write_config("discovery/mysql/reports.yml",
+			"extends: discovery/mysql/header\ndatabase: reports\n")
+		self.write_config("discovery/mysql/knewmena.yml",
+			"extends: discovery/mysql/header\ndatabase: knewmena\n"
+			"header:\n  metadata:\n    version: 2.0\n")
+
+	def test_fetch_config_includes(self):
+		payload = kconfig.fetch_config('discovery/mysql/knewmena',
+			config_path=self.config_path, includes=True)
+		self.assertEqual({
+			'header': {
+				'service_class': 'mysql',
+				'metadata': {'protocol': 'mysql', 'version': 2.0}},
+			'encoding': 'utf8',
+			'database': 'knewmena'}, payload)
+		payload = kconfig.fetch_config('discovery/mysql/knewmena',
+			config_path=self.config_path)
+		self.assertEqual('discovery/mysql/header', payload['extends'])
+
+	def test_include_cycle(self):
+		self.write_config("a.yml", "include: [b]\n")
+		self.write_config("b.yml", "include: a\n")
+		self.assertRaises(ValueError, kconfig.fetch_config, 'a',
+			config_path=self.config_path, includes=True)
+
+	def test_config_includes(self):
+		config = kconfig.ConfigDefault(
+			config_path=self.config_path, includes=True)
+		reports = config.fetch_config('discovery/mysql/reports')
+		knewmena = config.fetch_config('discovery/mysql/knewmena')
+		self.assertEqual('mysql', reports['header']['service_class'])
+		self.assertEqual('mysql', knewmena['header']['service_class'])
+		header_path = os.path.join(self.tmpdir, 'discovery/mysql/header.yml')
+		self.assertEqual(set(['discovery/mysql/reports__None',
+			'discovery/mysql/knewmena__None']),
+			config.dependents[header_path])
+
+		self.write_config("discovery/mysql/header.yml",
+			"header:\n  service_class: mariadb\n", mtime=1)
+		reports = config.fetch_config('discovery/mysql/reports')
+		self.assertEqual('mariadb', reports['header']['service_class'])
+
+		config.invalidate(header_path)
+		self.assertFalse('discovery/mysql/reports__None' in config.config_types)
+		self.assertFalse('discovery/mysql/knewmena__None' in config.config_types)
+		self.assertFalse('discovery/mysql/knewmena__None' in config.dependencies)
+
+class InterpolationTests(TempConfigTestCase):
+	def setUp(self):
+		super(InterpolationTests, self).setUp()
+		self.config_path = kconfig.ConfigPathDefaults([self.tmpdir])
+		self.write_config("databases/reports.yml",
+			"database:\n  host: db1\n  port: 3306\n"
+			"dsn: mysql://${database.host}:${database.port}/reports\n")
+		self.write_config("reports.yml",
+			"dsn: ${databases/reports:dsn}\n")
+
+	def test_config_interpolation(self):
+		config = kconfig.ConfigDefault(
+			config_path=self.config_path, interpolate=True)
+		payload = config.fetch_config('databases/reports')
+		self.assertEqual('mysql://db1:3306/reports', payload['dsn'])
+		generation = config.generation('databases/reports')
+		self.assertTrue(payload is config.fetch_config('databases/reports'))
+		self.assertEqual(generation, config.generation('databases/reports'))
+
+		payload = config.fetch_config('reports')
+		self.assertEqual('mysql://db1:3306/reports', payload['dsn'])
+		self.write_config("databases/reports.yml",
+			"database:\n  host: db2\n  port: 3306\n"
+			"dsn: mysql://${database.host}:${database.port}/reports\n", mtime=1)
+		payload = config.fetch_config('reports')
+		self.assertEqual('mysql://db2:3306/reports', payload['dsn'])
+		self.assertNotEqual(
+			generation, config.generation('databases/reports'))
+
+	def test_interpolation_cycle(self):
+		self.write_config("a.yml", "a: ${b:b}\n")
+		self.write_config("b.yml", "b: ${a:a}\n")
+		config = kconfig.ConfigDefault(
+			config_path=self.config_path, interpolate=True)
+		self.assertRaises(ValueError, config.fetch_config, 'a')
+
+	def test_interpolation_threads(self):
+		config = kconfig.ConfigDefault(
+			config_path=self.config_path, interpolate=True)
+		path = kconfig.find_config_path(
+			'databases/reports', config_path=self.config_path)
+		errors = []
+		def fetch():
+			try:
+				for _ in xrange(200):
+					config.fetch_config('reports')
+					config.invalidate(path)
+			except Exception as e:
+				errors.append(e)
+		threads = [threading.Thread(target=fetch) for _ in xrange(4)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		self.assertEqual([], errors)
+		self.assertEqual('mysql://db1:3306/reports',
+			config.fetch_config('reports')['dsn'])
+
+class SidecarTests(TempConfigTestCase):
+	def setUp(self):
+		super(SidecarTests, self).setUp()
+		self.config_path = kconfig.ConfigPathDefaults([self.tmpdir])
+		self.write_config("model.yml", "weights: !npy data/weights.npy\n")
+		self.write_config("data/weights.npy", "first", mtime=1)
+
+	def test_sidecar(self):
+		payload = kconfig.fetch_config("model.yml", config_path=self.config_path)
+		self.assertEqual(kconfig.Sidecar(
+			os.path.join(self.tmpdir, "data/weights.npy")), payload["weights"])
+
+	def test_sidecar_changes(self):
+		config = kconfig.ConfigDefault(config_path=self.config_path)
+		payload = config.fetch_config("model.yml")
+		generation = config.generation("model.yml")
+		self.assertTrue(payload is config.fetch_config("model.yml"))
+
+		self.write_config("data/weights.npy", "second", mtime=2)
+		changed = config.fetch_config("model.yml")
+		self.assertNotEqual(payload["weights"], changed["weights"])
+		self.assertEqual(2, changed["weights"].mtime)
+		self.assertNotEqual(generation, config.generation("model.yml"))
+
+	def test_layered_sidecar(self):
+		self.write_config("local/model.yml", "weights: !npy weights.npy\n")
+		self.write_config("local/weights.npy", "local", mtime=1)
+		self.write_config("system/model.yml",
+			"weights: !npy weights.npy\nbias: !npy bias.npy\n")
+		self.write_config("system/bias.npy", "bias", mtime=1)
+		config_path = kconfig.ConfigPathDefaults([
+			os.path.join(self.tmpdir, "local"), os.path.join(self.tmpdir, "system")])
+		expected = {
+			"weights": kconfig.Sidecar(os.path.join(self.tmpdir, "local/weights.npy")),
+			"bias": kconfig.Sidecar(os.path.join(self.tmpdir, "system/bias.npy")),
+		}
+		self.assertEqual(expected, kconfig.fetch_layered_config("model.yml",
+			config_path=config_path))
+		config = kconfig.ConfigDefault(config_path=config_path, layered=True)
+		self.assertEqual(expected, config.fetch_config("model.yml"))
+
+		self.write_config("system/bias.npy", "changed", mtime=2)
+		self.assertEqual(2, config.fetch_config("model.yml")["bias"].mtime)
+
+class EnvOverrideTests(unittest.TestCase):
+	def setUp(self):
+		self.config_path = kconfig.ConfigPathDefaults(
+			[os.path.abspath("kconfig/tests/configs")])
+		self.environ = {
+			'KCONFIG__MEMCACHED__SESSIONS__MEMCACHE__PORT': '11212',
+			'KCONFIG__MEMCACHED__SESSIONS__MEMCACHE__WEIGHT': '2',
+			'KCONFIG__DATABASES__REPORTS__DATABASE__HOST': 'db1',
+			'KCONFIG__DATABASES__REPORTS__DATABASE__PASSWORD': '0123',
+			'PATH': '/bin',
+		}
+
+	def test_compile_env_overrides(self):
+		overrides = kconfig.compile_env_overrides('KCONFIG', self.environ)
+		self.assertEqual({
+			('MEMCACHED', 'SESSIONS', 'MEMCACHE', 'PORT'): '11212',
+			('MEMCACHED', 'SESSIONS', 'MEMCACHE', 'WEIGHT'): '2',
+			('DATABASES', 'REPORTS', 'DATABASE', 'HOST'): 'db1',
+			('DATABASES', 'REPORTS', 'DATABASE', 'PASSWORD'): '0123',
+		}, overrides)
+		self.assertEqual(['', 'no'], [kconfig.compile_env_overrides('K',
+			{'K__A': value}).values()[0] for value in ['', 'no']])
+
+		overrides = kconfig.compile_env_overrides('KCONFIG', self.environ,
+			parse_values=True)
+		self.assertEqual(11212,
+			overrides[('MEMCACHED', 'SESSIONS', 'MEMCACHE', 'PORT')])
+		self.assertEqual(83,
+			overrides[('DATABASES', 'REPORTS', 'DATABASE', 'PASSWORD')])
+
+	def test_apply_env_overrides(self):
+		value = {'memcache': {'port': 11211, 'address': 'localhost'}}
+		overridden = kconfig.apply_env_overrides(value, [
+			(('MEMCACHE', 'PORT'), 11212), (('OTHER',), 'x')])
+		self.assertEqual({
+			'memcache': {'port': 11212, 'address': 'localhost'},
+			'other': 'x'}, overridden)
+		self.assertEqual(11211, value['memcache']['port'])
+
+	def test_config_env_overrides(self):
+		config = kconfig.ConfigDefault(
+			config_path=self.config_path, env_prefix='KCONFIG')
+		config.reload_env(self.environ)
+		payload = config.fetch_config('memcached/sessions.yml')
+		self.assertEqual('11212', payload['memcache']['port'])
+		self.assertEqual('2', payload['memcache']['weight'])
+		self.assertEqual('test', payload['memcache']['namespace'])
+		self.assertTrue(payload is config.fetch_config('memcached/sessions.yml'))
+		payload = config.fetch_config('databases/reports')
+		self.assertEqual('db1', payload['database']['host'])
+		self.assertEqual('0123', payload['database']['password'])
+
+		del self.environ['KCONFIG__MEMCACHED__SESSIONS__MEMCACHE__PORT']
+		config.reload_env(self.environ)
+		payload = config.fetch_config('memcached/sessions.yml')
+		self.assertEqual(11211, payload['memcache']['port'])
+
+		config = kconfig.ConfigDefault(config_path=self.config_path,
+			env_prefix='KCONFIG', parse_env=True)
+		config.reload_env(self.environ)
+		payload = config.fetch_config('databases/reports')
+		self.assertEqual(83, payload['database']['password'])
+
 class ConfigTestTests(unittest.TestCase):
 	def setUp(self):
 		self.orig = kconfig.ConfigPath
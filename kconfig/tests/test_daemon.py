@@ -0,0 +1,122 @@
+import os
+import shutil
+import time
+
+import kconfig
+from kconfig.daemon import ConfigDaemon
+from kconfig.daemon import DaemonConfig
+from tempconfigs import TempConfigTestCase
+
+CONFIGS_DIR = os.path.join(os.path.dirname(__file__), "configs")
+
+class DaemonConfigTest(TempConfigTestCase):
+	def setUp(self):
+		super(DaemonConfigTest, self).setUp()
+		self.configs = os.path.join(self.tmpdir, "configs")
+		shutil.copytree(CONFIGS_DIR, self.configs)
+		self.config_path = kconfig.ConfigPathDefaults([self.configs])
+		self.socket_path = os.path.join(self.tmpdir, "kconfigd.sock")
+		self.daemon = ConfigDaemon(self.socket_path,
+			config_path=self.config_path, poll_interval=60).start()
+		self.client = DaemonConfig(self.socket_path,
+			config_path=self.config_path)
+
+	def write_config(self, name, content):
+		path = super(DaemonConfigTest, self).write_config(
+			os.path.join("configs", name), content)
+		# make sure the change is visible even on coarse mtime filesystems
+		mtime = os.stat(path).st_mtime + 10
+		os.utime(path, (mtime, mtime))
+		return path
+
+	def wait_for(self, predicate):
+		deadline = time.time() + 5
+		while not predicate():
+			self.assertTrue(time.time() < deadline)
+			time.sleep(0.01)
+
+	def test_fetch_config(self):
+		payload = self.client.fetch_config("memcached/sessions.yml")
+		self.assertEqual("test", payload["memcache"]["namespace"])
+		self.assertEqual(11211, payload["memcache"]["port"])
+		self.assertRaises(IOError, self.client.fetch_config, "databases/foo")
+
+	def test_parsed_once(self):
+		other = DaemonConfig(self.socket_path, config_path=self.config_path)
+		self.client.fetch_config("memcached/sessions.yml")
+		other.fetch_config("memcached/sessions.yml")
+		self.assertEqual(1, self.daemon.parses)
+
+	def test_etag_revalidation(self):
+		payload = self.client.fetch_config("memcached/sessions.yml")
+		# drop the push channel so the next fetch has to revalidate
+		self.client._valid.clear()
+		self.assertTrue(
+			payload is self.client.fetch_config("memcached/sessions.yml"))
+
+	def test_push_notification(self):
+		payload = self.client.fetch_config("memcached/sessions.yml")
+		self.assertEqual("test", payload["memcache"]["namespace"])
+		self.write_config("memcached/sessions.yml",
+			"memcache:\n  namespace: changed\n")
+		self.assertEqual(["memcached/sessions.yml"],
+			self.daemon.check_for_changes())
+		self.wait_for(lambda: not self.client._valid)
+		payload = self.client.fetch_config("memcached/sessions.yml")
+		self.assertEqual("changed", payload["memcache"]["namespace"])
+
+	def test_sidecar_change(self):
+		self.write_config("model.yml", "weights: !npy model.npy\n")
+		self.write_config("model.npy", "first")
+		self.client.fetch_config("model.yml")
+		self.assertEqual([], self.daemon.check_for_changes())
+		self.write_config("model.npy", "second")
+		self.assertEqual(["model.yml"], self.daemon.check_for_changes())
+
+	def test_names_outside_prefixes(self):
+		outside = self.write_config("../outside.yml", "secret: 1\n")
+		for name in ["../outside.yml", outside, "memcached/../../outside"]:
+			self.assertRaises(ValueError, self.daemon.lookup, name)
+		# the client reads such names itself
+		self.assertEqual(1, self.client.fetch_config(outside)["secret"])
+		self.assertEqual(0, self.daemon.parses)
+
+	def test_untrusted_daemon(self):
+		client = DaemonConfig(self.socket_path, config_path=self.config_path,
+			daemon_uids=[os.getuid() + 1])
+		payload = client.fetch_config("memcached/sessions.yml")
+		self.assertEqual("test", payload["memcache"]["namespace"])
+		self.assertEqual(0, self.daemon.parses)
+		self.assertTrue(client._sock is None)
+
+	def test_socket_directory(self):
+		directory = os.path.join(self.tmpdir, "shared")
+		os.mkdir(directory)
+		os.chmod(directory, 0777)
+		daemon = ConfigDaemon(os.path.join(directory, "kconfigd.sock"),
+			config_path=self.config_path)
+		self.assertRaises(IOError, daemon.start)
+
+	def test_config_injection(self):
+		self.client._add_config({"host": "localhost"}, "fake_config/not_here")
+		payload = self.client.fetch_config("fake_config/not_here")
+		self.assertEqual("localhost", payload["host"])
+
+	def test_fallback_when_daemon_down(self):
+		self.daemon.shutdown()
+		client = DaemonConfig(self.socket_path, config_path=self.config_path)
+		payload = client.fetch_config("memcached/sessions.yml")
+		self.assertEqual("test", payload["memcache"]["namespace"])
+
+	def test_fallback_after_daemon_exits(self):
+		self.client.fetch_config("memcached/sessions.yml")
+		self.daemon.shutdown()
+		self.wait_for(lambda: self.client._listener is None)
+		self.write_config("memcached/sessions.yml",
+			"memcache:\n  namespace: changed\n")
+		payload = self.client.fetch_config("memcached/sessions.yml")
+		self.assertEqual("changed", payload["memcache"]["namespace"])
+
+	def tearDown(self):
+		self.daemon.shutdown()
+		super(DaemonConfigTest, self).tearDown()
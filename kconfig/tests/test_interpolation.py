@@ -0,0 +1,53 @@
+import unittest
+
+from kconfig.interpolation import apply_plan
+from kconfig.interpolation import compile_plan
+from kconfig.interpolation import interpolate
+
+class TestInterpolation(unittest.TestCase):
+	def setUp(self):
+		self.config = {
+			'database': {'host': 'db1', 'port': 3306},
+			'dsn': 'mysql://${database.host}:${database.port}/reports',
+			'port': '${database.port}',
+			'servers': [{'host': '${database.host}'}],
+			'first': '${servers.0.host}',
+			'price': '$$5',
+			'untouched': {'a': 1},
+		}
+
+	def test_compile_plan(self):
+		plan = compile_plan(self.config)
+		self.assertEqual(set([('dsn',), ('port',), ('servers', 0, 'host'),
+			('first',), ('price',)]), set(plan))
+		self.assertEqual(['mysql://', (None, ('database', 'host')), ':',
+			(None, ('database', 'port')), '/reports'], plan[('dsn',)])
+		self.assertEqual({}, compile_plan({'a': 'no $ references'}))
+
+	def test_interpolate(self):
+		value = interpolate(self.config)
+		self.assertEqual('mysql://db1:3306/reports', value['dsn'])
+		self.assertEqual(3306, value['port'])
+		self.assertEqual('db1', value['servers'][0]['host'])
+		self.assertEqual('db1', value['first'])
+		self.assertEqual('$5', value['price'])
+		# the original is untouched and untemplated subtrees are shared
+		self.assertEqual('${database.port}', self.config['port'])
+		self.assertEqual('${database.host}', self.config['servers'][0]['host'])
+		self.assertTrue(value['untouched'] is self.config['untouched'])
+
+	def test_other_file(self):
+		configs = {'memcached/sessions': {'memcache': {'port': 11211}}}
+		value = interpolate({'port': '${memcached/sessions:memcache.port}'},
+			configs.get)
+		self.assertEqual(11211, value['port'])
+		self.assertRaises(ValueError, interpolate,
+			{'port': '${memcached/sessions:memcache.port}'})
+
+	def test_plan_reuse(self):
+		plan = compile_plan(self.config)
+		self.assertEqual(apply_plan(self.config, plan), interpolate(self.config))
+
+	def test_errors(self):
+		self.assertRaises(ValueError, interpolate, {'a': '${b}'})
+		self.assertRaises(ValueError, interpolate, {'a': '${b}', 'b': '${a}'})
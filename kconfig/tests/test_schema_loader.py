@@ -0,0 +1,69 @@
+import unittest
+
+import yaml
+
+from kconfig.checked_config import CheckedConfig
+from kconfig.checked_config import DurationField
+from kconfig.checked_config import IntField
+from kconfig.checked_config import ListField
+from kconfig.checked_config import NestedField
+from kconfig.checked_config import StringField
+from kconfig.schema_loader import load_checked_config
+
+class ServiceConfig(CheckedConfig):
+	CONFIG_FIELDS = [
+		StringField("name"),
+		DurationField("timeout", default="30s"),
+		ListField("ports", IntField("port")),
+		ListField("servers", NestedField("server",
+			StringField("host"),
+			IntField("port", default=3306, lower_bound=1)
+		)),
+	]
+
+DOCUMENT = """
+name: reports
+unused:
+  deeply: {nested: [1, 2, {3: 4}]}
+ports: [80, "443"]
+servers:
+  - host: db1
+    comment: not in the schema
+  - {host: db2, port: 3307}
+"""
+
+class SchemaLoaderTest(unittest.TestCase):
+	def assertLoadsLikeYaml(self, document):
+		expected = ServiceConfig(yaml.load(document))
+		config = load_checked_config(ServiceConfig, document)
+		for field in ServiceConfig.CONFIG_FIELDS:
+			self.assertEqual(getattr(expected, field.name),
+				getattr(config, field.name))
+		return config
+
+	def assertFailsLikeYaml(self, document):
+		with self.assertRaises(ValueError) as expected:
+			ServiceConfig(yaml.load(document))
+		with self.assertRaises(ValueError) as ve:
+			load_checked_config(ServiceConfig, document)
+		self.assertEqual(expected.exception.message, ve.exception.message)
+
+	def test_load(self):
+		config = self.assertLoadsLikeYaml(DOCUMENT)
+		self.assertEqual([80, 443], config.ports)
+		self.assertEqual(3307, config.servers[1].port)
+		self.assertEqual(30.0, config.timeout)
+
+	def test_fallback(self):
+		self.assertLoadsLikeYaml(DOCUMENT + "defaults: &d {port: 1}\n")
+		self.assertLoadsLikeYaml(DOCUMENT.replace("ports: [80", "ports: [!!int 80"))
+		self.assertRaises(TypeError, load_checked_config, ServiceConfig,
+			"- not a mapping\n")
+
+	def test_errors(self):
+		self.assertFailsLikeYaml("ports: []\nservers: []\n")
+		self.assertFailsLikeYaml(DOCUMENT.replace("port: 3307", "port: 0"))
+		self.assertFailsLikeYaml(DOCUMENT.replace("host: db1", "port: 1"))
+		# the first invalid field in schema order is reported
+		self.assertFailsLikeYaml("servers: [{port: 0}]\nports: [x]\nname: a\n")
+		self.assertFailsLikeYaml("servers: [{host: a, port: x}]\nname: a\nports: []\n")
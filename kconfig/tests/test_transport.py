@@ -0,0 +1,104 @@
+import cPickle
+import unittest
+
+from kconfig import transport
+from kconfig.checked_config import CheckedConfig
+from kconfig.checked_config import ColumnarList
+from kconfig.checked_config import IntField
+from kconfig.checked_config import LazyList
+from kconfig.checked_config import ListField
+from kconfig.checked_config import NestedField
+from kconfig.checked_config import StringField
+
+class ClusterConfig(CheckedConfig):
+	CONFIG_FIELDS = [
+		StringField("name"),
+		NestedField("primary",
+			StringField("host"),
+			IntField("port", default=3306),
+		),
+		ListField("replicas", NestedField("replica",
+			StringField("host"),
+			IntField("weight", default=1),
+		)),
+		ListField("shards", NestedField("shard",
+			IntField("low"),
+			IntField("high"),
+		), columnar=True),
+		ListField("ports", IntField("port", lower_bound=1), lazy=True),
+	]
+
+CLUSTER = {
+	"name": "reports",
+	"primary": {"host": "db1"},
+	"replicas": [{"host": "db%d" % i, "weight": i} for i in xrange(2, 50)],
+	"shards": [{"low": i, "high": i + 10} for i in xrange(0, 1000, 10)],
+	"ports": range(3306, 3316),
+}
+
+def _replica_hosts(task):
+	generation, index = task
+	return transport.snapshot(generation)["cluster"].replicas[index].host
+
+class TransportTest(unittest.TestCase):
+	def assertSameConfig(self, expected, config):
+		self.assertTrue(type(expected) is type(config))
+		for field in ClusterConfig.CONFIG_FIELDS:
+			self.assertEqual(getattr(expected, field.name),
+				getattr(config, field.name))
+
+	def test_dumps(self):
+		config = ClusterConfig(CLUSTER)
+		data = transport.dumps(config)
+		self.assertTrue(len(data) < len(cPickle.dumps(config, 2)))
+		loaded = transport.loads(data)
+		self.assertSameConfig(config, loaded)
+		self.assertTrue(isinstance(loaded.shards, ColumnarList))
+		self.assertTrue(isinstance(loaded.ports, LazyList))
+
+		# lazy lists keep what was validated, and validate the rest on use
+		config = ClusterConfig(dict(CLUSTER, ports=[3306, 0]))
+		self.assertEqual(3306, config.ports[0])
+		loaded = transport.loads(transport.dumps(config))
+		self.assertTrue(isinstance(loaded.ports, LazyList))
+		self.assertEqual(3306, loaded.ports[0])
+		self.assertRaises(ValueError, loaded.ports.__getitem__, 1)
+		self.assertEqual("db1", loaded.primary.host)
+		self.assertTrue(type(loaded.primary) is type(config.primary))
+		# raw dicts are pickled as they are
+		self.assertEqual(CLUSTER, transport.loads(transport.dumps(CLUSTER)))
+
+	def test_schema_changed(self):
+		class_name, fingerprint, data = cPickle.loads(
+			transport.dumps(ClusterConfig(CLUSTER)))
+		self.assertRaises(ValueError, transport.loads,
+			cPickle.dumps((class_name, "0" * 40, data)))
+
+	def test_snapshot(self):
+		config = ClusterConfig(CLUSTER)
+		snapshot = transport.Snapshot({"cluster": config, "raw": CLUSTER})
+		self.assertEqual(snapshot.generation,
+			transport.Snapshot({"cluster": config, "raw": CLUSTER}).generation)
+		self.assertTrue(transport.snapshot(snapshot.generation)["cluster"] is config)
+
+		# what a worker that was not forked does
+		snapshot.release()
+		self.assertRaises(KeyError, transport.snapshot, snapshot.generation)
+		initializer, initargs = snapshot.initializer()
+		initializer(*initargs)
+		configs = transport.snapshot(snapshot.generation)
+		self.assertSameConfig(config, configs["cluster"])
+		self.assertEqual(CLUSTER, configs["raw"])
+		snapshot.release()
+
+	def test_pool(self):
+		snapshot = transport.Snapshot({"cluster": ClusterConfig(CLUSTER)})
+		pool = snapshot.pool(2)
+		try:
+			hosts = pool.map(_replica_hosts,
+				[(snapshot.generation, index) for index in xrange(3)])
+		finally:
+			pool.terminate()
+			pool.join()
+			snapshot.release()
+		self.assertEqual(["db2", "db3", "db4"], hosts)
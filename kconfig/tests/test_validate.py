@@ -0,0 +1,66 @@
+import os
+import StringIO
+
+from kconfig.checked_config import CheckedConfig
+from kconfig.checked_config import IntField
+from kconfig.checked_config import StringField
+from kconfig.validate import find_files
+from kconfig.validate import main
+from tempconfigs import TempConfigTestCase
+
+class HostConfig(CheckedConfig):
+	CONFIG_FIELDS = [
+		StringField("host"),
+		IntField("port", lower_bound=1),
+	]
+
+SCHEMA = __name__ + ":HostConfig"
+
+class ValidateTest(TempConfigTestCase):
+	def setUp(self):
+		super(ValidateTest, self).setUp()
+		self.prefixes = [os.path.join(self.tmpdir, "a"),
+			os.path.join(self.tmpdir, "b")]
+		self.write_config("a/hosts/db.yml", "host: db1\nport: 3306\n")
+		self.write_config("b/hosts/db.yml", "host: db1\nport: 3306\n")
+		self.write_config("b/hosts/cache.yml", "host: cache1\nport: 11211\n")
+		self.write_config("b/other.yml", "port: 0\n")
+
+	def run_main(self, *args):
+		out = StringIO.StringIO()
+		argv = []
+		for prefix in self.prefixes:
+			argv.extend(["--prefix", prefix])
+		status = main(argv + list(args), out=out)
+		return status, out.getvalue()
+
+	def test_find_files(self):
+		config_path = type("ConfigPath", (object,), {"prefixes": self.prefixes})
+		jobs = find_files([("hosts/*.yml", SCHEMA)], config_path)
+		self.assertEqual([
+			(os.path.join(self.prefixes[0], "hosts/db.yml"), SCHEMA),
+			(os.path.join(self.prefixes[1], "hosts/cache.yml"), SCHEMA),
+			(os.path.join(self.prefixes[1], "hosts/db.yml"), SCHEMA),
+		], jobs)
+
+	def test_valid(self):
+		status, output = self.run_main("-j", "2", "hosts/*.yml=" + SCHEMA)
+		self.assertEqual(0, status)
+		self.assertEqual(3, output.count("ok "))
+		self.assertTrue("3 files, 0 invalid" in output)
+
+	def test_invalid(self):
+		self.write_config("a/hosts/bad.yml", "host: db1\nport: 0\n")
+		status, output = self.run_main("-j", "2", "-q",
+			"hosts/*.yml=" + SCHEMA, "*.yml=" + SCHEMA)
+		self.assertEqual(1, status)
+		self.assertEqual(2, output.count("FAIL"))
+		self.assertFalse("ok " in output)
+		self.assertTrue("is less than lower bound 1" in output)
+		self.assertTrue("Missing config field: 'host'" in output)
+		self.assertTrue("5 files, 2 invalid" in output)
+
+	def test_serial(self):
+		status, output = self.run_main("-j", "1", "hosts/db.yml=" + SCHEMA)
+		self.assertEqual(0, status)
+		self.assertTrue("2 files, 0 invalid" in output)
@@ -0,0 +1,137 @@
+"""
+Ships validated configs to multiprocessing workers.
+
+CheckedConfigs pickle with the name and field names of every nested
+record, and a task that takes a config as an argument pickles it again
+for every task. dumps and loads serialize a CheckedConfig by its schema
+instead: the class is named once, nested records become plain tuples,
+and columnar lists are sent as their columns. Nothing is validated again
+on loading, but the schema must be the same in both processes.
+
+Snapshot ships a set of configs to each worker of a pool once, when the
+worker starts, and tasks refer to it by its generation:
+
+	snapshot = transport.Snapshot({"db": DatabaseConfig("databases/main")})
+	pool = snapshot.pool(4)
+	pool.map(work, [(snapshot.generation, item) for item in items])
+
+	def work((generation, item)):
+		db = transport.snapshot(generation)["db"]
+		...
+"""
+
+import cPickle
+import hashlib
+import importlib
+import multiprocessing
+
+from kconfig.checked_config import CheckedConfig
+
+# generation -> {name: config}, in this process
+_snapshots = {}
+
+def _config_class(module_name, class_name):
+	module = importlib.import_module(module_name)
+	try:
+		return getattr(module, class_name)
+	except AttributeError:
+		raise ImportError("No class %s in %s" % (class_name, module_name))
+
+def _pack(config):
+	if not isinstance(config, CheckedConfig):
+		return (None, None, config)
+	config_class = type(config)
+	return ((config_class.__module__, config_class.__name__),
+		config_class._fingerprint, tuple([field.pack(getattr(config, field.name))
+			for field in config_class.CONFIG_FIELDS]))
+
+def _unpack(packed):
+	class_name, fingerprint, data = packed
+	if class_name is None:
+		return data
+	config_class = _config_class(*class_name)
+	if config_class._fingerprint != fingerprint:
+		raise ValueError("The schema of %s.%s has changed" % class_name)
+	fields = config_class.CONFIG_FIELDS
+	instance = object.__new__(config_class)
+	# there is no raw dict to compare with, so refresh validates it all
+	instance._raw = None
+	instance._populate(dict((field.name, field.unpack(item))
+		for field, item in zip(fields, data)))
+	return instance
+
+def dumps(config):
+	"""
+	Serializes a config compactly.
+	Parameters:
+	 - config: a CheckedConfig, or any picklable value such as a raw config
+	   dict
+	Returns:
+	 - a str for loads
+	"""
+	return cPickle.dumps(_pack(config), cPickle.HIGHEST_PROTOCOL)
+
+def loads(data):
+	"""
+	Loads a config serialized by dumps.
+	Raises:
+	 - ImportError if the config's class cannot be imported
+	 - ValueError if the class has other fields than when it was dumped
+	"""
+	return _unpack(cPickle.loads(data))
+
+class Snapshot(object):
+	"""
+	A set of configs shipped to pool workers once. The generation names
+	the snapshot in workers; it is a hash of the serialized configs, so
+	snapshots of the same configs have the same generation.
+	"""
+	def __init__(self, configs):
+		"""
+		Parameters:
+		 - configs: a dict of names to CheckedConfigs or raw configs
+		"""
+		self.data = cPickle.dumps(dict((name, _pack(config))
+			for name, config in configs.iteritems()), cPickle.HIGHEST_PROTOCOL)
+		self.generation = hashlib.sha1(self.data).hexdigest()[:16]
+		# tasks that run in this process find it too
+		_snapshots[self.generation] = dict(configs)
+
+	def initializer(self):
+		"""
+		Returns the initializer and initargs for a multiprocessing.Pool,
+		which load this snapshot in each worker.
+		"""
+		return (init_worker, (self.generation, self.data))
+
+	def pool(self, processes=None, initializer=None, initargs=()):
+		"""
+		Starts a multiprocessing.Pool whose workers have this snapshot.
+		Parameters:
+		 - processes: as for multiprocessing.Pool. (optional)
+		 - initializer, initargs: another initializer for each worker, run
+		   after the snapshot is loaded. (optional)
+		"""
+		return multiprocessing.Pool(processes, init_worker,
+			(self.generation, self.data, initializer, initargs))
+
+	def release(self):
+		"""Forgets this snapshot in this process"""
+		_snapshots.pop(self.generation, None)
+
+def init_worker(generation, data, initializer=None, initargs=()):
+	"""Loads a snapshot in a worker; the initializer of Snapshot.pool"""
+	# forked workers already have it
+	if generation not in _snapshots:
+		_snapshots[generation] = dict((name, _unpack(packed))
+			for name, packed in cPickle.loads(data).iteritems())
+	if initializer is not None:
+		initializer(*initargs)
+
+def snapshot(generation):
+	"""
+	Returns the configs of a snapshot, as a dict of names to configs.
+	Raises:
+	 - KeyError if the snapshot was not loaded in this process
+	"""
+	return _snapshots[generation]
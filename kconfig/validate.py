@@ -0,0 +1,155 @@
+"""
+Validates config files against CheckedConfig schemas in parallel.
+
+Each argument maps a glob of config files, relative to the config path
+prefixes, to the CheckedConfig class that checks them:
+
+	python -m kconfig.validate \
+		'databases/*.yml=myapp.configs:DatabaseConfig' \
+		'memcached/*.yml=myapp.configs:MemcacheConfig'
+
+Every file that matches under any prefix is validated, in a pool of
+processes. The time each file took and any errors are reported, and the
+exit status is nonzero if any file is invalid.
+"""
+
+import collections
+import glob
+import importlib
+import itertools
+import multiprocessing
+import optparse
+import os
+import sys
+import time
+
+import kconfig
+
+Result = collections.namedtuple("Result", ["path", "schema", "seconds", "error"])
+
+def load_schema(schema):
+	"""
+	Imports a CheckedConfig class.
+	Parameters:
+	 - schema: "module:Class", or "module.Class"
+	Raises:
+	 - ImportError if there is no such class
+	"""
+	if ":" in schema:
+		module_name, class_name = schema.split(":", 1)
+	else:
+		module_name, _, class_name = schema.rpartition(".")
+	if not module_name or not class_name:
+		raise ImportError("Not a module and class: %s" % schema)
+	module = importlib.import_module(module_name)
+	try:
+		return getattr(module, class_name)
+	except AttributeError:
+		raise ImportError("No class %s in %s" % (class_name, module_name))
+
+def find_files(schemas, config_path=None):
+	"""
+	Finds the files to validate.
+	Parameters:
+	 - schemas: a list of (glob, schema) pairs
+	 - config_path: the ConfigPathDefaults whose prefixes the globs are
+	   relative to. (optional)
+	Returns:
+	 - a sorted list of (path, schema) pairs. A file that matches the globs
+	   of several schemas is validated against each of them.
+	"""
+	if not config_path:
+		config_path = kconfig.ConfigPath
+	jobs = set()
+	for prefix in config_path.prefixes:
+		prefix = os.path.expanduser(prefix)
+		for pattern, schema in schemas:
+			for path in glob.glob(os.path.join(prefix, pattern)):
+				if os.path.isfile(path):
+					jobs.add((os.path.abspath(path), schema))
+	return sorted(jobs)
+
+def validate_file(job):
+	"""Validates one (path, schema) pair, and returns its Result"""
+	path, schema = job
+	start = time.time()
+	try:
+		load_schema(schema)(path)
+	except Exception as e:
+		error = "%s: %s" % (type(e).__name__, e)
+	else:
+		error = None
+	return Result(path, schema, time.time() - start, error)
+
+def validate_files(jobs, processes=None):
+	"""
+	Validates files against their schemas.
+	Parameters:
+	 - jobs: a list of (path, schema) pairs, as from find_files
+	 - processes: the number of processes to validate in. Defaults to the
+	   number of CPUs; 1 validates in this process.
+	Returns:
+	 - an iterator of Results, in the order they finish.
+	"""
+	if processes == 1 or len(jobs) < 2:
+		return itertools.imap(validate_file, jobs)
+	return _validate_in_pool(jobs, processes)
+
+def _validate_in_pool(jobs, processes):
+	pool = multiprocessing.Pool(processes)
+	# chunks big enough to keep the workers busy between round trips
+	chunksize = max(1, len(jobs) // (4 * (processes or multiprocessing.cpu_count())))
+	try:
+		for result in pool.imap_unordered(validate_file, jobs, chunksize):
+			yield result
+	finally:
+		pool.terminate()
+		pool.join()
+
+def main(argv=None, out=None):
+	parser = optparse.OptionParser(
+		usage="%prog [options] glob=module:Class ...",
+		description="Validate config files against CheckedConfig schemas.")
+	parser.add_option("-p", "--prefix", action="append", dest="prefixes",
+		help="a config path prefix to look for files under; may be given "
+			"more than once [default: the kconfig.ConfigPath prefixes]")
+	parser.add_option("-j", "--processes", type="int", default=None,
+		help="processes to validate in [default: one per CPU]")
+	parser.add_option("-q", "--quiet", action="store_true", default=False,
+		help="only report invalid files")
+	options, args = parser.parse_args(argv)
+	if out is None:
+		out = sys.stdout
+	if not args:
+		parser.error("no schemas given")
+	schemas = []
+	for arg in args:
+		pattern, _, schema = arg.partition("=")
+		if not pattern or not schema:
+			parser.error("not a glob=module:Class mapping: %s" % arg)
+		try:
+			load_schema(schema)
+		except ImportError as e:
+			parser.error(str(e))
+		schemas.append((pattern, schema))
+	config_path = None
+	if options.prefixes:
+		config_path = kconfig.ConfigPathDefaults(options.prefixes)
+
+	jobs = find_files(schemas, config_path)
+	start = time.time()
+	failures = 0
+	for result in validate_files(jobs, options.processes):
+		if result.error is not None:
+			failures += 1
+			out.write("FAIL %8.4fs %s (%s): %s\n" % (
+				result.seconds, result.path, result.schema, result.error))
+		elif not options.quiet:
+			out.write("ok   %8.4fs %s (%s)\n" % (
+				result.seconds, result.path, result.schema))
+	out.write("%d files, %d invalid, in %.2fs\n" % (
+		len(jobs), failures, time.time() - start))
+	return 1 if failures else 0
+
+if __name__ == "__main__":
+	sys.exit(main())
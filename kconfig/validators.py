@@ -0,0 +1,260 @@
+"""
+Validation of config dicts against lists of Fields.
+
+CheckedConfig and NestedField validate through functions generated by
+_ValidatorBuilder, with the validation of each field inlined; _validate is
+the interpreted equivalent, used for values that are not plain dicts.
+_revalidate validates a new version of a config dict, reusing the values
+of the fields that did not change.
+"""
+
+import math
+
+def _validate(config_dict, config_fields):
+	"""Validate a parsed config dictionary
+
+	Validates the contents of config_dict against the fields
+	defined in this CheckedConfig. Makes sure that all required
+	fields are present and have appropriate values.
+
+	Args:
+	  config_dict: a dictionary containing config fields and
+		values to validate.
+
+	Returns:
+	  A dictionary of validated fields and values.
+	"""
+	valid_dict = {}
+	for field in config_fields:
+		try:
+			value = config_dict[field.name]
+		except KeyError:
+			if field.default is not None:
+				value = field.default
+			else:
+				raise ValueError("Missing config field: '{0}'".format(field.name))
+
+		valid_dict[field.name] = field.validate(value)
+	return valid_dict
+
+# types whose validated defaults can be shared between configs
+_IMMUTABLE_TYPES = (int, long, float, bool, basestring)
+
+def _unchanged(old, new):
+	"""Whether two raw config values are the same, down to their types
+
+	Equal containers can still hold values of different types, like 1 and
+	1.0, which validate differently, so containers are compared item by
+	item rather than with ==. The comparison stops at the first
+	difference.
+	"""
+	if old is new:
+		return True
+	if type(old) is not type(new):
+		return False
+	if isinstance(old, _IMMUTABLE_TYPES):
+		return old == new
+	if type(old) is dict:
+		if len(old) != len(new):
+			return False
+		for key, value in old.iteritems():
+			if key not in new or not _unchanged(value, new[key]):
+				return False
+		return True
+	if type(old) is list or type(old) is tuple:
+		if len(old) != len(new):
+			return False
+		for old_item, new_item in zip(old, new):
+			if not _unchanged(old_item, new_item):
+				return False
+		return True
+	return old == new
+
+def _raw_value(config_dict, field):
+	"""The raw value of field in config_dict, as _validate finds it"""
+	try:
+		return config_dict[field.name]
+	except KeyError:
+		if field.default is None:
+			raise ValueError("Missing config field: '{0}'".format(field.name))
+		return field.default
+
+def _revalidate(config_fields, old_dict, old_values, new_dict):
+	"""Validate new_dict, reusing the values of fields unchanged since old_dict
+
+	Args:
+	  config_fields: a list of Fields.
+	  old_dict: a config dictionary that has been validated.
+	  old_values: an object with the validated values of old_dict as
+	    attributes.
+	  new_dict: a config dictionary to validate.
+
+	Returns:
+	  A dictionary of validated fields and values, and whether any of
+	  the values are not the ones in old_values.
+	"""
+	valid_dict = {}
+	changed = False
+	for field in config_fields:
+		old_value = getattr(old_values, field.name)
+		value = field.revalidate(_raw_value(old_dict, field), old_value,
+			_raw_value(new_dict, field))
+		changed = changed or value is not old_value
+		valid_dict[field.name] = value
+	return valid_dict, changed
+
+class _ValidatorBuilder(object):
+	"""Generates the source of a validation function for a list of fields
+
+	Fields emit straight-line code through their _compile method. Values
+	the generated code needs (field objects, compiled patterns, namedtuple
+	types) are passed to it through the function's globals.
+	"""
+
+	def __init__(self):
+		self.lines = []
+		self.namespace = {
+			"_validate": _validate,
+			"_object_new": object.__new__,
+			"_object_setattr": object.__setattr__,
+			"_missing": object(),
+		}
+		self.level = 1
+		self.count = 0
+
+	def var(self, prefix="v"):
+		"""Returns a new unique variable name"""
+		self.count += 1
+		return "{0}{1}".format(prefix, self.count)
+
+	def const(self, value, prefix="c"):
+		"""Returns the name of a global holding value"""
+		name = self.var(prefix)
+		self.namespace[name] = value
+		return name
+
+	def literal(self, value):
+		"""Returns a python expression for value, inlined if possible"""
+		if type(value) is float and (math.isinf(value) or math.isnan(value)):
+			# repr gives inf and nan, which are not names in python
+			return self.const(value)
+		if type(value) in (int, long, float, bool, str, type(None)):
+			return repr(value)
+		return self.const(value)
+
+	def emit(self, line):
+		self.lines.append("\t" * self.level + line)
+
+	def indent(self):
+		self.level += 1
+
+	def dedent(self):
+		self.level -= 1
+
+	def fields(self, config_fields, dict_var):
+		"""Emits code validating config_fields against the dict in dict_var
+
+		Returns:
+		  A list of the variable names holding the validated values,
+		  in the order of config_fields.
+		"""
+		results = []
+		get = None
+		for field in config_fields:
+			value = self.var()
+			result = self.var("r")
+			if field.default is None:
+				# a required field is almost always there, and a try that
+				# does not raise costs less than a call
+				self.emit("try:")
+				self.emit("\t{0} = {1}[{2!r}]".format(value, dict_var, field.name))
+				self.emit("except KeyError:")
+				self.emit("\traise ValueError({0!r})".format(
+					"Missing config field: '{0}'".format(field.name)))
+				field._compile(self, value, result)
+				results.append(result)
+				continue
+
+			# optional fields are often missing, and raising KeyError costs
+			# more than a call
+			if get is None:
+				get = self.var("get")
+				self.emit("{0} = {1}.get".format(get, dict_var))
+			try:
+				default = field.validate(field.default)
+			except Exception:
+				# raise it on validation, like _validate does
+				default = None
+			if isinstance(default, _IMMUTABLE_TYPES):
+				self.emit("{0} = {1}({2!r}, _missing)".format(
+					value, get, field.name))
+				self.emit("if {0} is _missing:".format(value))
+				self.emit("\t{0} = {1}".format(result, self.literal(default)))
+				self.emit("else:")
+				self.indent()
+				field._compile(self, value, result)
+				self.dedent()
+			else:
+				self.emit("{0} = {1}({2!r}, {3})".format(
+					value, get, field.name, self.const(field.default)))
+				field._compile(self, value, result)
+			results.append(result)
+		return results
+
+	def function(self, name, arg):
+		"""Compiles the emitted code into a function of one argument"""
+		source = "def {0}({1}):\n{2}\n".format(name, arg, "\n".join(self.lines))
+		code = compile(source, "<{0}>".format(name), "exec")
+		exec code in self.namespace
+		function = self.namespace[name]
+		function.source = source
+		return function
+
+def _compile_validator(config_fields, name):
+	"""Generates a validation function for a list of fields
+
+	The generated function does exactly what _validate does, with every
+	field's validation inlined into one straight-line function.
+
+	Args:
+	  config_fields: a list of Fields.
+	  name: a str. Used to name the generated function.
+
+	Returns:
+	  A function that takes a config dict and returns a dictionary of
+	  validated fields and values.
+	"""
+	builder = _ValidatorBuilder()
+	fields = builder.const(tuple(config_fields), "fields")
+	builder.emit("if type(config_dict) is not dict:")
+	builder.emit("\treturn _validate(config_dict, {0})".format(fields))
+	results = builder.fields(config_fields, "config_dict")
+	builder.emit("return {{{0}}}".format(", ".join(
+		"{0!r}: {1}".format(field.name, result)
+		for field, result in zip(config_fields, results))))
+	return builder.function("validate_{0}".format(name), "config_dict")
+
+def _compile_field_validator(field, name):
+	"""Generates a function that validates one field of a config dict
+
+	Args:
+	  field: a Field.
+	  name: a str. Used to name the generated function.
+
+	Returns:
+	  A function that takes a config dict and returns the validated
+	  value of field, or its default if the field is not in the dict.
+	"""
+	builder = _ValidatorBuilder()
+	result, = builder.fields([field], "config_dict")
+	builder.emit("return {0}".format(result))
+	return builder.function("validate_{0}_{1}".format(name, field.name),
+		"config_dict")
+
+def _compile_populate(config_fields, name):
+	"""Generates a method that sets validated fields on a CheckedConfig"""
+	builder = _ValidatorBuilder()
+	for field in config_fields:
+		builder.emit("self.{0} = valid_config[{0!r}]".format(field.name))
+	builder.emit("pass")
+	return builder.function("populate_{0}".format(name), "self, valid_config")